@@ -0,0 +1,149 @@
+"""Background purge of deleted accounts.
+
+DELETE /api/auth/me only marks the user (deleted_at, scrubbed email and password),
+revokes their tokens and queues an account_deletions row. This job then removes
+the user's child rows table by table in small transactions, recording progress on
+the queue row, and deletes the users row last once nothing references it. Other
+writers get the writer lock between batches instead of waiting for one large
+ON DELETE CASCADE.
+
+Usage (from backend/):
+    python account_purge.py             # drain the queue
+"""
+from typing import Callable, ContextManager, Dict, List, Optional
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS account_deletions (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    progress_json TEXT NOT NULL DEFAULT '{}',
+    requested_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    completed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_account_deletions_status ON account_deletions(status, requested_at);
+"""
+
+# 사용자 행을 참조하는 테이블 전부. 새 per-user 테이블을 추가하면 여기에도 넣는다
+CHILD_TABLES = [
+    "tokens",
+    "stream_tickets",
+    "predict_idempotency",
+    "user_routine_rank",
+    "user_trend_rollups",
+    "user_activity_summary",
+    "hr_sessions",
+    "user_todos",
+    "user_routine_runs",
+    "sync_tombstones",
+    "user_sync_versions",
+    "user_predictions",
+    "user_prediction_archive",
+]
+
+
+def _purge_one(
+    conn: sqlite3.Connection,
+    deletion_id: str,
+    user_id: int,
+    progress: Dict[str, int],
+    write_lock: Optional[Callable[[], ContextManager]],
+    batch_size: int,
+    pause_sec: float,
+    deadline: float,
+) -> bool:
+    """Returns True once the user is fully purged, False if it ran out of time."""
+    for table in CHILD_TABLES:
+        while True:
+            if time.monotonic() > deadline:
+                return False
+            with (write_lock() if write_lock else nullcontext()), conn:
+                n = conn.execute(
+                    f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE user_id = ? LIMIT ?)",
+                    (user_id, batch_size),
+                ).rowcount
+                progress[table] = progress.get(table, 0) + n
+                conn.execute(
+                    "UPDATE account_deletions SET status = 'running', progress_json = ?, updated_at = ? WHERE id = ?",
+                    (json.dumps(progress), datetime.utcnow().isoformat(), deletion_id),
+                )
+            if n < batch_size:
+                break
+            if pause_sec:
+                time.sleep(pause_sec)
+
+    now = datetime.utcnow().isoformat()
+    with (write_lock() if write_lock else nullcontext()), conn:
+        conn.execute("DELETE FROM users WHERE id = ? AND deleted_at IS NOT NULL", (user_id,))
+        conn.execute(
+            "UPDATE account_deletions SET status = 'done', progress_json = ?, updated_at = ?, completed_at = ? WHERE id = ?",
+            (json.dumps(progress), now, now, deletion_id),
+        )
+    return True
+
+
+def run_purge(
+    conn: sqlite3.Connection,
+    write_lock: Optional[Callable[[], ContextManager]] = None,
+    batch_size: int = 500,
+    pause_sec: float = 0.05,
+    max_seconds: float = 60.0,
+) -> Dict[str, int]:
+    deadline = time.monotonic() + max_seconds
+    done = 0
+    queued = conn.execute(
+        "SELECT id, user_id, progress_json FROM account_deletions WHERE status != 'done' ORDER BY requested_at"
+    ).fetchall()
+    for r in queued:
+        if not _purge_one(conn, r["id"], r["user_id"], json.loads(r["progress_json"]), write_lock, batch_size, pause_sec, deadline):
+            break
+        done += 1
+    return {"queued": len(queued), "completed": done}
+
+
+def deletion_status(conn: sqlite3.Connection, deletion_id: str) -> Optional[dict]:
+    row = conn.execute(
+        "SELECT id, status, progress_json, requested_at, updated_at, completed_at FROM account_deletions WHERE id = ?",
+        (deletion_id,),
+    ).fetchone()
+    if not row:
+        return None
+    return {
+        "deletion_id": row["id"],
+        "status": row["status"],
+        "deleted_rows": json.loads(row["progress_json"]),
+        "requested_at": row["requested_at"],
+        "updated_at": row["updated_at"],
+        "completed_at": row["completed_at"],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="탈퇴 계정 데이터 분할 삭제")
+    p.add_argument("--batch", type=int, default=500)
+    p.add_argument("--pause", type=float, default=0.05, help="배치 사이 대기(초)")
+    p.add_argument("--max-seconds", type=float, default=3600.0)
+    args = p.parse_args(argv)
+
+    import app
+
+    conn = app._get_db()
+    try:
+        t0 = time.perf_counter()
+        res = run_purge(conn, app._write_lock, args.batch, args.pause, args.max_seconds)
+        print(f"[purge] {res} ({time.perf_counter() - t0:.1f}s)")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""Admission control for the API.
+
+Requests are classified by route into gates. Each gate has a concurrency limit, a
+bounded FIFO wait queue and a wait deadline:
+
+    auth      login/register/password change (PBKDF2, CPU-bound)
+    upstream  endpoints that call the public-data portal synchronously
+    default   every other /api route
+    cheap     /api/auth/me (GET), /api/todos, /api/health/*, /api/coach/stream: never queued
+
+A request that cannot start within its gate's deadline, or finds the queue full,
+gets an immediate 503 with Retry-After instead of tying up a worker thread. The
+gated limits together stay below the threadpool size, so cheap routes always find
+a free thread; that headroom is their priority.
+
+Limits are per worker process and can be overridden with
+ADMISSION_<GATE>_LIMIT / _QUEUE / _WAIT_SEC / _RETRY_AFTER. ADMISSION=0 disables.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from starlette.routing import Match
+
+CHEAP = "cheap"
+
+# (path prefix, method or None, gate); first match wins, /api 기타는 default
+ROUTE_RULES: List[Tuple[str, Optional[str], str]] = [
+    ("/api/auth/login", None, "auth"),
+    ("/api/auth/register", None, "auth"),
+    ("/api/auth/me", "PUT", "auth"),
+    ("/api/auth/me", None, CHEAP),
+    ("/api/auth/deletions/", None, CHEAP),
+    ("/api/todos", None, CHEAP),
+    ("/api/sync", None, CHEAP),
+    ("/api/health/", None, CHEAP),
+    ("/api/coach/stream-ticket", None, "default"),
+    ("/api/coach/stream", None, CHEAP),  # 장시간 연결: 게이트 슬롯을 잡고 있으면 안 된다
+    ("/api/recovery-spots", None, "upstream"),
+]
+
+# gate -> (limit, queue, wait_sec, retry_after)
+DEFAULT_GATES: Dict[str, Tuple[int, int, float, int]] = {
+    "auth": (4, 32, 2.0, 1),
+    "upstream": (8, 32, 5.0, 5),
+    "default": (16, 64, 3.0, 2),
+}
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str):
+        self.reason = reason
+
+
+@dataclass
+class RouteStats:
+    admitted: int = 0
+    queued: int = 0
+    queue_ms_total: float = 0.0
+    queue_ms_max: float = 0.0
+    rejected: Dict[str, int] = field(default_factory=lambda: {"queue_full": 0, "timeout": 0})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "queue_ms_avg": round(self.queue_ms_total / self.queued, 1) if self.queued else 0.0,
+            "queue_ms_max": round(self.queue_ms_max, 1),
+            "rejected": dict(self.rejected),
+        }
+
+
+class Gate:
+    def __init__(self, name: str, limit: int, queue: int, wait_sec: float, retry_after: int):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.wait_sec = wait_sec
+        self.retry_after = retry_after
+        self.active = 0
+        self._waiters: deque = deque()
+
+    async def acquire(self) -> float:
+        """Returns seconds spent queued; raises Rejected."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return 0.0
+        if len(self._waiters) >= self.queue:
+            raise Rejected("queue_full")
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        t0 = time.monotonic()
+        try:
+            await asyncio.wait_for(fut, self.wait_sec)
+        except asyncio.TimeoutError:
+            self._discard(fut)
+            raise Rejected("timeout")
+        except asyncio.CancelledError:
+            # 클라이언트가 끊겼는데 이미 슬롯을 넘겨받았다면 돌려준다
+            self._discard(fut)
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+        return time.monotonic() - t0
+
+    def _discard(self, fut):
+        try:
+            self._waiters.remove(fut)
+        except ValueError:
+            pass
+
+    def release(self):
+        # 대기자가 있으면 슬롯을 그대로 넘긴다 (active 유지)
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionController:
+    def __init__(self, rules=ROUTE_RULES, gates=DEFAULT_GATES):
+        self.enabled = os.getenv("ADMISSION", "1") != "0"
+        self.rules = rules
+        self.gates: Dict[str, Gate] = {}
+        for name, (limit, queue, wait_sec, retry_after) in gates.items():
+            env = f"ADMISSION_{name.upper()}"
+            self.gates[name] = Gate(
+                name,
+                int(os.getenv(f"{env}_LIMIT", limit)),
+                int(os.getenv(f"{env}_QUEUE", queue)),
+                float(os.getenv(f"{env}_WAIT_SEC", wait_sec)),
+                int(os.getenv(f"{env}_RETRY_AFTER", retry_after)),
+            )
+        self.routes: Dict[str, RouteStats] = {}
+
+    def classify(self, method: str, path: str, template: Optional[str] = None) -> Tuple[str, str]:
+        """(gate name, stats key). `template` is the matched route's path template, if any."""
+        for prefix, rule_method, gate in self.rules:
+            if path.startswith(prefix) and (rule_method is None or rule_method == method):
+                return gate, f"{method} {prefix}"
+        # 경로 변수(id, 세션 토큰 등)마다 키가 늘지 않도록 라우트 템플릿으로 묶는다
+        return "default", f"{method} {template or '(unmatched)'}"
+
+    def gated_capacity(self) -> int:
+        return sum(g.limit for g in self.gates.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "gates": {
+                name: {"limit": g.limit, "queue": g.queue, "wait_sec": g.wait_sec, "active": g.active, "waiting": len(g._waiters)}
+                for name, g in self.gates.items()
+            },
+            "routes": {k: v.as_dict() for k, v in sorted(self.routes.items())},
+        }
+
+
+def route_template(scope) -> Optional[str]:
+    """Path template of the app route the request will hit, e.g. /api/hr-sessions/{session_id}/samples."""
+    for route in getattr(scope.get("app"), "routes", ()):
+        match, _ = route.matches(scope)
+        if match != Match.NONE:
+            return route.path
+    return None
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        ctl = self.controller
+        if scope["type"] != "http" or not ctl.enabled or scope["method"] == "OPTIONS" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+        gate_name, key = ctl.classify(scope["method"], scope["path"], route_template(scope))
+        stats = ctl.routes.get(key)
+        if stats is None:
+            stats = ctl.routes[key] = RouteStats()
+        gate = ctl.gates.get(gate_name) if gate_name != CHEAP else None
+        if gate is None:
+            stats.admitted += 1
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            waited = await gate.acquire()
+        except Rejected as e:
+            stats.rejected[e.reason] = stats.rejected.get(e.reason, 0) + 1
+            await self._reject(send, gate)
+            return
+        stats.admitted += 1
+        if waited:
+            ms = waited * 1000
+            stats.queued += 1
+            stats.queue_ms_total += ms
+            stats.queue_ms_max = max(stats.queue_ms_max, ms)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
+
+    async def _reject(self, send, gate: Gate):
+        body = json.dumps({"detail": "요청이 많아 잠시 후 다시 시도해 주세요."}, ensure_ascii=False).encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(max(1, math.ceil(gate.retry_after))).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
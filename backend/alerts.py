@@ -0,0 +1,190 @@
+"""Coach alerts derived from predictions, pushed to clients over server-sent events.
+
+derive_alerts() compares a user's new prediction with their previous one and emits
+alerts for a risk bucket change, crossing the sleep-debt threshold, or an ACWR
+(acute:chronic workload ratio) spike.
+
+AlertHub is an in-process pub/sub: each SSE connection is a Subscriber holding a
+bounded deque, so a slow client drops its oldest alerts instead of growing memory.
+publish() is called from worker threads (sync endpoints) and hands the fan-out to
+the event loop with call_soon_threadsafe. Subscribers live in one worker process;
+with HYUGA_WORKERS > 1 a client only sees alerts from predictions served by the
+worker it is connected to.
+
+EventSource cannot send an Authorization header, so browsers first exchange their
+bearer token for a stream ticket (issue_ticket) and pass that in the query string.
+A ticket is single-use and expires after TICKET_TTL_SEC, so a URL that ends up in
+an access log is no longer a usable credential. Tickets are stored hashed in SQLite,
+so the stream can be opened on any worker.
+"""
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+SLEEP_DEBT_ALERT_H = float(os.getenv("ALERT_SLEEP_DEBT_H", "1.5"))
+ACWR_SPIKE = float(os.getenv("ALERT_ACWR_SPIKE", "1.5"))
+BUFFER_SIZE = int(os.getenv("ALERT_BUFFER_SIZE", "32"))
+MAX_SUBSCRIPTIONS_PER_USER = int(os.getenv("ALERT_MAX_SUBSCRIPTIONS_PER_USER", "5"))
+HEARTBEAT_SEC = 15.0
+TICKET_TTL_SEC = float(os.getenv("ALERT_TICKET_TTL_SEC", "60"))
+
+TICKET_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stream_tickets (
+    ticket_hash TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    expires_at TEXT NOT NULL
+);
+"""
+
+_RISK_ORDER = {None: 0, "yellow": 1, "red": 2}
+_RISK_LABEL = {None: "정상", "yellow": "주의", "red": "위험"}
+
+
+def derive_alerts(prev: Optional[Dict[str, Any]], cur: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """prev/cur: {"risk", "sleep_debt", "acwr"} for the previous and new prediction."""
+    prev = prev or {"risk": None, "sleep_debt": 0.0, "acwr": 0.0}
+    out: List[Dict[str, Any]] = []
+    if cur["risk"] != prev["risk"]:
+        worse = _RISK_ORDER[cur["risk"]] > _RISK_ORDER[prev["risk"]]
+        out.append({
+            "kind": "risk_change",
+            "level": cur["risk"] or "info",
+            "message": f"과훈련 위험도 {_RISK_LABEL[prev['risk']]} → {_RISK_LABEL[cur['risk']]}"
+            + (" · 오늘은 회복에 집중하세요" if worse else " · 회복이 잘 되고 있어요"),
+        })
+    if cur["sleep_debt"] >= SLEEP_DEBT_ALERT_H > prev["sleep_debt"]:
+        out.append({
+            "kind": "sleep_debt",
+            "level": "yellow",
+            "message": f"수면부채 {cur['sleep_debt']:.1f}시간 → 파워냅 20분 제안",
+        })
+    if cur["acwr"] >= ACWR_SPIKE > prev["acwr"]:
+        out.append({
+            "kind": "acwr_spike",
+            "level": "red" if cur["acwr"] >= ACWR_SPIKE + 0.5 else "yellow",
+            "message": f"급성:만성 부하 비율 {cur['acwr']:.2f} → 이번 주 훈련량 조절 권장",
+        })
+    return out
+
+
+class Subscriber:
+    __slots__ = ("user_id", "buffer", "event", "dropped")
+
+    def __init__(self, user_id: int, size: int):
+        self.user_id = user_id
+        self.buffer: deque = deque(maxlen=size)
+        self.event = asyncio.Event()
+        self.dropped = 0
+
+    def push(self, item: Dict[str, Any]):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(item)
+        self.event.set()
+
+
+class AlertHub:
+    def __init__(self, buffer_size: int = BUFFER_SIZE, max_per_user: int = MAX_SUBSCRIPTIONS_PER_USER):
+        self.buffer_size = buffer_size
+        self.max_per_user = max_per_user
+        self._subs: Dict[int, Set[Subscriber]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, user_id: int) -> Optional[Subscriber]:
+        """Must be called on the event loop. None when the user is at the connection limit."""
+        self._loop = asyncio.get_running_loop()
+        subs = self._subs.setdefault(user_id, set())
+        if len(subs) >= self.max_per_user:
+            return None
+        sub = Subscriber(user_id, self.buffer_size)
+        subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        subs = self._subs.get(sub.user_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._subs[sub.user_id]
+
+    def has_subscribers(self, user_id: int) -> bool:
+        return user_id in self._subs
+
+    def publish(self, user_id: int, alerts: List[Dict[str, Any]]):
+        """Thread-safe; a no-op when the user has no open stream."""
+        if not alerts or user_id not in self._subs or self._loop is None:
+            return
+        stamped = [{**a, "published_at": time.time()} for a in alerts]
+        self._loop.call_soon_threadsafe(self._fanout, user_id, stamped)
+
+    def _fanout(self, user_id: int, alerts: List[Dict[str, Any]]):
+        self.published += len(alerts)
+        for sub in self._subs.get(user_id, ()):
+            for a in alerts:
+                sub.push(a)
+                self.delivered += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "users": len(self._subs),
+            "subscribers": sum(len(s) for s in self._subs.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": sum(sub.dropped for s in self._subs.values() for sub in s),
+        }
+
+
+def _ticket_hash(ticket: str) -> str:
+    return hashlib.sha256(ticket.encode("utf-8")).hexdigest()
+
+
+def issue_ticket(conn: sqlite3.Connection, user_id: int) -> Tuple[str, str]:
+    """(ticket, expires_at) for one stream connection; call inside the write transaction."""
+    now = datetime.utcnow()
+    conn.execute("DELETE FROM stream_tickets WHERE expires_at < ?", (now.isoformat(),))
+    ticket = secrets.token_urlsafe(24)
+    expires_at = (now + timedelta(seconds=TICKET_TTL_SEC)).isoformat()
+    conn.execute(
+        "INSERT INTO stream_tickets (ticket_hash, user_id, expires_at) VALUES (?, ?, ?)",
+        (_ticket_hash(ticket), user_id, expires_at),
+    )
+    return ticket, expires_at
+
+
+def redeem_ticket(conn: sqlite3.Connection, ticket: str) -> Optional[int]:
+    """Consumes the ticket and returns its user id, or None if unknown, used or expired."""
+    row = conn.execute(
+        "DELETE FROM stream_tickets WHERE ticket_hash = ? RETURNING user_id, expires_at", (_ticket_hash(ticket),)
+    ).fetchone()
+    if row is None or row["expires_at"] < datetime.utcnow().isoformat():
+        return None
+    return row["user_id"]
+
+
+def format_sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+
+async def sse_stream(hub: AlertHub, sub: Subscriber, heartbeat_sec: float = HEARTBEAT_SEC) -> AsyncIterator[str]:
+    try:
+        yield f"retry: 5000\n{format_sse('ready', {'at': datetime.utcnow().isoformat()})}"
+        while True:
+            try:
+                await asyncio.wait_for(sub.event.wait(), heartbeat_sec)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            sub.event.clear()
+            while sub.buffer:
+                yield format_sse("alert", sub.buffer.popleft())
+    finally:
+        hub.unsubscribe(sub)
@@ -1,21 +1,76 @@
-from typing import List, Optional
+import time
+
+_IMPORT_T0 = time.perf_counter()  # 콜드 스타트 구간 측정 기준점
+
+from typing import List, Optional, Tuple
 import hashlib
 import secrets
 import sqlite3
 import json
 import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
 from pathlib import Path
-from fastapi import FastAPI, Header, HTTPException, status, Query
+from fastapi import FastAPI, Header, HTTPException, status, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field, EmailStr
-from datetime import datetime, timedelta
-import requests
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
 from typing import Any
 
-
-app = FastAPI(title="Hyuga Recovery API", version="0.1.0")
-
+import account_purge
+import admission
+import alerts
+import encoding
+import hr_streams
+import http_cache
+import mirror
+import percentiles
+import retention
+import rollups
+import routine_rank
+import scoring
+import sync
+import team
+import traffic
+
+try:
+    import fcntl
+except ImportError:  # Windows: 프로세스 간 락 없이 스레드 락만 사용
+    fcntl = None
+
+# 시작 시간 분해 (/api/health/startup)
+_STARTUP_TIMINGS = {"imports_ms": round((time.perf_counter() - _IMPORT_T0) * 1000, 1)}
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # 스키마 확인은 import가 아니라 여기서 (HYUGA_LAZY_DB=1이면 첫 DB 사용 시점까지 미룸)
+    if os.getenv("HYUGA_LAZY_DB") != "1":
+        _ensure_db()
+    _start_background_jobs()
+    # 게이트 한도 합보다 스레드를 넉넉히 두어 가벼운 엔드포인트가 항상 바로 실행되게 한다
+    import anyio.to_thread
+
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = max(limiter.total_tokens, _admission.gated_capacity() + int(os.getenv("ADMISSION_CHEAP_RESERVE", "8")))
+    _STARTUP_TIMINGS["ready_ms"] = round((time.perf_counter() - _IMPORT_T0) * 1000, 1)
+    print(f"[startup] {_STARTUP_TIMINGS}")
+    yield
+    _jobs_stop.set()
+
+
+app = FastAPI(title="Hyuga Recovery API", version="0.1.0", lifespan=_lifespan)
+
+# 경로별 동시 실행 한도/대기열 (CORS보다 안쪽이라 503에도 CORS 헤더가 붙는다)
+_admission = admission.AdmissionController()
+app.add_middleware(admission.AdmissionMiddleware, controller=_admission)
+# 재생 테스트용 트래픽 캡처 (HYUGA_CAPTURE=<파일>, 기본 꺼짐). 재생기는 replay.py
+if os.getenv("HYUGA_CAPTURE"):
+    app.add_middleware(traffic.CaptureMiddleware, path=os.getenv("HYUGA_CAPTURE"), sample=float(os.getenv("HYUGA_CAPTURE_SAMPLE", "1")))
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -24,7 +79,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-DB_PATH = Path(__file__).parent / "hyuga.db"
 ENV_PATH = Path(__file__).parent / ".env"
 
 if ENV_PATH.exists():
@@ -32,61 +86,264 @@ if ENV_PATH.exists():
 else:
   load_dotenv()
 
+# 스케일 테스트/리플레이용 DB를 따로 쓸 수 있도록 경로를 환경변수로 덮어쓸 수 있음
+DB_PATH = Path(os.getenv("HYUGA_DB_PATH") or Path(__file__).parent / "hyuga.db")
 
-def _get_db():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=10)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON")
     return conn
 
 
+def _get_db():
+    _ensure_db()
+    return _connect()
+
+
+# 여러 워커가 같은 DB 파일을 쓰면 "database is locked"가 난다.
+# 읽기는 WAL 덕분에 워커마다 병렬로 처리하고, 쓰기는 이 락으로 한 번에 하나씩만 통과시킨다.
+WRITE_LOCK_PATH = DB_PATH.with_name(DB_PATH.name + ".writelock")
+_write_thread_lock = threading.Lock()
+_write_lock_file = None
+
+
+@contextmanager
+def _write_lock():
+    global _write_lock_file
+    with _write_thread_lock:
+        if fcntl is None:
+            yield
+            return
+        if _write_lock_file is None:
+            _write_lock_file = open(WRITE_LOCK_PATH, "a+")
+        fcntl.flock(_write_lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(_write_lock_file.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def _write_db():
+    """단일 writer 구간에서 쓰기 트랜잭션을 열고, 정상 종료 시 커밋한다."""
+    # 스키마 초기화도 writer 락을 잡으므로 락 밖에서 먼저 끝낸다 (재진입 교착 방지)
+    _ensure_db()
+    with _write_lock():
+        conn = _connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
 def _init_db():
+    with _write_lock():
+        conn = _connect()
+        try:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    email TEXT UNIQUE NOT NULL,
+                    password_hash TEXT NOT NULL,
+                    name TEXT DEFAULT '',
+                    created_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS tokens (
+                    token TEXT PRIMARY KEY,
+                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                    created_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS user_todos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                    title TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    time TEXT NOT NULL,
+                    is_done INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS user_predictions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                    payload_json TEXT NOT NULL,
+                    result_json TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS user_routine_runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                    title TEXT NOT NULL,
+                    duration_min INTEGER DEFAULT 0,
+                    note TEXT DEFAULT '',
+                    created_at TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_user_predictions_user_created ON user_predictions(user_id, created_at);
+                CREATE TABLE IF NOT EXISTS predict_idempotency (
+                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                    key_hash TEXT NOT NULL,
+                    payload_hash TEXT NOT NULL,
+                    prediction_id INTEGER,
+                    result_json TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    PRIMARY KEY (user_id, key_hash)
+                );
+                CREATE INDEX IF NOT EXISTS idx_predict_idempotency_created ON predict_idempotency(created_at);
+                """
+            )
+            # 기존 DB 마이그레이션: 탈퇴 표시 컬럼
+            if "deleted_at" not in {r["name"] for r in conn.execute("PRAGMA table_info(users)")}:
+                conn.execute("ALTER TABLE users ADD COLUMN deleted_at TEXT")
+            conn.executescript(account_purge.SCHEMA)
+            conn.executescript(alerts.TICKET_SCHEMA)
+            conn.executescript(retention.ARCHIVE_SCHEMA)
+            conn.executescript(mirror.MIRROR_SCHEMA)
+            conn.executescript(percentiles.SCHEMA)
+            conn.executescript(routine_rank.SCHEMA)
+            hr_streams.migrate(conn)
+            # 할 일/루틴 기록의 변경 버전·삭제 기록 (기존 행은 여기서 번호를 받는다)
+            sync.migrate(conn)
+            # 코치 로스터와 선수별 최신 활동 요약 (처음 만들 때 기존 기록으로 채운다)
+            team.migrate(conn)
+            # 추세 롤업 (비어 있으면 저장된 예측과 아카이브로 채운다)
+            rollups.migrate(conn, _trend_values)
+            try:
+                conn.executescript(mirror.COURSE_FTS_SCHEMA)
+            except sqlite3.OperationalError as e:
+                # FTS5 없이 빌드된 SQLite: 강좌 검색은 LIKE로 동작
+                print(f"[db] course FTS index unavailable: {e}")
+            conn.commit()
+        finally:
+            conn.close()
+
+
+_db_ready = False
+_db_ready_lock = threading.Lock()
+
+
+def _ensure_db():
+    global _db_ready
+    if _db_ready:
+        return
+    with _db_ready_lock:
+        if not _db_ready:
+            t = time.perf_counter()
+            _init_db()
+            _STARTUP_TIMINGS["db_init_ms"] = round((time.perf_counter() - t) * 1000, 1)
+            _db_ready = True
+
+
+# 백그라운드 작업: 워커마다 스레드를 띄우지만 작업별 파일 락을 잡은 한 프로세스만 실제로 실행한다
+_jobs_stop = threading.Event()
+
+
+@contextmanager
+def _job_lock(name: str):
+    if fcntl is None:
+        yield True
+        return
+    with open(DB_PATH.with_name(f"{DB_PATH.name}.{name}.lock"), "a+") as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _start_periodic(name: str, interval_sec: float, fn):
+    def loop():
+        while not _jobs_stop.is_set():
+            with _job_lock(name) as owner:
+                if owner:
+                    try:
+                        fn()
+                    except Exception as e:
+                        print(f"[job] {name} failed: {e}")
+            _jobs_stop.wait(interval_sec)
+
+    t = threading.Thread(target=loop, name=f"hyuga-{name}", daemon=True)
+    t.start()
+    return t
+
+
+def _sync_mirror(name: str):
+    upstream = _upstream(name.upper())
+    if upstream:
+        # 응답 캐시를 거치지 않는다: 캐시된 이전 응답은 동기화를 한 주기 늦추고 totalCount 비교를 흐린다.
+        # 업스트림이 실패하면 미러 테이블이 그대로 남으므로 그것이 곧 stale-if-error 역할을 한다
+        print(f"[mirror] {name} {mirror.sync_dataset(name, _fetch_upstream, _write_db, _get_db, upstream)}")
+
+
+def _build_percentiles():
     conn = _get_db()
-    conn.executescript(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            name TEXT DEFAULT '',
-            created_at TEXT NOT NULL
-        );
-        CREATE TABLE IF NOT EXISTS tokens (
-            token TEXT PRIMARY KEY,
-            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-            created_at TEXT NOT NULL
-        );
-        CREATE TABLE IF NOT EXISTS user_todos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-            title TEXT NOT NULL,
-            date TEXT NOT NULL,
-            time TEXT NOT NULL,
-            is_done INTEGER NOT NULL DEFAULT 0,
-            created_at TEXT NOT NULL
-        );
-        CREATE TABLE IF NOT EXISTS user_predictions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-            payload_json TEXT NOT NULL,
-            result_json TEXT NOT NULL,
-            created_at TEXT NOT NULL
-        );
-        CREATE TABLE IF NOT EXISTS user_routine_runs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-            title TEXT NOT NULL,
-            duration_min INTEGER DEFAULT 0,
-            note TEXT DEFAULT '',
-            created_at TEXT NOT NULL
-        );
-        """
-    )
-    conn.commit()
-    conn.close()
+    try:
+        workers = int(os.getenv("PERCENTILE_WORKERS", "2"))
+        print(f"[percentiles] {percentiles.build(conn, str(DB_PATH), _write_lock, workers=workers)}")
+    finally:
+        conn.close()
+
+
+def _purge_deleted_accounts():
+    conn = _get_db()
+    try:
+        res = account_purge.run_purge(conn, _write_lock)
+        if res["queued"]:
+            print(f"[purge] {res}")
+    finally:
+        conn.close()
 
 
-_init_db()
+def _compact_sync_tombstones():
+    conn = _get_db()
+    try:
+        res = sync.compact(conn, _write_lock, float(os.getenv("SYNC_TOMBSTONE_TTL_DAYS", "30")))
+        if res["removed"]:
+            print(f"[sync] {res}")
+    finally:
+        conn.close()
+
+
+def _refresh_routine_rank():
+    conn = _get_db()
+    try:
+        res = routine_rank.refresh(conn, _routine_catalog(), _write_lock)
+        if res["users"]:
+            print(f"[routine-rank] {res}")
+    finally:
+        conn.close()
+
+
+def _start_background_jobs():
+    _jobs_stop.clear()
+    for name, default_min in (("nfa", "360"), ("courses", "720")):
+        interval = float(os.getenv(f"{name.upper()}_SYNC_INTERVAL_MIN", default_min))
+        if interval > 0 and _upstream(name.upper()):
+            _start_periodic(f"{name}-sync", interval * 60, lambda name=name: _sync_mirror(name))
+    interval = float(os.getenv("PERCENTILE_REFRESH_MIN", "60"))
+    if interval > 0:
+        _start_periodic("percentiles", interval * 60, _build_percentiles)
+    interval = float(os.getenv("ACCOUNT_PURGE_INTERVAL_SEC", "30"))
+    if interval > 0:
+        _start_periodic("account-purge", interval, _purge_deleted_accounts)
+    interval = float(os.getenv("ROUTINE_RANK_INTERVAL_MIN", "15"))
+    if interval > 0:
+        _start_periodic("routine-rank", interval * 60, _refresh_routine_rank)
+    interval = float(os.getenv("SYNC_COMPACT_INTERVAL_MIN", "360"))
+    if interval > 0:
+        _start_periodic("sync-compact", interval * 60, _compact_sync_tombstones)
 
 
 class WorkoutInput(BaseModel):
@@ -101,6 +358,9 @@ class WorkoutInput(BaseModel):
     last7_load: float = Field(default=0, ge=0)
     last28_load: float = Field(default=0, ge=0)
     hi_streak_days: int = Field(default=0, ge=0)
+    # 심박 스트림으로 계산한 세션 부하. 있으면 avg_hr/max_hr·RPE 추정 대신 쓴다
+    trimp: Optional[float] = Field(default=None, ge=0)
+    hr_session_id: Optional[str] = Field(default=None, max_length=64, description="업로드한 심박 세션 (trimp를 채움)")
 
 
 class RecoveryWindow(BaseModel):
@@ -116,6 +376,7 @@ class PredictOutput(BaseModel):
     overtraining_risk: Optional[str]
     nfa_delta: Optional[int] = None
     nfa_source: Optional[str] = None
+    percentile_rank: Optional[float] = None
 
 
 class ROIReportInput(BaseModel):
@@ -195,6 +456,64 @@ class ReportSummary(BaseModel):
     recent_windows: Optional[List[RecoveryWindow]]
     nfa_delta: Optional[int] = None
     nfa_source: Optional[str] = None
+    percentile_rank: Optional[float] = None
+
+
+class AccountDeletionStatus(BaseModel):
+    deletion_id: str
+    status: str
+    deleted_rows: dict
+    requested_at: str
+    updated_at: str
+    completed_at: Optional[str] = None
+
+
+class StreamTicket(BaseModel):
+    ticket: str
+    expires_at: str
+
+
+class HRSessionCreate(BaseModel):
+    max_hr: int = Field(ge=100, le=230)
+    rest_hr: int = Field(default=60, ge=30, le=99)  # Banister TRIMP의 심박 예비량 기준
+
+
+class HRSessionSummary(BaseModel):
+    session_id: str
+    max_hr: float
+    rest_hr: float
+    samples: int
+    rejected: int
+    duration_min: float
+    trimp: float
+    avg_hr: Optional[float] = None
+    peak_hr: Optional[float] = None
+    zone_min: List[float]  # Z1..Z5 (최대심박 <60, 60-70, 70-80, 80-90, 90%+)
+    updated_at: str
+
+
+class TrendStat(BaseModel):
+    n: int
+    sum: float
+    avg: Optional[float]
+    min: Optional[float]
+    max: Optional[float]
+
+
+class TrendPoint(BaseModel):
+    bucket_start: str
+    predictions: int
+    fatigue: TrendStat
+    load: TrendStat
+    roi: TrendStat
+
+
+class PredictionRecord(BaseModel):
+    id: int
+    created_at: str
+    payload: dict
+    result: dict
+    archived: bool = False
 
 
 class NFABaselineRow(BaseModel):
@@ -249,7 +568,69 @@ class TodoOut(BaseModel):
     created_at: datetime
 
 
+class RoutineRunOut(BaseModel):
+    id: int
+    title: str
+    duration_min: int
+    note: str
+    created_at: datetime
+
+
+class SyncTodoChanges(BaseModel):
+    upserted: List[TodoOut]
+    deleted: List[int]
+
+
+class SyncRoutineRunChanges(BaseModel):
+    upserted: List[RoutineRunOut]
+    deleted: List[int]
+
+
+class SyncResponse(BaseModel):
+    version: int  # 다음 요청의 since
+    reset: bool  # true면 로컬 사본을 버리고 이 응답부터 다시 쌓는다
+    has_more: bool  # true면 version으로 바로 이어서 요청
+    todos: SyncTodoChanges
+    routine_runs: SyncRoutineRunChanges
+
+
+class TeamCoachAdd(BaseModel):
+    coach_email: EmailStr
+
+
+class TeamCoach(BaseModel):
+    coach_id: int
+    name: str
+    email: str
+    created_at: datetime
+
+
+class TeamAthleteSummary(BaseModel):
+    athlete_id: int
+    name: str
+    email: str
+    joined_at: str
+    last_prediction_at: Optional[str]
+    last_fatigue: Optional[int]
+    last_overtraining_risk: Optional[str]
+    last_roi_pct: Optional[int]
+    percentile_rank: Optional[float]
+    fatigue_avg_7d: Optional[float]
+    predictions_7d: int
+    routine_runs: int
+    last_run_title: Optional[str]
+    last_run_at: Optional[str]
+
+
+class TeamSummaryPage(BaseModel):
+    athletes: List[TeamAthleteSummary]
+    next_cursor: Optional[int]  # 다음 페이지의 cursor (null이면 마지막 페이지)
+
+
 def _session_trimp(inp: WorkoutInput) -> float:
+    if inp.trimp is not None:
+        # 심박 스트림 샘플별 Banister TRIMP (hr_streams.TrimpAccumulator)
+        return inp.trimp
     if inp.avg_hr and inp.max_hr:
         hr_ratio = max(0.0, min(1.0, (inp.avg_hr) / float(inp.max_hr)))
     else:
@@ -259,25 +640,32 @@ def _session_trimp(inp: WorkoutInput) -> float:
     return inp.duration_min * (0.64 * (2.71828 ** (1.92 * hr_ratio)))
 
 
-def _fatigue_score(inp: WorkoutInput) -> int:
+def _score_features(inp: WorkoutInput) -> dict:
+    """Model input: the workout fields plus the derived loads every engine sees."""
+    f = inp.model_dump(exclude={"hr_session_id"})
     load = _session_trimp(inp)
-    acute = inp.last7_load + load
-    chronic = max(1.0, inp.last28_load / 4.0)
-    atl_ctl = acute / chronic
-    sleep_debt = max(0.0, 8.0 - inp.sleep_hours)
+    f["session_load"] = load
+    f["acwr"] = (inp.last7_load + load) / max(1.0, inp.last28_load / 4.0)
+    f["sleep_debt"] = max(0.0, 8.0 - inp.sleep_hours)
+    return f
+
+
+def _heuristic_fatigue_score(f: dict) -> int:
+    atl_ctl = f["acwr"]
+    sleep_debt = f["sleep_debt"]
     env_penalty = 0.0
-    if inp.temp_c is not None and inp.humidity is not None:
+    if f["temp_c"] is not None and f["humidity"] is not None:
         # Add penalty for heat/humidity load
-        heat_indexish = max(0.0, (inp.temp_c - 20.0)) * (0.5 + (inp.humidity / 200.0))
+        heat_indexish = max(0.0, (f["temp_c"] - 20.0)) * (0.5 + (f["humidity"] / 200.0))
         env_penalty = min(20.0, heat_indexish)
-    streak_penalty = min(20.0, inp.hi_streak_days * 3.0)
+    streak_penalty = min(20.0, f["hi_streak_days"] * 3.0)
     base = 50 * (atl_ctl - 1.0) + sleep_debt * 5 + env_penalty + streak_penalty
     # Normalize to 0-100
     score = int(max(0, min(100, round(40 + base / 2.0))))
     return score
 
 
-def _roi_for_rest(fatigue: int, minutes: int, sleep_hours: float) -> int:
+def _heuristic_roi_for_rest(fatigue: float, minutes: float, sleep_hours: float) -> int:
     # Diminishing returns curve based on fatigue and duration
     rest_factor = (1 - (2.71828 ** (-minutes / 60.0)))
     sleep_factor = min(1.0, (sleep_hours / 8.0))
@@ -286,6 +674,20 @@ def _roi_for_rest(fatigue: int, minutes: int, sleep_hours: float) -> int:
     return max(0, min(50, roi))
 
 
+# 점수 엔진: 기본은 위 휴리스틱, MODEL_DIR/registry.json으로 모델 파일을 무중단 교체 (scoring.py)
+MODEL_DIR = Path(os.getenv("HYUGA_MODEL_DIR") or Path(__file__).parent / "models")
+_heuristic_engine = scoring.HeuristicEngine(_heuristic_fatigue_score, _heuristic_roi_for_rest)
+_scoring = scoring.ModelRegistry(MODEL_DIR, _heuristic_engine, reload_sec=float(os.getenv("SCORING_RELOAD_SEC", "5")))
+
+
+def _fatigue_score(inp: WorkoutInput) -> int:
+    return _scoring.fatigue_batch([_score_features(inp)])[0]
+
+
+def _roi_for_rest(fatigue: int, minutes: int, sleep_hours: float) -> int:
+    return _scoring.roi_batch([(fatigue, minutes, sleep_hours)])[0]
+
+
 def _risk_bucket(fatigue: int, sleep_debt: float, hi_streak: int) -> Optional[str]:
     if fatigue >= 80 or (sleep_debt >= 2 and hi_streak >= 2):
         return "red"
@@ -294,6 +696,135 @@ def _risk_bucket(fatigue: int, sleep_debt: float, hi_streak: int) -> Optional[st
     return None
 
 
+def _trend_values(payload: dict, result: dict) -> rollups.Values:
+    """(fatigue, training load, ROI) that a stored prediction contributes to the trend rollups."""
+    if "fatigue_score" in result:
+        return float(result["fatigue_score"]), round(_session_trimp(WorkoutInput(**payload)), 1), None
+    if "recovery_efficiency_score" in result:
+        return None, None, float(result["recovery_efficiency_score"])
+    return None, None, None
+
+
+def _alert_state(inp: WorkoutInput, risk: Optional[str]) -> dict:
+    # ACWR은 _fatigue_score의 atl/ctl과 같은 정의; 만성 부하 기록이 없으면 계산하지 않음
+    acwr = (inp.last7_load + _session_trimp(inp)) / (inp.last28_load / 4.0) if inp.last28_load > 0 else 0.0
+    return {"risk": risk, "sleep_debt": max(0.0, 8.0 - inp.sleep_hours), "acwr": acwr}
+
+
+def _recent_alert_states(conn: sqlite3.Connection, user_id: int, n: int) -> List[dict]:
+    """Alert states of the user's last n workout predictions, newest first."""
+    out: List[dict] = []
+    for r in conn.execute(
+        "SELECT payload_json, result_json FROM user_predictions WHERE user_id = ? ORDER BY id DESC LIMIT 20",
+        (user_id,),
+    ):
+        res = json.loads(r["result_json"])
+        if "fatigue_score" not in res:
+            continue  # roi_report 행
+        out.append(_alert_state(WorkoutInput(**json.loads(r["payload_json"])), res.get("overtraining_risk")))
+        if len(out) >= n:
+            break
+    return out
+
+
+# 사용자별 SSE 구독자에게 코치 알림을 밀어 준다 (워커 프로세스 내부)
+_alert_hub = alerts.AlertHub()
+
+
+# 배치 작업(percentiles.build)이 만든 점수 분포를 프로세스 메모리에 올려 두고 조회 (주기적으로 다시 읽음)
+_percentiles = percentiles.PercentileIndex(_get_db)
+
+
+def _reference_delta(fatigue: int, ref: Optional[Tuple[int, str]] = None) -> Tuple[Optional[float], int, str]:
+    """(None, delta, source) against the NFA reference score, or a fixed 60 without one."""
+    if ref:
+        ref_score, ref_src = ref
+        return None, fatigue - ref_score, f"NFA {ref_score}점 기준 ({ref_src})"
+    return None, fatigue - 60, "NFA 샘플 기준 60점 대비"
+
+
+def _population_delta(fatigue: int, cohort: str = percentiles.ALL, ref: Optional[Tuple[int, str]] = None) -> Tuple[Optional[float], int, str]:
+    """(percentile rank, delta, source) against the stored population; the NFA reference until enough samples exist."""
+    pop = _percentiles.rank(fatigue, cohort)
+    if pop is None:
+        return _reference_delta(fatigue, ref)
+    rank, median, total = pop
+    return rank, fatigue - median, f"사용자 분포 중앙값 {median}점 대비 (예측 {total}건)"
+
+
+def _score_workout(inp: WorkoutInput, ref: Optional[tuple[int, str]] = None, population: bool = False) -> PredictOutput:
+    fatigue = _fatigue_score(inp)
+    sleep_debt = max(0.0, 8.0 - inp.sleep_hours)
+    risk = _risk_bucket(fatigue, sleep_debt, inp.hi_streak_days)
+
+    # Recovery windows: immediate, short-term, overnight (ROI는 한 번의 배치 호출로)
+    roi_now, roi_short, roi_night = _scoring.roi_batch([(fatigue, m, inp.sleep_hours) for m in (20, 120, 8 * 60)])
+    windows = [
+        RecoveryWindow(label="즉시", recommend_min=20, expected_roi_pct=roi_now, note="짧은 브리딩+스트레칭"),
+        RecoveryWindow(label="단기", recommend_min=120, expected_roi_pct=roi_short, note="낮잠 20분 또는 냉온 교대"),
+        RecoveryWindow(label="야간", recommend_min=8 * 60, expected_roi_pct=roi_night, note="7~9시간 수면")
+    ]
+    # If risk high, be more conservative: bump durations a bit
+    if risk == "red":
+        for w in windows:
+            w.recommend_min = int(w.recommend_min * 1.2)
+    elif risk == "yellow":
+        for w in windows:
+            w.recommend_min = int(w.recommend_min * 1.1)
+
+    # 사용자 분포(표본이 충분할 때) > NFA 기준 점수 > 고정 60점 순으로 비교 기준을 고른다
+    if population:
+        percentile_rank, nfa_delta, nfa_source = _population_delta(fatigue, percentiles.cohort_of(inp.model_dump()), ref)
+    else:
+        percentile_rank, nfa_delta, nfa_source = _reference_delta(fatigue, ref)
+
+    return PredictOutput(
+        fatigue_score=fatigue,
+        recovery_windows=windows,
+        overtraining_risk=risk,
+        nfa_delta=nfa_delta,
+        nfa_source=nfa_source,
+        percentile_rank=percentile_rank,
+    )
+
+
+def _score_roi_report(inp: ROIReportInput) -> ROIReportOutput:
+    points: List[ROIDataPoint] = []
+    total_work = 0.0
+    total_recov = 0.0
+    for i, w in enumerate(inp.weekly_sessions):
+        load = _session_trimp(w)
+        # Assume recovery actions are proportional to rest taken (sleep + micro breaks)
+        recovery = max(0.0, (w.sleep_hours - 6.0)) * 10.0
+        total_work += load
+        total_recov += recovery
+        ratio = recovery / (load + 1e-6)
+        points.append(ROIDataPoint(day=f"D{i+1}", workout_load=round(load, 1), recovery_load=round(recovery, 1), ratio=round(ratio, 2)))
+
+    # Efficiency is ratio scaled and capped
+    avg_ratio = (total_recov / (total_work + 1e-6)) if total_work > 0 else 0.0
+    efficiency = int(max(0, min(100, round(60 + (avg_ratio - 0.2) * 100))))
+
+    # Expected next performance change: depend on last day fatigue and planned rest window (estimate)
+    last = inp.weekly_sessions[-1] if inp.weekly_sessions else WorkoutInput(duration_min=0, avg_hr=120, max_hr=190, rpe=3, sleep_hours=7, temp_c=22, humidity=40, last7_load=0, last28_load=0, hi_streak_days=0)
+    fatigue = _fatigue_score(last)
+    # Assume user rests 3h before next workout by default
+    perf_change = _roi_for_rest(fatigue, 180, last.sleep_hours)
+
+    badge = "Bronze"
+    if efficiency >= 75:
+        badge = "Gold"
+    elif efficiency >= 65:
+        badge = "Silver"
+
+    return ROIReportOutput(
+        recovery_efficiency_score=efficiency,
+        weekly_recovery_ratio=points,
+        expected_next_performance_change_pct=perf_change,
+        rest_accrual_badge=badge,
+    )
+
+
 def _hash_password(raw: str) -> str:
     salt = secrets.token_hex(16)
     hashed = hashlib.pbkdf2_hmac("sha256", raw.encode("utf-8"), salt.encode("utf-8"), 120_000)
@@ -325,7 +856,6 @@ def _issue_token(conn: sqlite3.Connection, user_id: int) -> str:
         "INSERT OR REPLACE INTO tokens (token, user_id, created_at) VALUES (?, ?, ?)",
         (token, user_id, now),
     )
-    conn.commit()
     return token
 
 
@@ -339,7 +869,7 @@ def _get_user_by_token(authorization: Optional[str]) -> UserPublic:
             """
             SELECT u.* FROM tokens t
             JOIN users u ON u.id = t.user_id
-            WHERE t.token = ?
+            WHERE t.token = ? AND u.deleted_at IS NULL
             """,
             (token,),
         )
@@ -358,7 +888,44 @@ def _get_user_by_token_optional(authorization: Optional[str]) -> Optional[UserPu
         return None
 
 
-def _fetch_external(url: str, params: dict, headers: dict) -> Optional[dict]:
+@lru_cache(maxsize=None)
+def _upstream(kind: str) -> Optional[tuple[str, str]]:
+    """(정리된 URL, 서비스키). 환경변수는 프로세스 동안 바뀌지 않으므로 한 번만 계산한다."""
+    url = os.getenv(f"{kind}_API_URL")
+    key = os.getenv(f"{kind}_API_KEY")
+    if not url or not key:
+        return None
+    if kind == "NFA":
+        clean_url = url.replace("https://https://", "https://").rstrip("?&/ ")
+        if "todz_nfa_test_result" not in clean_url.lower():
+            clean_url = clean_url.rstrip("/") + "/TODZ_NFA_TEST_RESULT_NEW"
+    elif kind == "COURSES":
+        # URL에 프로토콜이 중복된 경우를 대비해 정리
+        clean_url = url.replace("https://https://", "https://").rstrip("?&")
+    else:
+        clean_url = url.rstrip("?&")
+    return clean_url, key
+
+
+# 업스트림 응답 디스크 캐시 (워커 간 공유, 재시작 후에도 유지). HYUGA_CACHE=0이면 끔
+_response_cache = None
+if os.getenv("HYUGA_CACHE", "1") != "0":
+    _response_cache = http_cache.ResponseCache(
+        DB_PATH.with_name(f"{DB_PATH.stem}_cache.db"),
+        max_bytes=int(float(os.getenv("CACHE_MAX_MB", "64")) * 1024 * 1024),
+    )
+
+
+def _fetch_external(url: str, params: dict, headers: dict, cache: Optional[str] = None) -> Optional[dict]:
+    """cache에 종류(예: spots)를 주면 TTL별 stale-while-revalidate 캐시를 거친다."""
+    if cache and _response_cache is not None:
+        return _response_cache.get_or_fetch(cache, url, params, lambda: _fetch_upstream(url, params, headers))
+    return _fetch_upstream(url, params, headers)
+
+
+def _fetch_upstream(url: str, params: dict, headers: dict) -> Optional[dict]:
+    import requests  # 콜드 스타트 비용을 줄이기 위해 첫 외부 호출 시점에 import
+
     try:
         res = requests.get(url, params=params, headers=headers, timeout=8)
         if res.ok:
@@ -370,71 +937,18 @@ def _fetch_external(url: str, params: dict, headers: dict) -> Optional[dict]:
 
 
 def _nfa_reference(age: Optional[int] = None, gender: Optional[str] = None, metric: Optional[str] = None) -> Optional[tuple[int, str]]:
-    """NFA 기준 점수와 출처를 반환 (없으면 None)"""
-    url = os.getenv("NFA_API_URL")
-    key = os.getenv("NFA_API_KEY")
-    if not url or not key:
-        return None
-    params = {
-        "serviceKey": key,
-        "pageNo": 1,
-        "numOfRows": 1,
-        "resultType": "json",
-    }
-    if age is not None:
-        params["age_class"] = age
-    if gender:
-        params["sex"] = gender
-    if metric:
-        params["item"] = metric
-    clean_url = url.replace("https://https://", "https://").rstrip("?&/ ")
-    if "todz_nfa_test_result" not in clean_url.lower():
-        clean_url = clean_url.rstrip("/") + "/TODZ_NFA_TEST_RESULT_NEW"
-    data = _fetch_external(clean_url, params, {})
-    if data is None:
-        from urllib.parse import quote_plus
-        params["serviceKey"] = quote_plus(key)
-        data = _fetch_external(clean_url, params, {})
-    if data is None:
-        full_url = f"{clean_url}?serviceKey={key}&pageNo=1&numOfRows=1&resultType=json"
-        data = _fetch_external(full_url, {}, {})
-    if not data:
-        return None
-    items = None
-    if isinstance(data, dict) and "response" in data:
-        items = (
-            data.get("response", {})
-            .get("body", {})
-            .get("items", {})
-            .get("item", [])
-        )
-    elif isinstance(data, dict) and "body" in data:
-        items = (
-            data.get("body", {})
-            .get("items", {})
-            .get("item", [])
-        )
-    if isinstance(items, dict):
-        items = [items]
-    if not items:
-        return None
-    it = items[0]
+    """NFA 기준 점수와 출처를 반환 (없으면 None). 로컬 미러 테이블에서 조회한다."""
+    conn = _get_db()
     try:
-        score = int(float(it.get("score") or it.get("item_f003") or it.get("item_f002") or it.get("item_f001") or 60))
-    except Exception:
-        score = 60
-    source = str(it.get("cert_gbn") or it.get("source") or "NFA")
-    return score, source
-
+        return mirror.nfa_reference(conn, age, gender, metric)
+    finally:
+        conn.close()
 
-def _haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    from math import radians, cos, sin, asin, sqrt
 
-    dlat = radians(lat2 - lat1)
-    dlng = radians(lng2 - lng1)
-    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlng / 2) ** 2
-    c = 2 * asin(sqrt(a))
-    return 6371 * c
+# 목록 응답은 모델을 만들지 않고 행에서 바로 JSON으로 (encoding.RowEncoder)
+_TODO_ENCODER = encoding.RowEncoder(TodoOut, is_done=bool, created_at=datetime.fromisoformat)
+_NFA_ENCODER = encoding.RowEncoder(NFABaselineRow)
+_COURSE_ENCODER = encoding.RowEncoder(RecoveryCourse)
 
 
 def _todo_row_to_out(row: sqlite3.Row) -> TodoOut:
@@ -450,24 +964,21 @@ def _todo_row_to_out(row: sqlite3.Row) -> TodoOut:
 
 @app.post("/api/auth/register", response_model=AuthToken, status_code=status.HTTP_201_CREATED)
 def register_user(payload: UserCreate):
-    conn = _get_db()
-    try:
+    # PBKDF2는 느리므로 writer 락 밖에서 계산
+    password_hash = _hash_password(payload.password)
+    with _write_db() as conn:
         existing = conn.execute("SELECT id FROM users WHERE email = ?", (payload.email,)).fetchone()
         if existing:
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="이미 가입된 이메일입니다.")
-        password_hash = _hash_password(payload.password)
         created_at = datetime.utcnow().isoformat()
         cur = conn.execute(
             "INSERT INTO users (email, password_hash, name, created_at) VALUES (?, ?, ?, ?)",
             (payload.email, password_hash, payload.name, created_at),
         )
         user_id = cur.lastrowid
-        conn.commit()
         token = _issue_token(conn, user_id)
         user_row = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
         return AuthToken(token=token, user=_row_to_user(user_row))
-    finally:
-        conn.close()
 
 
 @app.post("/api/auth/login", response_model=AuthToken)
@@ -477,10 +988,11 @@ def login_user(payload: UserLogin):
         row = conn.execute("SELECT * FROM users WHERE email = ?", (payload.email,)).fetchone()
         if not row or not _verify_password(payload.password, row["password_hash"]):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="이메일 또는 비밀번호가 올바르지 않습니다.")
-        token = _issue_token(conn, row["id"])
-        return AuthToken(token=token, user=_row_to_user(row))
     finally:
         conn.close()
+    with _write_db() as conn:
+        token = _issue_token(conn, row["id"])
+    return AuthToken(token=token, user=_row_to_user(row))
 
 
 @app.get("/api/auth/me", response_model=UserPublic)
@@ -494,36 +1006,54 @@ def update_me(
     authorization: Optional[str] = Header(default=None, alias="Authorization"),
 ):
     user = _get_user_by_token(authorization)
-    conn = _get_db()
-    try:
-        updates = {}
-        if payload.name is not None:
-            updates["name"] = payload.name
-        if payload.password:
-            updates["password_hash"] = _hash_password(payload.password)
+    updates = {}
+    if payload.name is not None:
+        updates["name"] = payload.name
+    if payload.password:
+        updates["password_hash"] = _hash_password(payload.password)
+    with _write_db() as conn:
         if updates:
             set_clause = ", ".join([f"{k} = ?" for k in updates.keys()])
             conn.execute(
                 f"UPDATE users SET {set_clause} WHERE id = ?",
                 (*updates.values(), user.id),
             )
-            conn.commit()
         row = conn.execute("SELECT * FROM users WHERE id = ?", (user.id,)).fetchone()
         return _row_to_user(row)
-    finally:
-        conn.close()
 
 
-@app.delete("/api/auth/me", status_code=status.HTTP_204_NO_CONTENT)
+@app.delete("/api/auth/me", response_model=AccountDeletionStatus, status_code=status.HTTP_202_ACCEPTED)
 def delete_me(authorization: Optional[str] = Header(default=None, alias="Authorization")):
     user = _get_user_by_token(authorization)
+    deletion_id = secrets.token_urlsafe(24)
+    now = datetime.utcnow().isoformat()
+    # 여기서는 표시와 토큰 폐기만 하고, 나머지 데이터는 백그라운드 작업이 나눠서 지운다
+    with _write_db() as conn:
+        conn.execute(
+            "UPDATE users SET deleted_at = ?, email = ?, password_hash = '', name = '' WHERE id = ?",
+            (now, f"deleted-{user.id}-{deletion_id}@deleted.invalid", user.id),
+        )
+        conn.execute("DELETE FROM tokens WHERE user_id = ?", (user.id,))
+        # 코치/선수 연결은 바로 끊는다 (탈퇴 처리 중인 선수가 로스터에 보이지 않도록)
+        team.unlink_user(conn, user.id)
+        conn.execute(
+            "INSERT INTO account_deletions (id, user_id, status, progress_json, requested_at, updated_at) VALUES (?, ?, 'pending', '{}', ?, ?)",
+            (deletion_id, user.id, now, now),
+        )
+    return AccountDeletionStatus(deletion_id=deletion_id, status="pending", deleted_rows={}, requested_at=now, updated_at=now)
+
+
+@app.get("/api/auth/deletions/{deletion_id}", response_model=AccountDeletionStatus)
+def deletion_status(deletion_id: str):
+    # 토큰은 이미 폐기됐으므로 추측 불가능한 deletion_id 자체로 조회한다
     conn = _get_db()
     try:
-        conn.execute("DELETE FROM users WHERE id = ?", (user.id,))
-        conn.commit()
+        res = account_purge.deletion_status(conn, deletion_id)
     finally:
         conn.close()
-    return
+    if not res:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="삭제 요청을 찾을 수 없습니다.")
+    return AccountDeletionStatus(**res)
 
 
 @app.get("/api/todos", response_model=List[TodoOut])
@@ -539,8 +1069,7 @@ def list_todos(authorization: Optional[str] = Header(default=None, alias="Author
             """,
             (user.id,),
         )
-        rows = cur.fetchall()
-        return [_todo_row_to_out(r) for r in rows]
+        return _TODO_ENCODER.response(cur.fetchall())
     finally:
         conn.close()
 
@@ -548,8 +1077,7 @@ def list_todos(authorization: Optional[str] = Header(default=None, alias="Author
 @app.post("/api/todos", response_model=TodoOut, status_code=status.HTTP_201_CREATED)
 def create_todo(payload: TodoCreate, authorization: Optional[str] = Header(default=None, alias="Authorization")):
     user = _get_user_by_token(authorization)
-    conn = _get_db()
-    try:
+    with _write_db() as conn:
         now = datetime.utcnow().isoformat()
         cur = conn.execute(
             """
@@ -559,11 +1087,8 @@ def create_todo(payload: TodoCreate, authorization: Optional[str] = Header(defau
             (user.id, payload.title.strip(), payload.date, payload.time, now),
         )
         todo_id = cur.lastrowid
-        conn.commit()
         row = conn.execute("SELECT * FROM user_todos WHERE id = ?", (todo_id,)).fetchone()
         return _todo_row_to_out(row)
-    finally:
-        conn.close()
 
 
 @app.put("/api/todos/{todo_id}", response_model=TodoOut)
@@ -573,8 +1098,7 @@ def update_todo(
     authorization: Optional[str] = Header(default=None, alias="Authorization"),
 ):
     user = _get_user_by_token(authorization)
-    conn = _get_db()
-    try:
+    with _write_db() as conn:
         row = conn.execute(
             "SELECT * FROM user_todos WHERE id = ? AND user_id = ?",
             (todo_id, user.id),
@@ -596,36 +1120,65 @@ def update_todo(
                 f"UPDATE user_todos SET {set_clause} WHERE id = ? AND user_id = ?",
                 (*updates.values(), todo_id, user.id),
             )
-            conn.commit()
         row = conn.execute(
             "SELECT * FROM user_todos WHERE id = ? AND user_id = ?",
             (todo_id, user.id),
         ).fetchone()
         return _todo_row_to_out(row)
-    finally:
-        conn.close()
 
 
 @app.delete("/api/todos/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_todo(todo_id: int, authorization: Optional[str] = Header(default=None, alias="Authorization")):
     user = _get_user_by_token(authorization)
-    conn = _get_db()
-    try:
+    with _write_db() as conn:
         conn.execute(
             "DELETE FROM user_todos WHERE id = ? AND user_id = ?",
             (todo_id, user.id),
         )
+    return
+
+
+@app.get("/api/sync", response_model=SyncResponse)
+def sync_changes(
+    since: int = Query(default=0, ge=0, description="마지막으로 받은 version (0이면 전체)"),
+    limit: int = Query(default=500, ge=1, le=5000),
+    authorization: Optional[str] = Header(default=None, alias="Authorization"),
+):
+    user = _get_user_by_token(authorization)
+    conn = _get_db()
+    try:
+        # 버전 조회와 행 조회가 같은 스냅샷을 보도록 읽기 트랜잭션 안에서
+        conn.execute("BEGIN")
+        res = sync.changes(conn, user.id, since, limit)
         conn.commit()
     finally:
         conn.close()
-    return
+    todos, runs = res["todo"], res["routine_run"]
+    return SyncResponse(
+        version=res["version"],
+        reset=res["reset"],
+        has_more=res["has_more"],
+        todos=SyncTodoChanges(upserted=[_todo_row_to_out(r) for r in todos["upserted"]], deleted=todos["deleted"]),
+        routine_runs=SyncRoutineRunChanges(
+            upserted=[
+                RoutineRunOut(
+                    id=r["id"],
+                    title=r["title"],
+                    duration_min=r["duration_min"] or 0,
+                    note=r["note"] or "",
+                    created_at=datetime.fromisoformat(r["created_at"]),
+                )
+                for r in runs["upserted"]
+            ],
+            deleted=runs["deleted"],
+        ),
+    )
 
 
 @app.post("/api/routines/run", status_code=status.HTTP_201_CREATED)
 def run_routine(payload: RoutineRunCreate, authorization: Optional[str] = Header(default=None, alias="Authorization")):
     user = _get_user_by_token(authorization)
-    conn = _get_db()
-    try:
+    with _write_db() as conn:
         conn.execute(
             """
             INSERT INTO user_routine_runs (user_id, title, duration_min, note, created_at)
@@ -633,64 +1186,201 @@ def run_routine(payload: RoutineRunCreate, authorization: Optional[str] = Header
             """,
             (user.id, payload.title, payload.duration_min or 0, payload.note or '', datetime.utcnow().isoformat()),
         )
-        conn.commit()
+    return {"ok": True}
+
+
+# 심박 스트림 업로드 한 번의 최대 크기 (1Hz 바이너리 6바이트/샘플 기준 약 60일 분량)
+HR_MAX_UPLOAD_BYTES = int(float(os.getenv("HR_MAX_UPLOAD_MB", "32")) * 1024 * 1024)
+# 업로드 본문을 이만큼씩 모아 스레드풀에서 디코딩/누적한다
+HR_FOLD_BYTES = 64 * 1024
+
+
+@app.post("/api/hr-sessions", response_model=HRSessionSummary, status_code=status.HTTP_201_CREATED)
+def create_hr_session(payload: HRSessionCreate, authorization: Optional[str] = Header(default=None, alias="Authorization")):
+    user = _get_user_by_token(authorization)
+    with _write_db() as conn:
+        session_id = hr_streams.create(conn, user.id, payload.max_hr, payload.rest_hr)
+        acc, _version, updated_at = hr_streams.load(conn, session_id, user.id)
+    return HRSessionSummary(session_id=session_id, updated_at=updated_at, **acc.summary())
+
+
+@app.get("/api/hr-sessions/{session_id}", response_model=HRSessionSummary)
+def get_hr_session(session_id: str, authorization: Optional[str] = Header(default=None, alias="Authorization")):
+    user = _get_user_by_token(authorization)
+    conn = _get_db()
+    try:
+        found = hr_streams.load(conn, session_id, user.id)
     finally:
         conn.close()
-    return {"ok": True}
+    if not found:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="심박 세션을 찾을 수 없습니다.")
+    acc, _version, updated_at = found
+    return HRSessionSummary(session_id=session_id, updated_at=updated_at, **acc.summary())
+
+
+def _save_hr_upload(session_id: str, acc: hr_streams.TrimpAccumulator, version: int) -> Optional[str]:
+    with _write_db() as conn:
+        return hr_streams.save(conn, session_id, acc, version)
+
+
+@app.post("/api/hr-sessions/{session_id}/samples", response_model=HRSessionSummary)
+async def upload_hr_samples(session_id: str, request: Request, authorization: Optional[str] = Header(default=None, alias="Authorization")):
+    """Appends one chunk of samples (binary records or NDJSON, see hr_streams) to the session."""
+    user = await run_in_threadpool(_get_user_by_token, authorization)
+    decoder = hr_streams.decoder_for(request.headers.get("content-type", ""))
+    if decoder is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"{hr_streams.BINARY_TYPE} 또는 {hr_streams.NDJSON_TYPES[0]} 형식만 받습니다.",
+        )
+
+    def _load():
+        conn = _get_db()
+        try:
+            return hr_streams.load(conn, session_id, user.id)
+        finally:
+            conn.close()
+
+    found = await run_in_threadpool(_load)
+    if not found:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="심박 세션을 찾을 수 없습니다.")
+    acc, version, _updated_at = found
+
+    def _fold(data: bytes, last: bool = False):
+        for t, hr in decoder.feed(data):
+            acc.feed(t, hr)
+        if last:
+            for t, hr in decoder.close():
+                acc.feed(t, hr)
+
+    # 본문을 모아 두지 않고 받는 대로 누적한다. 디코딩/누적은 CPU 작업이라 이벤트 루프 밖에서 돌리고,
+    # 작은 청크는 HR_FOLD_BYTES까지 모아 스레드 전환 횟수를 줄인다
+    received = 0
+    pending = bytearray()
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > HR_MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="업로드를 나눠서 보내 주세요.")
+            pending += chunk
+            if len(pending) >= HR_FOLD_BYTES:
+                data, pending = bytes(pending), bytearray()
+                await run_in_threadpool(_fold, data)
+        await run_in_threadpool(_fold, bytes(pending), True)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    updated_at = await run_in_threadpool(_save_hr_upload, session_id, acc, version)
+    if updated_at is None:
+        # 같은 세션에 동시에 올린 다른 청크가 먼저 반영됨: 이 청크는 저장하지 않았으니 다시 보내면 된다
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="같은 세션의 다른 업로드가 먼저 반영되었습니다. 다시 보내 주세요.")
+    return HRSessionSummary(session_id=session_id, updated_at=updated_at, **acc.summary())
+
+
+def _resolve_hr_sessions(user_id: int, sessions: List[WorkoutInput]) -> List[WorkoutInput]:
+    """Fills trimp from the referenced HR sessions (before hashing/scoring, so it is stored with the payload)."""
+    wanted = [w for w in sessions if w.hr_session_id and w.trimp is None]
+    if not wanted:
+        return sessions
+    conn = _get_db()
+    try:
+        found = {w.hr_session_id: hr_streams.load(conn, w.hr_session_id, user_id) for w in wanted}
+    finally:
+        conn.close()
+    out = []
+    for w in sessions:
+        if w.hr_session_id and w.trimp is None:
+            hit = found[w.hr_session_id]
+            if not hit:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="심박 세션을 찾을 수 없습니다.")
+            if not hit[0].samples:
+                raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="심박 세션에 샘플이 없습니다.")
+            w = w.model_copy(update={"trimp": round(hit[0].trimp, 1)})
+        out.append(w)
+    return out
+
+
+# 같은 입력을 짧은 시간 안에 다시 보내면 재계산/재저장 없이 저장된 결과를 돌려준다
+PREDICT_IDEMPOTENCY_WINDOW_SEC = float(os.getenv("PREDICT_IDEMPOTENCY_WINDOW_SEC", "60"))
+# Idempotency-Key 헤더로 명시한 키는 더 오래 유지
+PREDICT_IDEMPOTENCY_KEY_TTL_SEC = float(os.getenv("PREDICT_IDEMPOTENCY_KEY_TTL_SEC", str(24 * 3600)))
+
+
+def _find_idempotent(conn: sqlite3.Connection, user_id: int, key_hash: str, payload_hash: str, ttl_sec: float) -> Optional[PredictOutput]:
+    cutoff = (datetime.utcnow() - timedelta(seconds=ttl_sec)).isoformat()
+    row = conn.execute(
+        "SELECT payload_hash, result_json FROM predict_idempotency WHERE user_id = ? AND key_hash = ? AND created_at >= ?",
+        (user_id, key_hash, cutoff),
+    ).fetchone()
+    if not row:
+        return None
+    if row["payload_hash"] != payload_hash:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Idempotency-Key가 다른 요청 본문에 이미 사용되었습니다.")
+    return PredictOutput(**json.loads(row["result_json"]))
 
 
 @app.post("/api/predict", response_model=PredictOutput)
 def predict(
     inp: WorkoutInput,
+    response: Response,
     authorization: Optional[str] = Header(default=None, alias="Authorization"),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key", max_length=255),
 ):
     user = _get_user_by_token(authorization)
-    fatigue = _fatigue_score(inp)
-    sleep_debt = max(0.0, 8.0 - inp.sleep_hours)
-    risk = _risk_bucket(fatigue, sleep_debt, inp.hi_streak_days)
-
-    # Recovery windows: immediate, short-term, overnight
-    windows = [
-        RecoveryWindow(label="즉시", recommend_min=20, expected_roi_pct=_roi_for_rest(fatigue, 20, inp.sleep_hours), note="짧은 브리딩+스트레칭"),
-        RecoveryWindow(label="단기", recommend_min=120, expected_roi_pct=_roi_for_rest(fatigue, 120, inp.sleep_hours), note="낮잠 20분 또는 냉온 교대"),
-        RecoveryWindow(label="야간", recommend_min=8 * 60, expected_roi_pct=_roi_for_rest(fatigue, 8 * 60, inp.sleep_hours), note="7~9시간 수면")
-    ]
-    # If risk high, be more conservative: bump durations a bit
-    if risk == "red":
-        for w in windows:
-            w.recommend_min = int(w.recommend_min * 1.2)
-    elif risk == "yellow":
-        for w in windows:
-            w.recommend_min = int(w.recommend_min * 1.1)
-
-    nfa_delta = None
-    nfa_source = "NFA 샘플 기준 60점 대비"
-    ref = _nfa_reference()
-    if ref:
-        ref_score, ref_src = ref
-        nfa_delta = fatigue - ref_score
-        nfa_source = f"NFA {ref_score}점 기준 ({ref_src})"
+    inp = _resolve_hr_sessions(user.id, [inp])[0]
+    payload_json = json.dumps(inp.model_dump(), sort_keys=True, separators=(",", ":"))
+    payload_hash = hashlib.sha256(payload_json.encode("utf-8")).hexdigest()
+    if idempotency_key:
+        key_hash = "key:" + hashlib.sha256(idempotency_key.encode("utf-8")).hexdigest()
+        ttl_sec = PREDICT_IDEMPOTENCY_KEY_TTL_SEC
     else:
-        nfa_delta = fatigue - 60
-
-    result = PredictOutput(
-        fatigue_score=fatigue,
-        recovery_windows=windows,
-        overtraining_risk=risk,
-        nfa_delta=nfa_delta,
-        nfa_source=nfa_source,
-    )
+        key_hash = "body:" + payload_hash
+        ttl_sec = PREDICT_IDEMPOTENCY_WINDOW_SEC
+
+    if ttl_sec > 0:
+        conn = _get_db()
+        try:
+            cached = _find_idempotent(conn, user.id, key_hash, payload_hash, ttl_sec)
+        finally:
+            conn.close()
+        if cached:
+            response.headers["Idempotent-Replayed"] = "true"
+            return cached
+
+    result = _score_workout(inp, _nfa_reference(), population=True)
     # 저장
-    conn = _get_db()
-    try:
-        conn.execute(
+    with _write_db() as conn:
+        if ttl_sec > 0:
+            # 동시에 들어온 동일 요청은 writer 락 안에서 다시 확인해 한 건만 저장
+            cached = _find_idempotent(conn, user.id, key_hash, payload_hash, ttl_sec)
+            if cached:
+                response.headers["Idempotent-Replayed"] = "true"
+                return cached
+        now = datetime.utcnow().isoformat()
+        new_alerts = []
+        if _alert_hub.has_subscribers(user.id):
+            prev = _recent_alert_states(conn, user.id, 1)
+            new_alerts = alerts.derive_alerts(prev[0] if prev else None, _alert_state(inp, result.overtraining_risk))
+        result_json = json.dumps(result.model_dump())
+        cur = conn.execute(
             "INSERT INTO user_predictions (user_id, payload_json, result_json, created_at) VALUES (?, ?, ?, ?)",
-            (user.id, json.dumps(inp.model_dump()), json.dumps(result.model_dump()), datetime.utcnow().isoformat()),
+            (user.id, json.dumps(inp.model_dump()), result_json, now),
         )
-        conn.commit()
-    finally:
-        conn.close()
+        rollups.record(conn, user.id, now, _trend_values(inp.model_dump(), result.model_dump()))
+        if ttl_sec > 0:
+            conn.execute(
+                "INSERT OR REPLACE INTO predict_idempotency (user_id, key_hash, payload_hash, prediction_id, result_json, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (user.id, key_hash, payload_hash, cur.lastrowid, result_json, now),
+            )
+            # 만료된 키는 조금씩 정리
+            purge_before = (datetime.utcnow() - timedelta(seconds=max(PREDICT_IDEMPOTENCY_WINDOW_SEC, PREDICT_IDEMPOTENCY_KEY_TTL_SEC))).isoformat()
+            conn.execute(
+                "DELETE FROM predict_idempotency WHERE rowid IN (SELECT rowid FROM predict_idempotency WHERE created_at < ? LIMIT 100)",
+                (purge_before,),
+            )
+        prediction_id = cur.lastrowid
 
+    _alert_hub.publish(user.id, [{**a, "prediction_id": prediction_id, "created_at": now} for a in new_alerts])
     return result
 
 
@@ -700,74 +1390,59 @@ def roi_report(
     authorization: Optional[str] = Header(default=None, alias="Authorization"),
 ):
     user = _get_user_by_token(authorization)
-    points: List[ROIDataPoint] = []
-    total_work = 0.0
-    total_recov = 0.0
-    for i, w in enumerate(inp.weekly_sessions):
-        load = _session_trimp(w)
-        # Assume recovery actions are proportional to rest taken (sleep + micro breaks)
-        recovery = max(0.0, (w.sleep_hours - 6.0)) * 10.0
-        total_work += load
-        total_recov += recovery
-        ratio = recovery / (load + 1e-6)
-        points.append(ROIDataPoint(day=f"D{i+1}", workout_load=round(load, 1), recovery_load=round(recovery, 1), ratio=round(ratio, 2)))
-
-    # Efficiency is ratio scaled and capped
-    avg_ratio = (total_recov / (total_work + 1e-6)) if total_work > 0 else 0.0
-    efficiency = int(max(0, min(100, round(60 + (avg_ratio - 0.2) * 100))))
-
-    # Expected next performance change: depend on last day fatigue and planned rest window (estimate)
-    last = inp.weekly_sessions[-1] if inp.weekly_sessions else WorkoutInput(duration_min=0, avg_hr=120, max_hr=190, rpe=3, sleep_hours=7, temp_c=22, humidity=40, last7_load=0, last28_load=0, hi_streak_days=0)
-    fatigue = _fatigue_score(last)
-    # Assume user rests 3h before next workout by default
-    perf_change = _roi_for_rest(fatigue, 180, last.sleep_hours)
-
-    badge = "Bronze"
-    if efficiency >= 75:
-        badge = "Gold"
-    elif efficiency >= 65:
-        badge = "Silver"
-
-    result = ROIReportOutput(
-        recovery_efficiency_score=efficiency,
-        weekly_recovery_ratio=points,
-        expected_next_performance_change_pct=perf_change,
-        rest_accrual_badge=badge,
-    )
-    conn = _get_db()
-    try:
+    inp = inp.model_copy(update={"weekly_sessions": _resolve_hr_sessions(user.id, inp.weekly_sessions)})
+    result = _score_roi_report(inp)
+    now = datetime.utcnow().isoformat()
+    with _write_db() as conn:
         conn.execute(
             "INSERT INTO user_predictions (user_id, payload_json, result_json, created_at) VALUES (?, ?, ?, ?)",
-            (user.id, json.dumps({"weekly_sessions": [w.model_dump() for w in inp.weekly_sessions]}), json.dumps(result.model_dump()), datetime.utcnow().isoformat()),
+            (user.id, json.dumps({"weekly_sessions": [w.model_dump() for w in inp.weekly_sessions]}), json.dumps(result.model_dump()), now),
         )
-        conn.commit()
-    finally:
-        conn.close()
+        rollups.record(conn, user.id, now, (None, None, float(result.recovery_efficiency_score)))
     return result
 
 
+_BASE_ROUTINES = [
+    Routine(title="4-7-8 브리딩", minutes=3, type="breathing", steps=["4초 들이마시기", "7초 멈춤", "8초 내쉬기", "5회 반복"]),
+    Routine(title="하체 스트레칭", minutes=5, type="stretch", steps=["햄스트링 60초", "종아리 60초", "둔근 60초", "3세트"]),
+    Routine(title="얼-온 교대", minutes=6, type="contrast", steps=["차갑게 1분", "따뜻하게 2분", "3세트"]),
+    Routine(title="파워냅", minutes=10, type="nap", steps=["밝기 낮추기", "20분 타이머", "깨고 가벼운 워크"]),
+]
+_WALK_ROUTINE = Routine(title="10분 산책", minutes=10, type="walk", steps=["바람 맞으며 가볍게 걷기"])
+
+
+def _routine_catalog() -> List[tuple[str, int, str]]:
+    return [(r.title, r.minutes, r.type) for r in _BASE_ROUTINES + [_WALK_ROUTINE]]
+
+
 @app.get("/api/routines", response_model=List[Routine])
 def routines(
     type: Optional[str] = None,
     wind: Optional[float] = None,
     authorization: Optional[str] = Header(default=None, alias="Authorization"),
 ):
-    _get_user_by_token(authorization)
-    base = [
-        Routine(title="4-7-8 브리딩", minutes=3, type="breathing", steps=["4초 들이마시기", "7초 멈춤", "8초 내쉬기", "5회 반복"]),
-        Routine(title="하체 스트레칭", minutes=5, type="stretch", steps=["햄스트링 60초", "종아리 60초", "둔근 60초", "3세트"]),
-        Routine(title="얼-온 교대", minutes=6, type="contrast", steps=["차갑게 1분", "따뜻하게 2분", "3세트"]),
-        Routine(title="파워냅", minutes=10, type="nap", steps=["밝기 낮추기", "20분 타이머", "깨고 가벼운 워크"]),
-    ]
-    out = base
+    user = _get_user_by_token(authorization)
+    base = _BASE_ROUTINES
+    out = list(base)
     if type == "muscle":
         out = [r for r in base if r.type in ("stretch", "contrast")] + [base[0]]
     elif type == "central":
         out = [r for r in base if r.type in ("breathing", "nap")]
     elif type == "heat":
         out = [r for r in base if r.type in ("contrast", "breathing")]
+
+    conn = _get_db()
+    try:
+        ranking = routine_rank.lookup(conn, user.id)
+    finally:
+        conn.close()
+    if ranking:
+        # 실행 기록으로 미리 계산해 둔 개인화 순서 (기록이 없는 사용자는 기본 순서)
+        pos = {title: i for i, title in enumerate(ranking)}
+        out.sort(key=lambda r: pos.get(r.title, len(pos)))
+
     if wind and wind >= 5.0:
-        out.append(Routine(title="10분 산책", minutes=10, type="walk", steps=["바람 맞으며 가볍게 걷기"]))
+        out.append(_WALK_ROUTINE)
     return out[:4]
 
 
@@ -776,12 +1451,8 @@ def report_latest(authorization: Optional[str] = Header(default=None, alias="Aut
     user = _get_user_by_token(authorization)
     conn = _get_db()
     try:
-        # 예측 통계
-        cur = conn.execute(
-            "SELECT result_json, created_at FROM user_predictions WHERE user_id = ? ORDER BY created_at DESC LIMIT 50",
-            (user.id,),
-        )
-        rows = cur.fetchall()
+        # 예측 통계 (최근 50건; 보존 기간이 지나 아카이브된 기록도 이어서 읽는다)
+        rows = retention.read_history(conn, user.id, limit=50)
         total_predictions = len(rows)
         last_fatigue = None
         last_risk = None
@@ -789,18 +1460,22 @@ def report_latest(authorization: Optional[str] = Header(default=None, alias="Aut
         fat_scores: List[int] = []
         last_roi_pct = None
         if rows:
-            last = rows[0]
-            res = json.loads(last["result_json"])
+            res = rows[0]["result"]
             last_fatigue = res.get("fatigue_score")
             last_risk = res.get("overtraining_risk")
             last_windows = res.get("recovery_windows")
         for r in rows:
-            data = json.loads(r["result_json"])
+            data = r["result"]
             if "fatigue_score" in data:
                 fat_scores.append(int(data["fatigue_score"]))
             if data.get("recovery_windows"):
                 last_roi_pct = data["recovery_windows"][0].get("expected_roi_pct")
         avg_fatigue = round(sum(fat_scores) / len(fat_scores), 1) if fat_scores else None
+        percentile_rank, nfa_delta, nfa_source = None, None, "NFA 샘플 기준 60점 대비"
+        if last_fatigue is not None:
+            # /api/predict와 같은 기준: 그 예측의 코호트 분포, 부족하면 NFA 기준 점수
+            cohort = percentiles.cohort_of(rows[0]["payload"])
+            percentile_rank, nfa_delta, nfa_source = _population_delta(int(last_fatigue), cohort, _nfa_reference())
 
         # 루틴 실행
         run_row = conn.execute(
@@ -822,13 +1497,158 @@ def report_latest(authorization: Optional[str] = Header(default=None, alias="Aut
             last_run_at=run_row["created_at"] if run_row else None,
             last_roi_pct=last_roi_pct,
             recent_windows=last_windows,
-            nfa_delta=last_fatigue - 60 if last_fatigue is not None else None,
-            nfa_source="NFA 샘플 기준 60점 대비",
+            nfa_delta=nfa_delta,
+            nfa_source=nfa_source,
+            percentile_rank=percentile_rank,
         )
     finally:
         conn.close()
 
 
+@app.get("/api/team/coaches", response_model=List[TeamCoach])
+def list_team_coaches(authorization: Optional[str] = Header(default=None, alias="Authorization")):
+    user = _get_user_by_token(authorization)
+    conn = _get_db()
+    try:
+        return [TeamCoach(**dict(r)) for r in team.coaches(conn, user.id)]
+    finally:
+        conn.close()
+
+
+@app.post("/api/team/coaches", response_model=TeamCoach, status_code=status.HTTP_201_CREATED)
+def add_team_coach(payload: TeamCoachAdd, authorization: Optional[str] = Header(default=None, alias="Authorization")):
+    # 선수 본인이 코치에게 자기 기록을 공유한다 (코치가 임의로 선수를 추가할 수는 없다)
+    user = _get_user_by_token(authorization)
+    with _write_db() as conn:
+        coach = conn.execute(
+            "SELECT id, name, email FROM users WHERE email = ? AND deleted_at IS NULL", (payload.coach_email,)
+        ).fetchone()
+        if not coach:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="해당 이메일의 코치를 찾을 수 없습니다.")
+        if coach["id"] == user.id:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="자기 자신을 코치로 등록할 수 없습니다.")
+        created_at = team.add_member(conn, coach["id"], user.id)
+    return TeamCoach(coach_id=coach["id"], name=coach["name"] or "", email=coach["email"], created_at=created_at)
+
+
+@app.delete("/api/team/coaches/{coach_id}", status_code=status.HTTP_204_NO_CONTENT)
+def remove_team_coach(coach_id: int, authorization: Optional[str] = Header(default=None, alias="Authorization")):
+    user = _get_user_by_token(authorization)
+    with _write_db() as conn:
+        if not team.remove_member(conn, coach_id, user.id):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="연결된 코치가 아닙니다.")
+    return
+
+
+@app.delete("/api/team/athletes/{athlete_id}", status_code=status.HTTP_204_NO_CONTENT)
+def remove_team_athlete(athlete_id: int, authorization: Optional[str] = Header(default=None, alias="Authorization")):
+    user = _get_user_by_token(authorization)
+    with _write_db() as conn:
+        if not team.remove_member(conn, user.id, athlete_id):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="로스터에 없는 선수입니다.")
+    return
+
+
+def _team_athlete_json(r: sqlite3.Row) -> str:
+    fatigue = r["last_fatigue"]
+    avg = r["fatigue_avg_7d"]
+    return json.dumps(
+        {
+            "athlete_id": r["athlete_id"],
+            "name": r["name"] or "",
+            "email": r["email"],
+            "joined_at": r["joined_at"],
+            "last_prediction_at": r["last_prediction_at"],
+            "last_fatigue": fatigue,
+            "last_overtraining_risk": r["last_risk"],
+            "last_roi_pct": r["last_roi_pct"],
+            # /api/predict가 돌려준 코호트 기준 백분위 (선수 화면과 같은 값)
+            "percentile_rank": r["last_percentile_rank"],
+            "fatigue_avg_7d": round(avg, 1) if avg is not None else None,
+            "predictions_7d": r["predictions_7d"] or 0,
+            "routine_runs": r["routine_runs"],
+            "last_run_title": r["last_run_title"],
+            "last_run_at": r["last_run_at"],
+        },
+        ensure_ascii=False,
+    )
+
+
+@app.get("/api/team/summary", response_model=TeamSummaryPage)
+def team_summary(
+    cursor: int = Query(default=0, ge=0, description="이전 페이지의 next_cursor (0이면 처음부터)"),
+    limit: int = Query(default=200, ge=1, le=1000),
+    authorization: Optional[str] = Header(default=None, alias="Authorization"),
+):
+    """Latest fatigue/risk/ROI and routine activity for every athlete on the caller's roster, streamed."""
+    coach = _get_user_by_token(authorization)
+
+    def body():
+        # 연결은 응답을 실제로 흘려보낼 때 연다 (본문을 읽지 않고 끊긴 응답이 연결을 붙잡지 않도록)
+        conn = _get_db()
+        try:
+            # 페이지 전체가 같은 스냅샷을 보도록 읽기 트랜잭션 안에서 흘려보낸다
+            conn.execute("BEGIN")
+            yield b'{"athletes":['
+            sent, last_id, more = 0, None, False
+            # limit+1개를 읽어 다음 페이지가 있는지 판단한다
+            for rows in team.iter_page(conn, coach.id, cursor, limit + 1):
+                if sent + len(rows) > limit:
+                    rows, more = rows[: limit - sent], True
+                if rows:
+                    yield (("," if sent else "") + ",".join(_team_athlete_json(r) for r in rows)).encode("utf-8")
+                    sent += len(rows)
+                    last_id = rows[-1]["athlete_id"]
+            yield f'],"next_cursor":{json.dumps(last_id if more else None)}}}'.encode("utf-8")
+        finally:
+            conn.rollback()
+            conn.close()
+
+    return StreamingResponse(body(), media_type="application/json")
+
+
+# bucket별 기본 조회 기간(일)과 최대 기간
+_TREND_DEFAULT_DAYS = {"day": 30, "week": 26 * 7, "month": 365}
+_TREND_MAX_DAYS = 3660
+
+
+@app.get("/api/report/trends", response_model=List[TrendPoint])
+def report_trends(
+    bucket: str = Query(default="day", pattern="^(day|week|month)$"),
+    from_: Optional[date] = Query(default=None, alias="from", description="시작일 (UTC, 포함)"),
+    to: Optional[date] = Query(default=None, description="종료일 (UTC, 포함)"),
+    authorization: Optional[str] = Header(default=None, alias="Authorization"),
+):
+    user = _get_user_by_token(authorization)
+    to = to or datetime.utcnow().date()
+    from_ = from_ or to - timedelta(days=_TREND_DEFAULT_DAYS[bucket] - 1)
+    if from_ > to:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="from은 to보다 이후일 수 없습니다.")
+    if (to - from_).days > _TREND_MAX_DAYS:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"조회 기간은 최대 {_TREND_MAX_DAYS}일입니다.")
+    conn = _get_db()
+    try:
+        return rollups.query(conn, user.id, bucket, from_.isoformat(), to.isoformat())
+    finally:
+        conn.close()
+
+
+@app.get("/api/report/history", response_model=List[PredictionRecord])
+def report_history(
+    before: Optional[str] = Query(default=None, description="이 시각(ISO) 이전 기록만 (이전 페이지 마지막 기록의 created_at)"),
+    before_id: Optional[int] = Query(default=None, description="before와 같은 시각이면 이 id보다 작은 기록만 (이전 페이지 마지막 기록의 id)"),
+    limit: int = Query(default=50, ge=1, le=200),
+    authorization: Optional[str] = Header(default=None, alias="Authorization"),
+):
+    user = _get_user_by_token(authorization)
+    conn = _get_db()
+    try:
+        # 보존 기간이 지나 아카이브된 기록도 이어서 읽는다
+        return retention.read_history(conn, user.id, before, limit, before_id)
+    finally:
+        conn.close()
+
+
 @app.get("/api/overtraining-guard", response_model=List[GuardDay])
 def guard(authorization: Optional[str] = Header(default=None, alias="Authorization")):
     _get_user_by_token(authorization)
@@ -849,14 +1669,53 @@ def guard(authorization: Optional[str] = Header(default=None, alias="Authorizati
 
 @app.get("/api/coach-insights")
 def coach_insights(authorization: Optional[str] = Header(default=None, alias="Authorization")):
-    _get_user_by_token(authorization)
-    return {
-        "alerts": [
-            "근육 피로 75% → 하체 회복 루틴 권장",
-            "내일 경사 러닝 예정 → 오늘은 하체 회복에 집중",
-            "수면부채 1.5시간 → 파워냅 20분 제안",
-        ]
-    }
+    user = _get_user_by_token(authorization)
+    conn = _get_db()
+    try:
+        states = _recent_alert_states(conn, user.id, 2)
+    finally:
+        conn.close()
+    if not states:
+        return {"alerts": []}
+    # 최신 예측을 직전 예측과 비교 (실시간 수신은 /api/coach/stream)
+    found = alerts.derive_alerts(states[1] if len(states) > 1 else None, states[0])
+    return {"alerts": [a["message"] for a in found]}
+
+
+@app.post("/api/coach/stream-ticket", response_model=StreamTicket)
+def coach_stream_ticket(authorization: Optional[str] = Header(default=None, alias="Authorization")):
+    # 오래 쓰는 로그인 토큰 대신 짧게 유효한 1회용 티켓을 쿼리로 보내게 한다 (접근 로그에 남아도 재사용 불가)
+    user = _get_user_by_token(authorization)
+    with _write_db() as conn:
+        ticket, expires_at = alerts.issue_ticket(conn, user.id)
+    return StreamTicket(ticket=ticket, expires_at=expires_at)
+
+
+def _redeem_stream_ticket(ticket: str) -> int:
+    with _write_db() as conn:
+        user_id = alerts.redeem_ticket(conn, ticket)
+    if user_id is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="유효하지 않거나 만료된 티켓입니다.")
+    return user_id
+
+
+@app.get("/api/coach/stream")
+async def coach_stream(
+    ticket: Optional[str] = Query(default=None, description="EventSource는 헤더를 못 보내므로 /api/coach/stream-ticket에서 받은 1회용 티켓을 쿼리로 보낸다"),
+    authorization: Optional[str] = Header(default=None, alias="Authorization"),
+):
+    if ticket:
+        user_id = await run_in_threadpool(_redeem_stream_ticket, ticket)
+    else:
+        user_id = (await run_in_threadpool(_get_user_by_token, authorization)).id
+    sub = _alert_hub.subscribe(user_id)
+    if sub is None:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="동시에 열 수 있는 알림 연결 수를 넘었습니다.")
+    return StreamingResponse(
+        alerts.sse_stream(_alert_hub, sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/api/nfa-baseline", response_model=Any)
@@ -864,105 +1723,21 @@ def nfa_baseline(
     age: Optional[int] = Query(default=None, ge=10, le=90),
     gender: Optional[str] = None,
     metric: Optional[str] = None,
-    page: int = 1,
-    rows: int = 20,
+    page: int = Query(default=1, ge=1, le=10000),
+    rows: int = Query(default=20, ge=1, le=1000),
     raw: bool = Query(default=False, description="원본 항목 그대로 반환"),
 ):
-    url = os.getenv("NFA_API_URL")
-    key = os.getenv("NFA_API_KEY")
-    if url and key:
-        base_params = {
-            "serviceKey": key,
-            "pageNo": page,
-            "numOfRows": rows,
-            "resultType": "json",
-        }
-        if age is not None:
-            base_params["age_class"] = age
-        if gender:
-            base_params["sex"] = gender
-        if metric:
-            base_params["item"] = metric
-        clean_url = url.replace("https://https://", "https://").rstrip("?&/ ")
-        if "todz_nfa_test_result" not in clean_url.lower():
-            clean_url = clean_url.rstrip("/") + "/TODZ_NFA_TEST_RESULT_NEW"
-        data = _fetch_external(clean_url, base_params, {})
-        if data is None:
-            from urllib.parse import quote_plus
-            encoded_key = quote_plus(key)
-            alt_params = {**base_params, "serviceKey": encoded_key}
-            data = _fetch_external(clean_url, alt_params, {})
-        if data is None:
-            full_url = f"{clean_url}?serviceKey={key}&pageNo={page}&numOfRows={rows}&resultType=json"
-            if age is not None:
-                full_url += f"&age_class={age}"
-            if gender:
-                full_url += f"&sex={gender}"
-            if metric:
-                full_url += f"&item={metric}"
-            data = _fetch_external(full_url, {}, {})
-        # 디버그용: 외부 응답을 로그로 확인
-        print("NFA external raw:", data)
-        if data:
-            out: List[NFABaselineRow] = []
-            raw_items: List[Any] = []
-            # helper for safe number parsing
-            def _num(v):
-                try:
-                    return int(float(v))
-                except Exception:
-                    return 0
-            # 형태 1: response.body.items.item
-            if isinstance(data, dict) and "response" in data:
-                items = (
-                    data.get("response", {})
-                    .get("body", {})
-                    .get("items", {})
-                    .get("item", [])
-                )
-                if isinstance(items, dict):
-                    items = [items]
-                raw_items = items or []
-                for it in items or []:
-                    out.append(
-                        NFABaselineRow(
-                            age_band=str(it.get("age_class") or it.get("age_degree") or it.get("age") or ""),
-                            gender=str(it.get("test_sex") or it.get("sex") or it.get("gender") or ""),
-                            metric=str(it.get("item") or "recovery"),
-                            baseline_score=_num(it.get("score") or it.get("item_f003") or 0),
-                            source=str(it.get("cert_gbn") or "NFA"),
-                        )
-                    )
-            # 형태 2: body.items.item (response 래퍼 없음)
-            elif isinstance(data, dict) and "body" in data:
-                items = (
-                    data.get("body", {})
-                    .get("items", {})
-                    .get("item", [])
-                )
-                if isinstance(items, dict):
-                    items = [items]
-                raw_items = items or []
-                for it in items or []:
-                    out.append(
-                        NFABaselineRow(
-                            age_band=str(it.get("age_class") or it.get("age_degree") or it.get("age") or ""),
-                            gender=str(it.get("test_sex") or it.get("sex") or it.get("gender") or ""),
-                            metric=str(it.get("item") or "recovery"),
-                            baseline_score=_num(it.get("score") or it.get("item_f003") or 0),
-                            source=str(it.get("cert_gbn") or "NFA"),
-                        )
-                    )
-            elif isinstance(data, list):
-                try:
-                    out = [NFABaselineRow(**row) for row in data]
-                except Exception:
-                    out = []
-                raw_items = data
-            if raw and raw_items:
-                return raw_items
-            if out:
-                return out
+    # 업스트림을 매번 호출하지 않고 주기적으로 동기화되는 로컬 미러에서 읽는다 (mirror.sync_dataset)
+    conn = _get_db()
+    try:
+        found = mirror.query_nfa(conn, age, gender, metric, page, rows)
+    finally:
+        conn.close()
+    if found:
+        if raw:
+            # 저장된 원본 JSON을 다시 파싱하지 않고 그대로 잇는다
+            return encoding.array_response(r["raw_json"] for r in found)
+        return _NFA_ENCODER.response(found)
     # fallback sample
     return [
         NFABaselineRow(age_band="30-39", gender="M", metric="recovery", baseline_score=60, source="NFA 샘플"),
@@ -977,17 +1752,16 @@ def recovery_spots(
     authorization: Optional[str] = Header(default=None, alias="Authorization"),
 ):
     _get_user_by_token_optional(authorization)
-    url = os.getenv("SPOT_API_URL")
-    key = os.getenv("SPOT_API_KEY")
-    if url and key:
+    upstream = _upstream("SPOT")
+    if upstream:
+        clean_url, key = upstream
         params = {
             "serviceKey": key,
             "pageNo": 1,
             "numOfRows": 20,
             "resultType": "json",
         }
-        clean_url = url.rstrip("?&")
-        data = _fetch_external(clean_url, params, {})
+        data = _fetch_external(clean_url, params, {}, cache="spots")
         if data:
             spots_out: List[RecoverySpot] = []
             if isinstance(data, list):
@@ -1018,7 +1792,7 @@ def recovery_spots(
                         lng_f = None
                     distance = None
                     if lat is not None and lng is not None and lat_f is not None and lng_f is not None:
-                        distance = round(_haversine_km(lat, lng, lat_f, lng_f), 2)
+                        distance = round(mirror.haversine_km(lat, lng, lat_f, lng_f), 2)
                     spots_out.append(
                         RecoverySpot(
                             name=name,
@@ -1033,7 +1807,8 @@ def recovery_spots(
             if lat is not None and lng is not None:
                 spots_out = [s for s in spots_out if s.lat and s.lng]
                 spots_out.sort(key=lambda s: s.distance_km or 9999)
-            return spots_out
+            # 업스트림 값은 RecoverySpot 생성 때 이미 검증했으므로 응답 모델 재검증은 건너뛴다
+            return encoding.json_response(spots_out)
     # 외부 호출 실패 또는 URL/KEY 없으면 샘플
     return [
         RecoverySpot(name="중앙공원 산책로", category="산책", lat=37.5, lng=127.0, is_open=True, distance_km=1.2, safety_flag=True),
@@ -1042,101 +1817,67 @@ def recovery_spots(
 
 
 @app.get("/api/recovery-courses", response_model=List[RecoveryCourse])
-def recovery_courses(authorization: Optional[str] = Header(default=None, alias="Authorization")):
+def recovery_courses(
+    q: Optional[str] = Query(default=None, max_length=100, description="제목/종목/장소/메모 검색어"),
+    category: Optional[str] = None,
+    lat: Optional[float] = Query(default=None, ge=-90, le=90),
+    lng: Optional[float] = Query(default=None, ge=-180, le=180),
+    radius_km: Optional[float] = Query(default=None, gt=0, le=200),
+    limit: int = Query(default=20, ge=1, le=100),
+    authorization: Optional[str] = Header(default=None, alias="Authorization"),
+):
     _get_user_by_token_optional(authorization)
-    url = os.getenv("COURSES_API_URL")
-    key = os.getenv("COURSES_API_KEY")
-    if url and key:
-        params = {
-            "serviceKey": key,
-            "pageNo": 1,
-            "numOfRows": 20,
-            "resultType": "json",
-        }
-        # URL에 프로토콜이 중복된 경우를 대비해 정리
-        clean_url = url.replace("https://https://", "https://").rstrip("?&")
-        data = _fetch_external(clean_url, params, {})
-        if data:
-            out: List[RecoveryCourse] = []
-            # 공공데이터 포털 응답 형태 1: response.body.items.item
-            if isinstance(data, dict) and "response" in data:
-                items = (
-                    data.get("response", {})
-                    .get("body", {})
-                    .get("items", {})
-                    .get("item", [])
-                )
-                if isinstance(items, dict):
-                    items = [items]
-                for it in items or []:
-                    title = it.get("course_nm") or it.get("item_nm") or "강좌"
-                    category = it.get("item_nm") or it.get("item_cd") or ""
-                    location = it.get("lectr_nm") or it.get("course_seta_desc_cn") or ""
-                    note_parts = [it.get("lectr_weekday_val") or "", it.get("start_tm") or "", it.get("course_seta_desc_cn") or ""]
-                    note = " ".join([p for p in note_parts if p]).strip() or None
-                    lat_val = it.get("faci_lat") or it.get("lat")
-                    lng_val = it.get("faci_lot") or it.get("lng") or it.get("faci_lon")
-                    try:
-                        lat = float(lat_val) if lat_val not in (None, "") else None
-                        lng = float(lng_val) if lng_val not in (None, "") else None
-                    except Exception:
-                        lat = lng = None
-                    out.append(
-                        RecoveryCourse(
-                            title=title,
-                            category=category,
-                            location=location,
-                            eligible=True,
-                            note=note,
-                            url=None,
-                            lat=lat,
-                            lng=lng,
-                        )
-                    )
-            # 공공데이터 포털 응답 형태 2: header/body/items/item (response 래퍼 없음)
-            elif isinstance(data, dict) and "body" in data:
-                items = data.get("body", {}).get("items", {}).get("item", [])
-                if isinstance(items, dict):
-                    items = [items]
-                for it in items or []:
-                    title = it.get("course_nm") or it.get("item_nm") or "강좌"
-                    category = it.get("item_nm") or it.get("item_cd") or ""
-                    location = it.get("lectr_nm") or it.get("course_seta_desc_cn") or ""
-                    note_parts = [it.get("lectr_weekday_val") or "", it.get("start_tm") or "", it.get("course_seta_desc_cn") or ""]
-                    note = " ".join([p for p in note_parts if p]).strip() or None
-                    lat_val = it.get("faci_lat") or it.get("lat")
-                    lng_val = it.get("faci_lot") or it.get("lng") or it.get("faci_lon")
-                    try:
-                        lat = float(lat_val) if lat_val not in (None, "") else None
-                        lng = float(lng_val) if lng_val not in (None, "") else None
-                    except Exception:
-                        lat = lng = None
-                    out.append(
-                        RecoveryCourse(
-                            title=title,
-                            category=category,
-                            location=location,
-                            eligible=True,
-                            note=note,
-                            url=None,
-                            lat=lat,
-                            lng=lng,
-                        )
-                    )
-            elif isinstance(data, list):
-                try:
-                    out = [RecoveryCourse(**row) for row in data]
-                except Exception:
-                    out = []
-            if out:
-                return out
-    return [
-        RecoveryCourse(title="요가 · 스포츠강좌이용권 적용", category="요가", location="시청 주민센터", eligible=True, note="저녁반", url=None, lat=37.5, lng=127.0, distance_km=1.0),
-        RecoveryCourse(title="재활 필라테스", category="필라테스", location="스포츠 복지관", eligible=False, note="대기중", url=None, lat=37.51, lng=127.01, distance_km=2.3),
-    ]
+    # 업스트림 대신 주기적으로 동기화되는 로컬 카탈로그(FTS5 + 위경도 인덱스)에서 검색
+    conn = _get_db()
+    try:
+        if conn.execute("SELECT 1 FROM recovery_course_catalog LIMIT 1").fetchone():
+            return _COURSE_ENCODER.response(mirror.search_courses(conn, q, category, lat, lng, radius_km, limit))
+    finally:
+        conn.close()
+    # 첫 동기화 전이면 샘플 강좌를 같은 검색 경로로 거른다
+    return _COURSE_ENCODER.response(mirror.search_sample_courses(q, category, lat, lng, radius_km, limit))
+
+
+@app.get("/api/health/startup")
+def startup_timings():
+    return _STARTUP_TIMINGS
+
+
+@app.get("/api/health/alerts")
+async def alert_stats():
+    # 구독자 집합은 이벤트 루프에서만 바뀌므로 async로 같은 루프에서 읽는다
+    return _alert_hub.stats()
+
+
+@app.get("/api/health/scoring")
+def scoring_stats():
+    return _scoring.stats()
+
+
+@app.get("/api/health/admission")
+def admission_stats():
+    return _admission.stats()
+
+
+@app.get("/api/health/cache")
+def cache_stats():
+    if _response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **_response_cache.stats()}
+
+
+_STARTUP_TIMINGS["app_setup_ms"] = round((time.perf_counter() - _IMPORT_T0) * 1000 - _STARTUP_TIMINGS["imports_ms"], 1)
 
 
 # Entry
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
+    # HYUGA_WORKERS>1이면 멀티 프로세스 모드 (reload와 함께 쓸 수 없음). 쓰기는 _write_db 락으로 직렬화된다.
+    workers = int(os.getenv("HYUGA_WORKERS", "1"))
+    port = int(os.getenv("PORT", "8000"))
+    # 열린 SSE 스트림은 스스로 끝나지 않으므로 종료 대기 시간을 제한한다
+    graceful = int(os.getenv("HYUGA_GRACEFUL_SHUTDOWN_SEC", "10"))
+    if workers > 1:
+        uvicorn.run("app:app", host="0.0.0.0", port=port, workers=workers, timeout_graceful_shutdown=graceful)
+    else:
+        uvicorn.run("app:app", host="0.0.0.0", port=port, reload=True, timeout_graceful_shutdown=graceful)
@@ -0,0 +1,208 @@
+"""Coach-alert fan-out benchmark.
+
+Opens N concurrent alert subscribers, reports memory per connection, then publishes
+alerts and measures publish -> client latency.
+
+Modes:
+    in-process (default)  AlertHub + SSE encoding only; memory from tracemalloc/RSS
+    --http                real SSE connections to `uvicorn app:app` on a temporary DB;
+                          memory is the server's RSS growth, latency is measured
+                          from the server's publish timestamp to the client read
+
+Usage (from backend/):
+    python bench_alerts.py --subscribers 10000
+    python bench_alerts.py --subscribers 10000 --http --events 5
+
+Each --http connection uses one fd on each side; raise `ulimit -n` above N first.
+"""
+from typing import List, Optional
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+import alerts
+
+
+def _rss_kb(pid: str = "self") -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _report(latencies_ms: List[float], expected: int, elapsed: float):
+    lat = sorted(latencies_ms)
+    if not lat:
+        print("  no alerts received")
+        return
+    q = statistics.quantiles(lat, n=100) if len(lat) > 1 else [lat[0]] * 99
+    print(f"  delivered {len(lat):,}/{expected:,} in {elapsed:.2f}s ({len(lat) / max(elapsed, 1e-9):,.0f} alerts/s)")
+    print(f"  latency ms  p50 {q[49]:.1f}  p95 {q[94]:.1f}  p99 {q[98]:.1f}  max {lat[-1]:.1f}")
+
+
+async def _in_process(n: int, users: int, events: int):
+    hub = alerts.AlertHub(max_per_user=n)
+    latencies: List[float] = []
+    done = asyncio.Event()
+    expected = n * events
+
+    async def consume(sub):
+        async for chunk in alerts.sse_stream(hub, sub, heartbeat_sec=3600):
+            if chunk.startswith("event: alert"):
+                data = json.loads(chunk.split("data: ", 1)[1])
+                latencies.append((time.time() - data["published_at"]) * 1000)
+                if len(latencies) >= expected:
+                    done.set()
+
+    tracemalloc.start()
+    rss0, snap0 = _rss_kb(), tracemalloc.take_snapshot()
+    tasks = [asyncio.ensure_future(consume(hub.subscribe(i % users))) for i in range(n)]
+    await asyncio.sleep(0.1)  # 모두 첫 대기 상태에 들어가게
+    rss1, snap1 = _rss_kb(), tracemalloc.take_snapshot()
+    traced = sum(s.size_diff for s in snap1.compare_to(snap0, "filename"))
+    tracemalloc.stop()
+    print(f"[in-process] {n:,} subscribers over {users:,} users")
+    print(f"  memory per subscriber: {traced / n:,.0f}B traced, {(rss1 - rss0) * 1024 / n:,.0f}B RSS")
+
+    # 워커 스레드에서 publish (실제 predict 경로와 같은 call_soon_threadsafe 경로)
+    def publisher():
+        for e in range(events):
+            for u in range(users):
+                hub.publish(u, [{"kind": "bench", "level": "info", "message": f"event {e}"}])
+
+    t0 = time.perf_counter()
+    threading.Thread(target=publisher).start()
+    try:
+        await asyncio.wait_for(done.wait(), 60)
+    except asyncio.TimeoutError:
+        pass
+    _report(latencies, expected, time.perf_counter() - t0)
+    print(f"  hub {hub.stats()}")
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _request(port: int, method: str, path: str, body: Optional[dict] = None, token: Optional[str] = None) -> dict:
+    c = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    c.request(method, path, json.dumps(body) if body else None, headers)
+    r = c.getresponse()
+    data = r.read()
+    if r.status >= 300:
+        raise RuntimeError(f"{method} {path} -> {r.status} {data[:200]!r}")
+    return json.loads(data)
+
+
+async def _http(n: int, events: int, port: int):
+    tmp = tempfile.mkdtemp(prefix="hyuga-bench-")
+    env = {
+        **os.environ,
+        "HYUGA_DB_PATH": str(Path(tmp) / "bench.db"),
+        "ALERT_MAX_SUBSCRIPTIONS_PER_USER": str(n + 10),
+        "PERCENTILE_REFRESH_MIN": "0",
+        "ROUTINE_RANK_INTERVAL_MIN": "0",
+        "ACCOUNT_PURGE_INTERVAL_SEC": "0",
+        "HYUGA_CACHE": "0",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning", "--backlog", "4096"],
+        cwd=Path(__file__).parent,
+        env=env,
+    )
+    try:
+        from loadtest import _wait_ready
+
+        _wait_ready(port)
+        token = _request(port, "POST", "/api/auth/register", {"email": "bench@bench.example.com", "password": "bench-pw-1", "name": "bench"})["token"]
+        rss0 = _rss_kb(str(server.pid))
+
+        latencies: List[float] = []
+        ready = 0
+        expected = 0
+        done = asyncio.Event()
+
+        async def subscribe():
+            nonlocal ready
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            try:
+                writer.write(f"GET /api/coach/stream HTTP/1.1\r\nHost: localhost\r\nAuthorization: Bearer {token}\r\nAccept: text/event-stream\r\n\r\n".encode())
+                await writer.drain()
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        return
+                    if line.startswith(b"event: ready"):
+                        ready += 1
+                    elif line.startswith(b"data: ") and b"published_at" in line:
+                        latencies.append((time.time() - json.loads(line[6:])["published_at"]) * 1000)
+                        if expected and len(latencies) >= expected:
+                            done.set()
+            finally:
+                writer.close()
+
+        tasks = []
+        for i in range(0, n, 500):
+            tasks += [asyncio.ensure_future(subscribe()) for _ in range(min(500, n - i))]
+            while ready < len(tasks):
+                await asyncio.sleep(0.05)
+        await asyncio.sleep(1.0)
+        rss1 = _rss_kb(str(server.pid))
+        print(f"[http] {n:,} SSE connections")
+        print(f"  server RSS {rss0 / 1024:,.1f}MB -> {rss1 / 1024:,.1f}MB ({(rss1 - rss0) * 1024 / n:,.0f}B per connection)")
+
+        # 위험도만 정상/주의로 번갈아 바뀌게 해 predict마다 알림이 정확히 1건씩 전 구독자에게 간다
+        # (수면부채/ACWR은 임계값 아래, 매번 입력을 조금씩 달리해 멱등 재응답을 피함)
+        calm = {"duration_min": 30, "avg_hr": 120, "max_hr": 190, "sleep_hours": 8, "last7_load": 300, "last28_load": 4000}
+        hot = {**calm, "duration_min": 120, "avg_hr": 175, "sleep_hours": 7, "hi_streak_days": 3}
+        loop = asyncio.get_running_loop()
+        expected = n * events
+        t0 = time.perf_counter()
+        for e in range(events):
+            payload = hot if e % 2 == 0 else calm
+            await loop.run_in_executor(None, _request, port, "POST", "/api/predict", {**payload, "duration_min": payload["duration_min"] + e}, token)
+        try:
+            await asyncio.wait_for(done.wait(), 120)
+        except asyncio.TimeoutError:
+            pass
+        _report(latencies, expected, time.perf_counter() - t0)
+        print(f"  hub {await loop.run_in_executor(None, _request, port, 'GET', '/api/health/alerts')}")
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0.5)  # 서버가 연결 종료를 처리할 시간
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="코치 알림 SSE 팬아웃 벤치마크")
+    p.add_argument("--subscribers", type=int, default=10_000)
+    p.add_argument("--users", type=int, default=0, help="in-process: 구독자를 나눌 사용자 수 (기본: 구독자 수)")
+    p.add_argument("--events", type=int, default=3)
+    p.add_argument("--http", action="store_true", help="실제 uvicorn 서버에 SSE 연결")
+    p.add_argument("--port", type=int, default=8790)
+    args = p.parse_args(argv)
+    if args.http:
+        asyncio.run(_http(args.subscribers, args.events, args.port))
+    else:
+        asyncio.run(_in_process(args.subscribers, args.users or args.subscribers, args.events))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""List-response encoding benchmark: model path vs encoding.RowEncoder.
+
+For each list endpoint it builds N rows in a temporary DB, then times the two ways
+of turning them into response bytes:
+
+    model   a Pydantic model per row -> FastAPI response_model validation
+            (fastapi.routing.serialize_response) -> JSONResponse rendering
+    fast    the route's encoder (rows -> compiled pydantic-core JSON), as served now
+
+and checks that both produce the same JSON. It also times one in-process
+GET /api/todos end to end (auth, query, encoding).
+
+Usage (from backend/):
+    python bench_encoding.py --rows 10000
+"""
+from typing import Callable, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+
+def _best_ms(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, (time.perf_counter() - t0) * 1000)
+    return best
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="목록 응답 JSON 인코딩 벤치마크 (모델 경로 vs RowEncoder)")
+    p.add_argument("--rows", type=int, default=10_000)
+    p.add_argument("--repeat", type=int, default=5, help="경로별 반복 횟수 (최솟값 사용)")
+    args = p.parse_args(argv)
+    n = args.rows
+
+    tmp = tempfile.mkdtemp(prefix="hyuga-bench-")
+    os.environ["HYUGA_DB_PATH"] = str(Path(tmp) / "bench.db")
+
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+
+    import app
+    import mirror
+    from replay import call_asgi
+
+    def route_field(path: str):
+        return next(r for r in app.app.routes if getattr(r, "path", None) == path and "GET" in r.methods).response_field
+
+    def model_path(field, build: Callable[[], list]) -> bytes:
+        content = asyncio.run(serialize_response(field=field, response_content=build()))
+        return JSONResponse(content).body
+
+    # 데이터: 한 사용자의 할 일 N개, NFA 미러 N행, 강좌 검색 결과 형태의 dict N개
+    now = datetime.utcnow()
+    app._ensure_db()
+    with app._write_db() as conn:
+        uid = conn.execute(
+            "INSERT INTO users (email, password_hash, name, created_at) VALUES ('bench@bench.example.com', '', '벤치', ?)",
+            (now.isoformat(),),
+        ).lastrowid
+        token = "bench-token"
+        conn.execute("INSERT INTO tokens (token, user_id, created_at) VALUES (?, ?, ?)", (token, uid, now.isoformat()))
+        conn.executemany(
+            "INSERT INTO user_todos (user_id, title, date, time, is_done, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (uid, f"회복 루틴 {i} · stretch", (now + timedelta(days=i % 60)).date().isoformat(), f"{i % 24:02d}:{i % 60:02d}", i % 3 == 0, (now - timedelta(seconds=i * 37)).isoformat())
+                for i in range(n)
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO nfa_baseline_rows (item_key, age_band, gender, metric, baseline_score, source, raw_json, synced_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (f"bench-{i}", f"{20 + i % 5 * 10}-{29 + i % 5 * 10}", "MF"[i % 2], "recovery", 50 + i % 30, "NFA 체력측정",
+                 json.dumps({"age": 20 + i % 50, "sexdstn": "MF"[i % 2], "score": 50 + i % 30, "note": "측정"}, ensure_ascii=False), now.isoformat())
+                for i in range(n)
+            ],
+        )
+    conn = app._get_db()
+    try:
+        todo_rows = conn.execute("SELECT * FROM user_todos WHERE user_id = ? ORDER BY date ASC, time ASC, created_at ASC", (uid,)).fetchall()
+        nfa_rows = mirror.query_nfa(conn, None, None, None, 1, n)
+    finally:
+        conn.close()
+    courses = [
+        {"title": f"재활 필라테스 {i}", "category": "필라테스", "location": "스포츠 복지관", "eligible": True, "note": None,
+         "url": None, "lat": 37.5 + i * 1e-5, "lng": 127.0 - i * 1e-5, "distance_km": round(i * 0.013, 2)}
+        for i in range(n)
+    ]
+
+    cases = [
+        ("todos", route_field("/api/todos"), lambda: [app._todo_row_to_out(r) for r in todo_rows], lambda: app._TODO_ENCODER.encode(todo_rows)),
+        (
+            "nfa-baseline",
+            route_field("/api/nfa-baseline"),
+            lambda: [app.NFABaselineRow(**{k: r[k] for k in app.NFABaselineRow.model_fields}) for r in nfa_rows],
+            lambda: app._NFA_ENCODER.encode(nfa_rows),
+        ),
+        (
+            "nfa-baseline raw",
+            route_field("/api/nfa-baseline"),
+            lambda: [json.loads(r["raw_json"]) for r in nfa_rows],
+            lambda: app.encoding.array_response(r["raw_json"] for r in nfa_rows).body,
+        ),
+        ("recovery-courses", route_field("/api/recovery-courses"), lambda: [app.RecoveryCourse(**c) for c in courses], lambda: app._COURSE_ENCODER.encode(courses)),
+    ]
+
+    print(f"[encoding] {n:,} rows, best of {args.repeat}")
+    print(f"  {'endpoint':<18} {'model us/row':>13} {'fast us/row':>12} {'speedup':>8}  same JSON")
+    ok = True
+    for name, field, build, fast in cases:
+        same = json.loads(model_path(field, build)) == json.loads(fast())
+        ok &= same
+        model_ms = _best_ms(lambda: model_path(field, build), args.repeat)
+        fast_ms = _best_ms(fast, args.repeat)
+        print(f"  {name:<18} {model_ms * 1000 / n:>13.2f} {fast_ms * 1000 / n:>12.2f} {model_ms / fast_ms:>7.1f}x  {'yes' if same else 'NO'}")
+
+    async def get_todos():
+        status_code, body = await call_asgi(app.app, "GET", "/api/todos", headers={"authorization": f"Bearer {token}"})
+        assert status_code == 200 and body.count(b'"id"') == n, status_code
+
+    e2e_ms = _best_ms(lambda: asyncio.run(get_todos()), args.repeat)
+    print(f"  GET /api/todos end to end: {e2e_ms:.1f}ms ({e2e_ms * 1000 / n:.2f} us/row)")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Cold-start regression check for `import app`.
+
+Imports app.py in fresh interpreters and fails (exit 1) when:
+  - the import takes longer than --budget-ms (best of --runs),
+  - app.py's own setup after its imports exceeds --app-budget-ms,
+  - heavy modules deferred to first use (requests, numpy) are imported eagerly, or
+  - the import touches the database (schema work belongs to the lifespan hook), or
+  - a fresh process whose first DB access is a write (no lifespan hook, e.g. scripts
+    or HYUGA_LAZY_DB=1) does not finish it within --write-timeout-sec.
+
+Usage (from backend/, e.g. in CI):
+    python check_startup.py --budget-ms 1500 --app-budget-ms 250
+"""
+from typing import List, Optional
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import app
+total = (time.perf_counter() - t) * 1000
+print(json.dumps({
+    "import_ms": round(total, 1),
+    "timings": app._STARTUP_TIMINGS,
+    "eager_modules": [m for m in ("requests", "urllib3", "numpy") if m in sys.modules],
+}))
+"""
+
+LAZY_MODULES = ("requests", "numpy")
+
+# 첫 DB 접근이 쓰기인 경우: _write_db -> 스키마 초기화가 writer 락을 다시 잡지 않아야 한다
+WRITE_FIRST_PROBE = """
+import app
+with app._write_db() as conn:
+    conn.execute("INSERT INTO users (email, password_hash, name, created_at) VALUES ('probe@startup.invalid', '', '', '')")
+print("ok")
+"""
+
+
+def _write_first(db_path: Path, timeout_sec: float) -> bool:
+    try:
+        proc = subprocess.run(
+            [sys.executable, "-c", WRITE_FIRST_PROBE],
+            cwd=Path(__file__).parent,
+            env={**os.environ, "HYUGA_DB_PATH": str(db_path), "HYUGA_LAZY_DB": "1"},
+            capture_output=True,
+            text=True,
+            timeout=timeout_sec,
+        )
+    except subprocess.TimeoutExpired:
+        return False
+    return proc.returncode == 0 and proc.stdout.strip().endswith("ok")
+
+
+def _probe(db_path: Path, importtime: bool = False) -> dict:
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", PROBE]
+    proc = subprocess.run(
+        cmd,
+        cwd=Path(__file__).parent,
+        env={**os.environ, "HYUGA_DB_PATH": str(db_path)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    out = json.loads(proc.stdout.strip().splitlines()[-1])
+    out["stderr"] = proc.stderr
+    return out
+
+
+def _top_imports(stderr: str, n: int = 10) -> List[str]:
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cum_us, name = line.split(":", 1)[1].split("|")
+        rows.append((int(cum_us), name.strip()))
+    rows.sort(reverse=True)
+    return [f"{cum / 1000:8.1f}ms  {name}" for cum, name in rows[:n]]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="app.py import 시간 예산 검사")
+    p.add_argument("--budget-ms", type=float, default=1500.0, help="import app 전체 허용 시간")
+    p.add_argument("--app-budget-ms", type=float, default=250.0, help="app.py 자체 설정(모델/라우트) 허용 시간")
+    p.add_argument("--runs", type=int, default=3)
+    p.add_argument("--write-timeout-sec", type=float, default=30.0, help="첫 접근이 쓰기인 새 프로세스의 허용 시간")
+    args = p.parse_args(argv)
+
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "startup-check.db"
+        runs = [_probe(db_path) for _ in range(args.runs)]
+        best = min(runs, key=lambda r: r["import_ms"])
+        timings = best["timings"]
+        print(f"[startup] import app: {best['import_ms']:.1f}ms (best of {args.runs}, budget {args.budget_ms:.0f}ms)")
+        for k, v in timings.items():
+            print(f"  {k:<14} {v:>8.1f}ms")
+
+        if best["import_ms"] > args.budget_ms:
+            failures.append(f"import app took {best['import_ms']:.1f}ms > {args.budget_ms:.0f}ms")
+        if timings.get("app_setup_ms", 0.0) > args.app_budget_ms:
+            failures.append(f"app.py setup took {timings['app_setup_ms']:.1f}ms > {args.app_budget_ms:.0f}ms")
+        eager = [m for m in best["eager_modules"] if m in LAZY_MODULES]
+        if eager:
+            failures.append(f"modules imported eagerly: {', '.join(eager)}")
+        if db_path.exists() or "db_init_ms" in timings:
+            failures.append("import app touched the database; schema init should run in the lifespan hook")
+        if not _write_first(Path(tmp) / "write-first.db", args.write_timeout_sec):
+            failures.append(f"a first write without the lifespan hook did not finish within {args.write_timeout_sec:.0f}s (lazy init deadlock?)")
+
+        if failures:
+            print("[startup] slowest imports:")
+            for line in _top_imports(_probe(db_path, importtime=True)["stderr"]):
+                print("  " + line)
+    for f in failures:
+        print(f"[startup] FAIL: {f}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
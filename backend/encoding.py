@@ -0,0 +1,65 @@
+"""Pre-serialized JSON responses for large list endpoints.
+
+Returning `[Model(...) for row in rows]` from a route costs three passes per row:
+building the model, FastAPI validating the list again against response_model, and
+jsonable_encoder + json.dumps. For rows we produce ourselves (typed NOT NULL SQLite
+columns, our own dicts) the validation is redundant. RowEncoder reads the response
+model's fields straight from sqlite3.Row/dict rows and hands plain values to
+pydantic-core's compiled serializer (pydantic_core.to_json). The bytes go out in a
+Response that FastAPI sends as-is. Routes keep response_model for the OpenAPI schema.
+
+The JSON matches what the model path produces: same fields in the same order,
+with the same datetime formatting. bench_encoding.py checks parity and measures
+the per-row cost of both paths.
+"""
+from typing import Any, Callable, Iterable, List, Mapping, Type, Union
+
+from fastapi import Response
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+
+class JSONBytes(Response):
+    media_type = "application/json"
+
+
+class RowEncoder:
+    """Encodes rows shaped like `model` without building model instances.
+
+    `convert` maps a field to a function applied to its column value (e.g. is_done=bool);
+    other fields are copied as they are, so the columns must already have the model's types.
+    """
+
+    def __init__(self, model: Type[BaseModel], **convert: Callable[[Any], Any]):
+        self.fields = tuple(model.model_fields)
+        unknown = set(convert) - set(self.fields)
+        if unknown:
+            raise ValueError(f"{model.__name__} has no fields {sorted(unknown)}")
+        self.convert = tuple(convert.items())
+
+    def dicts(self, rows: Iterable[Mapping]) -> List[dict]:
+        fields, convert = self.fields, self.convert
+        out = []
+        for r in rows:
+            d = {f: r[f] for f in fields}
+            for f, fn in convert:
+                d[f] = fn(d[f])
+            out.append(d)
+        return out
+
+    def encode(self, rows: Iterable[Mapping]) -> bytes:
+        return to_json(self.dicts(rows))
+
+    def response(self, rows: Iterable[Mapping], status_code: int = 200) -> Response:
+        return JSONBytes(self.encode(rows), status_code=status_code)
+
+
+def json_response(content: Any, status_code: int = 200) -> Response:
+    """Encodes model instances or plain values in one compiled pass, skipping response_model validation."""
+    return JSONBytes(to_json(content), status_code=status_code)
+
+
+def array_response(items: Iterable[Union[str, bytes]], status_code: int = 200) -> Response:
+    """Joins items that are already JSON texts (e.g. stored raw_json columns) into an array."""
+    body = b",".join(i.encode("utf-8") if isinstance(i, str) else i for i in items)
+    return JSONBytes(b"[" + body + b"]", status_code=status_code)
@@ -0,0 +1,282 @@
+"""Heart-rate stream ingestion: per-sample Banister TRIMP and time in zone.
+
+A session is created with the athlete's max and resting HR, then samples are uploaded in any
+number of requests (chunks), each either
+
+    application/octet-stream   packed little-endian records <u4 t_ms, <u2 bpm>
+                               (t_ms = milliseconds since session start)
+    application/x-ndjson       one {"t": seconds, "hr": bpm} or [seconds, bpm] per line
+
+Samples are decoded into NumPy arrays a batch at a time and folded into a running
+TrimpAccumulator, so no per-sample Python objects outlive a batch. Each interval
+between consecutive samples is weighted by the earlier sample's HR reserve,
+x = (hr - rest_hr) / (max_hr - rest_hr) clipped to [0, 1], as in Banister's TRIMP:
+minutes * x * 0.64 * e^(1.92 * x). Resting HR adds no load. (app._session_trimp's
+avg_hr/max_hr estimate is a coarser heuristic with the same constants but no HR
+reserve, so it reads higher for the same session.) Gaps longer than
+MAX_GAP_SEC (sensor dropouts) only count MAX_GAP_SEC; out-of-order, duplicate and
+out-of-range samples are dropped.
+
+The stored summary is a handful of scalars plus a 5-float zone array; the carry-over
+sample (last_t, last_hr) lets the next chunk continue where the previous one ended.
+/api/predict reads the session's TRIMP through WorkoutInput.hr_session_id.
+
+NumPy is imported on the first upload, not with the module (see check_startup.py).
+"""
+from typing import Iterator, Optional, Tuple
+import json
+import secrets
+import sqlite3
+from array import array
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hr_sessions (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    max_hr REAL NOT NULL,
+    rest_hr REAL NOT NULL DEFAULT 60,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    samples INTEGER NOT NULL DEFAULT 0,
+    rejected INTEGER NOT NULL DEFAULT 0,
+    duration_sec REAL NOT NULL DEFAULT 0,
+    trimp REAL NOT NULL DEFAULT 0,
+    hr_time REAL NOT NULL DEFAULT 0,
+    peak_hr REAL,
+    last_t REAL,
+    last_hr REAL,
+    zone_sec BLOB NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_hr_sessions_user ON hr_sessions(user_id, created_at);
+"""
+
+# Banister TRIMP 가중치 상수 (남성 기준; app._session_trimp 추정식도 같은 값)
+TRIMP_A = 0.64
+TRIMP_B = 1.92
+TRIMP_E = 2.71828
+
+HR_MIN, HR_MAX = 30, 230  # WorkoutInput.avg_hr/max_hr 범위
+DEFAULT_REST_HR = 60.0
+MAX_GAP_SEC = 5.0
+# 최대심박 대비 구간 경계: Z1 <60%, Z2 60-70, Z3 70-80, Z4 80-90, Z5 >=90
+ZONE_EDGES = (0.6, 0.7, 0.8, 0.9)
+N_ZONES = len(ZONE_EDGES) + 1
+
+BINARY_RECORD = [("t", "<u4"), ("hr", "<u2")]  # numpy dtype, 6바이트
+BINARY_RECORD_SIZE = 6
+NDJSON_BATCH = 8192
+
+BINARY_TYPE = "application/octet-stream"
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+class TrimpAccumulator:
+    __slots__ = ("max_hr", "rest_hr", "samples", "rejected", "duration_sec", "trimp", "hr_time", "peak_hr", "last_t", "last_hr", "zone_sec")
+
+    def __init__(self, max_hr: float, rest_hr: float = DEFAULT_REST_HR):
+        self.max_hr = float(max_hr)
+        self.rest_hr = float(rest_hr)
+        self.samples = 0
+        self.rejected = 0
+        self.duration_sec = 0.0
+        self.trimp = 0.0
+        self.hr_time = 0.0  # sum(hr * dt), 시간가중 평균 심박용
+        self.peak_hr: Optional[float] = None
+        self.last_t: Optional[float] = None
+        self.last_hr: Optional[float] = None
+        self.zone_sec = array("d", [0.0] * N_ZONES)
+
+    def feed(self, t, hr):
+        """Adds a batch of samples (NumPy arrays: t in seconds since session start, hr in bpm)."""
+        import numpy as np
+
+        t = np.asarray(t, dtype=np.float64)
+        hr = np.asarray(hr, dtype=np.float64)
+        n = t.size
+        # 범위 밖 값과, 앞선 샘플보다 늦지 않은(역순/중복) 샘플은 버린다
+        valid = (hr >= HR_MIN) & (hr <= HR_MAX) & np.isfinite(t)
+        prev_t = -np.inf if self.last_t is None else self.last_t
+        running = np.maximum.accumulate(np.concatenate(([prev_t], np.where(valid, t, -np.inf))))[:-1]
+        keep = valid & (t > running)
+        if not keep.all():
+            t, hr = t[keep], hr[keep]
+            self.rejected += n - t.size
+        if t.size == 0:
+            return
+
+        # 구간 [t[i-1], t[i]]는 앞 샘플의 심박으로 계산 (첫 샘플은 이전 청크의 마지막 샘플과 이어짐)
+        if self.last_t is None:
+            dt = np.diff(t)
+            w_hr = hr[:-1]
+        else:
+            dt = np.diff(t, prepend=self.last_t)
+            w_hr = np.concatenate(([self.last_hr], hr[:-1]))
+        np.minimum(dt, MAX_GAP_SEC, out=dt)
+        ratio = np.clip(w_hr / self.max_hr, 0.0, 1.0)  # 구간은 최대심박 대비
+        reserve = np.clip((w_hr - self.rest_hr) / (self.max_hr - self.rest_hr), 0.0, 1.0)
+
+        self.trimp += float(np.dot(dt / 60.0, reserve * TRIMP_A * np.power(TRIMP_E, TRIMP_B * reserve)))
+        zones = np.bincount(np.searchsorted(ZONE_EDGES, ratio, side="right"), weights=dt, minlength=N_ZONES)
+        for i, sec in enumerate(zones.tolist()):
+            self.zone_sec[i] += sec
+        self.duration_sec += float(dt.sum())
+        self.hr_time += float(np.dot(w_hr, dt))
+        peak = float(hr.max())
+        self.peak_hr = peak if self.peak_hr is None else max(self.peak_hr, peak)
+        self.samples += int(t.size)
+        self.last_t = float(t[-1])
+        self.last_hr = float(hr[-1])
+
+    def summary(self) -> dict:
+        return {
+            "max_hr": self.max_hr,
+            "rest_hr": self.rest_hr,
+            "samples": self.samples,
+            "rejected": self.rejected,
+            "duration_min": round(self.duration_sec / 60.0, 2),
+            "trimp": round(self.trimp, 1),
+            "avg_hr": round(self.hr_time / self.duration_sec, 1) if self.duration_sec else None,
+            "peak_hr": self.peak_hr,
+            "zone_min": [round(s / 60.0, 2) for s in self.zone_sec],
+        }
+
+
+class BinaryDecoder:
+    """Incremental decoder for packed records; record boundaries may fall anywhere in a chunk."""
+
+    def __init__(self):
+        import numpy as np
+
+        self._np = np
+        self._dtype = np.dtype(BINARY_RECORD)
+        self._rest = b""
+
+    def feed(self, chunk: bytes) -> Iterator[tuple]:
+        buf = self._rest + chunk if self._rest else chunk
+        whole = len(buf) - len(buf) % BINARY_RECORD_SIZE
+        self._rest = buf[whole:]
+        if whole:
+            rec = self._np.frombuffer(buf, dtype=self._dtype, count=whole // BINARY_RECORD_SIZE)
+            yield rec["t"] / 1000.0, rec["hr"]
+
+    def close(self) -> Iterator[tuple]:
+        if self._rest:
+            raise ValueError(f"레코드 크기({BINARY_RECORD_SIZE}바이트)로 나누어떨어지지 않는 꼬리 {len(self._rest)}바이트")
+        return iter(())
+
+
+class NdjsonDecoder:
+    """Incremental NDJSON parser writing samples into fixed NumPy buffers.
+
+    feed()/close() yield views into the same buffers, so each batch must be consumed
+    before the next one is requested.
+    """
+
+    def __init__(self, batch: int = NDJSON_BATCH):
+        import numpy as np
+
+        self._t = np.empty(batch)
+        self._hr = np.empty(batch)
+        self._n = 0
+        self._rest = b""
+        self.line = 0
+
+    def _parse(self, line: bytes):
+        self.line += 1
+        line = line.strip()
+        if not line:
+            return
+        try:
+            obj = json.loads(line)
+            t, hr = (obj["t"], obj["hr"]) if isinstance(obj, dict) else obj
+            self._t[self._n] = t
+            self._hr[self._n] = hr
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(f"{self.line}번째 줄을 읽을 수 없습니다: {e}") from None
+        self._n += 1
+
+    def _flush(self) -> Iterator[tuple]:
+        if self._n:
+            n, self._n = self._n, 0
+            yield self._t[:n], self._hr[:n]
+
+    def feed(self, chunk: bytes) -> Iterator[tuple]:
+        lines = (self._rest + chunk).split(b"\n")
+        self._rest = lines.pop()
+        for line in lines:
+            self._parse(line)
+            if self._n == self._t.size:
+                yield from self._flush()
+        yield from self._flush()
+
+    def close(self) -> Iterator[tuple]:
+        if self._rest:
+            self._parse(self._rest)
+            self._rest = b""
+        yield from self._flush()
+
+
+def decoder_for(content_type: str):
+    """BinaryDecoder/NdjsonDecoder for a request Content-Type, or None if unsupported."""
+    media = (content_type or "").split(";", 1)[0].strip().lower()
+    if media == BINARY_TYPE:
+        return BinaryDecoder()
+    if media in NDJSON_TYPES:
+        return NdjsonDecoder()
+    return None
+
+
+def migrate(conn: sqlite3.Connection):
+    conn.executescript(SCHEMA)
+    # 기존 DB: 안정시 심박 컬럼 추가 (이전 세션은 기본값으로 본다)
+    if "rest_hr" not in {r["name"] for r in conn.execute("PRAGMA table_info(hr_sessions)")}:
+        conn.execute(f"ALTER TABLE hr_sessions ADD COLUMN rest_hr REAL NOT NULL DEFAULT {DEFAULT_REST_HR:g}")
+
+
+def create(conn: sqlite3.Connection, user_id: int, max_hr: float, rest_hr: float = DEFAULT_REST_HR) -> str:
+    """Inserts an empty session; call inside the write transaction."""
+    session_id = secrets.token_urlsafe(12)
+    now = datetime.utcnow().isoformat()
+    conn.execute(
+        "INSERT INTO hr_sessions (id, user_id, max_hr, rest_hr, zone_sec, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (session_id, user_id, max_hr, rest_hr, array("d", [0.0] * N_ZONES).tobytes(), now, now),
+    )
+    return session_id
+
+
+def load(conn: sqlite3.Connection, session_id: str, user_id: int) -> Optional[Tuple[TrimpAccumulator, int, str]]:
+    """(accumulator, version, updated_at) of the user's session, or None."""
+    row = conn.execute("SELECT * FROM hr_sessions WHERE id = ? AND user_id = ?", (session_id, user_id)).fetchone()
+    if not row:
+        return None
+    acc = TrimpAccumulator(row["max_hr"], row["rest_hr"])
+    acc.samples = row["samples"]
+    acc.rejected = row["rejected"]
+    acc.duration_sec = row["duration_sec"]
+    acc.trimp = row["trimp"]
+    acc.hr_time = row["hr_time"]
+    acc.peak_hr = row["peak_hr"]
+    acc.last_t = row["last_t"]
+    acc.last_hr = row["last_hr"]
+    acc.zone_sec = array("d")
+    acc.zone_sec.frombytes(row["zone_sec"])
+    return acc, row["chunks"], row["updated_at"]
+
+
+def save(conn: sqlite3.Connection, session_id: str, acc: TrimpAccumulator, version: int) -> Optional[str]:
+    """Stores one applied upload; returns updated_at, or None if another upload got there first."""
+    now = datetime.utcnow().isoformat()
+    n = conn.execute(
+        """
+        UPDATE hr_sessions SET chunks = chunks + 1, samples = ?, rejected = ?, duration_sec = ?, trimp = ?,
+            hr_time = ?, peak_hr = ?, last_t = ?, last_hr = ?, zone_sec = ?, updated_at = ?
+        WHERE id = ? AND chunks = ?
+        """,
+        (
+            acc.samples, acc.rejected, acc.duration_sec, acc.trimp, acc.hr_time, acc.peak_hr,
+            acc.last_t, acc.last_hr, acc.zone_sec.tobytes(), now, session_id, version,
+        ),
+    ).rowcount
+    return now if n else None
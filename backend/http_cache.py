@@ -0,0 +1,313 @@
+"""Disk-persisted stale-while-revalidate cache for upstream (public data portal) responses.
+
+Entries live in a separate SQLite file so they survive restarts and are shared by
+every worker process. Each request kind has its own freshness TTL and stale window:
+
+    fresh  (age < ttl)          -> served from disk ("hit")
+    stale  (age < ttl + stale)  -> served from disk, refreshed in the background ("stale")
+    older / missing             -> fetched synchronously ("miss"); if that fails an
+                                   expired entry is still served ("stale_error")
+
+Misses are single-flight: concurrent requests for the same key in one process wait
+for the first one's fetch, and across worker processes a claim row in
+response_cache_claims lets one worker fetch while the others poll the cache for
+its result ("coalesced"). A cold cache after a restart therefore sends one upstream
+request per key, not one per request and worker.
+
+Total body size is capped; least recently used entries are evicted first.
+"""
+from typing import Any, Callable, Dict, Optional, Tuple
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS response_cache (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    url TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    fresh_until REAL NOT NULL,
+    stale_until REAL NOT NULL,
+    last_access REAL NOT NULL,
+    refreshing_until REAL
+);
+CREATE INDEX IF NOT EXISTS idx_response_cache_lru ON response_cache(last_access);
+CREATE TABLE IF NOT EXISTS response_cache_claims (
+    key TEXT PRIMARY KEY,
+    claimed_until REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS response_cache_stats (
+    kind TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, outcome)
+);
+"""
+
+# kind -> (fresh TTL, stale window) in seconds; CACHE_TTL_<KIND> / CACHE_STALE_<KIND> override
+DEFAULT_TTLS: Dict[str, Tuple[float, float]] = {
+    "spots": (600, 86400),
+}
+SECRET_PARAMS = {"servicekey"}
+TOUCH_INTERVAL_SEC = 60.0
+# 같은 키를 가져오는 중인 요청을 기다리는 최대 시간 (업스트림 타임아웃 8초보다 길게)
+FLIGHT_WAIT_SEC = 12.0
+FLIGHT_POLL_SEC = 0.05
+
+
+def normalize(url: str, params: Optional[dict]) -> Tuple[str, str]:
+    """(cache key, display URL). Service keys are excluded so rotating a key keeps the cache."""
+    parts = urlsplit(url.replace("https://https://", "https://").rstrip("?&/ "))
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)]
+    query += [(k, str(v)) for k, v in (params or {}).items()]
+    query = sorted((k, v) for k, v in query if k.lower() not in SECRET_PARAMS)
+    qs = "&".join(f"{k}={v}" for k, v in query)
+    display = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), qs, ""))
+    return hashlib.sha256(display.encode("utf-8")).hexdigest(), display
+
+
+class _Flight:
+    __slots__ = ("done", "data")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.data: Optional[Any] = None
+
+
+class ResponseCache:
+    def __init__(self, path: Path, max_bytes: int = 64 * 1024 * 1024):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._ready = False
+        self._lock = threading.Lock()
+        self._pending: Counter = Counter()
+        self._inflight: set = set()
+        self._flights: Dict[str, "_Flight"] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    conn.execute("PRAGMA journal_mode = WAL")
+                    conn.executescript(SCHEMA)
+                    self._ready = True
+        return conn
+
+    def ttl(self, kind: str) -> Tuple[float, float]:
+        fresh, stale = DEFAULT_TTLS.get(kind, (300, 3600))
+        return float(os.getenv(f"CACHE_TTL_{kind.upper()}", fresh)), float(os.getenv(f"CACHE_STALE_{kind.upper()}", stale))
+
+    def _count(self, kind: str, outcome: str):
+        with self._lock:
+            self._pending[(kind, outcome)] += 1
+
+    def _flush_stats(self, conn: sqlite3.Connection):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if pending:
+            conn.executemany(
+                """
+                INSERT INTO response_cache_stats (kind, outcome, count) VALUES (?, ?, ?)
+                ON CONFLICT(kind, outcome) DO UPDATE SET count = count + excluded.count
+                """,
+                [(k, o, n) for (k, o), n in pending.items()],
+            )
+
+    def get_or_fetch(self, kind: str, url: str, params: Optional[dict], fetch: Callable[[], Optional[Any]]) -> Optional[Any]:
+        key, display = normalize(url, params)
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT body, fresh_until, stale_until, last_access FROM response_cache WHERE key = ?", (key,)).fetchone()
+            if row and now < row["stale_until"]:
+                if now < row["fresh_until"]:
+                    self._count(kind, "hit")
+                else:
+                    self._count(kind, "stale")
+                    self._revalidate(kind, key, display, fetch)
+                # LRU 기록과 지표 반영은 매 요청이 아니라 가끔씩만 써서 읽기 경로를 가볍게 유지
+                if now - row["last_access"] > TOUCH_INTERVAL_SEC or sum(self._pending.values()) >= 200:
+                    with conn:
+                        conn.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key))
+                        self._flush_stats(conn)
+                return json.loads(zlib.decompress(row["body"]))
+        finally:
+            conn.close()
+
+        data = self._fetch_once(kind, key, display, fetch, now)
+        if data is None:
+            if row:
+                # 업스트림 실패: 만료된 항목이라도 있으면 제공 (stale-if-error)
+                self._count(kind, "stale_error")
+                return json.loads(zlib.decompress(row["body"]))
+            self._count(kind, "error")
+            return None
+        self._store(kind, key, display, data)
+        return data
+
+    def _fetch_once(self, kind: str, key: str, display: str, fetch: Callable[[], Optional[Any]], since: float) -> Optional[Any]:
+        """fetch() for a miss, shared by every concurrent request for the key in this process and across workers."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            self._count(kind, "coalesced")
+            flight.done.wait(FLIGHT_WAIT_SEC)
+            return flight.data
+        try:
+            if self._claim(key):
+                self._count(kind, "miss")
+                try:
+                    flight.data = fetch()
+                    if flight.data is not None:
+                        self._store(kind, key, display, flight.data)
+                finally:
+                    self._release(key)
+            else:
+                # 다른 워커가 가져오는 중: 그 결과가 캐시에 저장되기를 기다린다
+                self._count(kind, "coalesced")
+                flight.data = self._wait_for_store(key, since)
+            return flight.data
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _claim(self, key: str) -> bool:
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute(
+                    """
+                    INSERT INTO response_cache_claims (key, claimed_until) VALUES (?, ?)
+                    ON CONFLICT(key) DO UPDATE SET claimed_until = excluded.claimed_until WHERE claimed_until < ?
+                    """,
+                    (key, now + FLIGHT_WAIT_SEC, now),
+                ).rowcount > 0
+        finally:
+            conn.close()
+
+    def _release(self, key: str):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM response_cache_claims WHERE key = ?", (key,))
+        finally:
+            conn.close()
+
+    def _wait_for_store(self, key: str, since: float) -> Optional[Any]:
+        """Body stored at or after `since`, once it appears; None if the claim holder gave up or failed."""
+        deadline = time.time() + FLIGHT_WAIT_SEC
+        conn = self._connect()
+        try:
+            while time.time() < deadline:
+                # 클레임을 먼저 본다: 저장이 클레임 해제보다 앞서므로, 해제를 본 뒤 읽으면 결과를 놓치지 않는다
+                claimed = conn.execute("SELECT 1 FROM response_cache_claims WHERE key = ? AND claimed_until >= ?", (key, time.time())).fetchone()
+                row = conn.execute("SELECT body FROM response_cache WHERE key = ? AND fetched_at >= ?", (key, since)).fetchone()
+                if row:
+                    return json.loads(zlib.decompress(row["body"]))
+                if not claimed:
+                    return None
+                time.sleep(FLIGHT_POLL_SEC)
+        finally:
+            conn.close()
+        return None
+
+    def _store(self, kind: str, key: str, display: str, data: Any):
+        body = zlib.compress(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        now = time.time()
+        fresh, stale = self.ttl(kind)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    """
+                    INSERT INTO response_cache (key, kind, url, body, size, fetched_at, fresh_until, stale_until, last_access, refreshing_until)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)
+                    ON CONFLICT(key) DO UPDATE SET
+                        body = excluded.body, size = excluded.size, fetched_at = excluded.fetched_at,
+                        fresh_until = excluded.fresh_until, stale_until = excluded.stale_until,
+                        last_access = excluded.last_access, refreshing_until = NULL
+                    """,
+                    (key, kind, display, body, len(body), now, now + fresh, now + fresh + stale, now),
+                )
+                self._evict(conn)
+                self._flush_stats(conn)
+        finally:
+            conn.close()
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM response_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        for r in conn.execute("SELECT key, kind, size FROM response_cache ORDER BY last_access ASC").fetchall():
+            if total <= target:
+                break
+            conn.execute("DELETE FROM response_cache WHERE key = ?", (r["key"],))
+            total -= r["size"]
+            self._count(r["kind"], "evicted")
+
+    def _revalidate(self, kind: str, key: str, display: str, fetch: Callable[[], Optional[Any]]):
+        with self._lock:
+            if key in self._inflight:
+                return
+            self._inflight.add(key)
+        now = time.time()
+        conn = self._connect()
+        try:
+            # 다른 워커가 이미 갱신 중이면 건너뛴다
+            with conn:
+                claimed = conn.execute(
+                    "UPDATE response_cache SET refreshing_until = ? WHERE key = ? AND (refreshing_until IS NULL OR refreshing_until < ?)",
+                    (now + 30, key, now),
+                ).rowcount
+        finally:
+            conn.close()
+        if not claimed:
+            with self._lock:
+                self._inflight.discard(key)
+            return
+
+        def run():
+            try:
+                data = fetch()
+                if data is not None:
+                    self._store(kind, key, display, data)
+                else:
+                    self._count(kind, "refresh_error")
+            finally:
+                with self._lock:
+                    self._inflight.discard(key)
+
+        threading.Thread(target=run, name="hyuga-cache-refresh", daemon=True).start()
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        try:
+            with conn:
+                self._flush_stats(conn)
+            by_kind: Dict[str, Dict[str, int]] = {}
+            for r in conn.execute("SELECT kind, outcome, count FROM response_cache_stats"):
+                by_kind.setdefault(r["kind"], {})[r["outcome"]] = r["count"]
+            for r in conn.execute("SELECT kind, COUNT(*) AS entries, COALESCE(SUM(size), 0) AS bytes FROM response_cache GROUP BY kind"):
+                by_kind.setdefault(r["kind"], {}).update(entries=r["entries"], bytes=r["bytes"])
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM response_cache").fetchone()[0]
+        finally:
+            conn.close()
+        return {"max_bytes": self.max_bytes, "bytes": total, "kinds": by_kind}
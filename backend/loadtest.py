@@ -0,0 +1,173 @@
+"""Read-scaling load test for the multi-worker serving mode.
+
+Starts `uvicorn app:app --workers N` against a seeded database for each N, drives
+authenticated reads (plus an optional share of todo writes) from several client
+processes and prints throughput per worker count.
+
+Usage (from backend/):
+    python seed.py --db /tmp/hyuga-load.db --users 2000 --days 60
+    python loadtest.py --db /tmp/hyuga-load.db --workers 1,2,4 --duration 15 --write-ratio 0.05
+
+Read throughput should grow roughly linearly with N up to the number of CPU cores;
+writes must complete without "database is locked" errors at any N.
+"""
+from typing import Dict, List, Optional
+import argparse
+import http.client
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+
+def _wait_ready(port: int, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            c = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            c.request("GET", "/openapi.json")
+            if c.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server on :{port} did not start")
+
+
+def _client(port: int, tokens: List[str], path: str, threads: int, duration: float, write_ratio: float, seed: int) -> Dict:
+    stats = {"ok": 0, "errors": 0, "writes": 0, "locked": 0, "lat": []}
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def worker(i: int):
+        rng = random.Random(seed * 1000 + i)
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        local = {"ok": 0, "errors": 0, "writes": 0, "locked": 0, "lat": []}
+        while time.time() < stop_at:
+            headers = {"Authorization": f"Bearer {rng.choice(tokens)}"}
+            is_write = rng.random() < write_ratio
+            t0 = time.perf_counter()
+            try:
+                if is_write:
+                    body = json.dumps({"title": "loadtest", "date": "2025-03-01", "time": "07:00"})
+                    conn.request("POST", "/api/todos", body=body, headers={**headers, "Content-Type": "application/json"})
+                else:
+                    conn.request("GET", path, headers=headers)
+                res = conn.getresponse()
+                data = res.read()
+            except (OSError, http.client.HTTPException):
+                local["errors"] += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                continue
+            if res.status < 400:
+                local["ok"] += 1
+                local["writes"] += 1 if is_write else 0
+                if not is_write:
+                    local["lat"].append(time.perf_counter() - t0)
+            else:
+                local["errors"] += 1
+                if b"locked" in data:
+                    local["locked"] += 1
+        conn.close()
+        with lock:
+            for k in ("ok", "errors", "writes", "locked"):
+                stats[k] += local[k]
+            stats["lat"].extend(local["lat"])
+
+    ts = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return stats
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(args: argparse.Namespace, n_workers: int, tokens: List[str]) -> Dict:
+    env = {**os.environ, "HYUGA_DB_PATH": str(Path(args.db).resolve())}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(args.port), "--workers", str(n_workers), "--log-level", "warning"],
+        cwd=Path(__file__).parent,
+        env=env,
+    )
+    try:
+        _wait_ready(args.port)
+        t0 = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=args.clients) as ex:
+            futs = [
+                ex.submit(_client, args.port, tokens, args.path, args.threads, args.duration, args.write_ratio, i)
+                for i in range(args.clients)
+            ]
+            parts = [f.result() for f in futs]
+        elapsed = time.perf_counter() - t0
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    lat = [x for p in parts for x in p["lat"]]
+    ok = sum(p["ok"] for p in parts)
+    writes = sum(p["writes"] for p in parts)
+    return {
+        "workers": n_workers,
+        "read_rps": (ok - writes) / elapsed,
+        "write_rps": writes / elapsed,
+        "errors": sum(p["errors"] for p in parts),
+        "locked": sum(p["locked"] for p in parts),
+        "p50_ms": _pct(lat, 0.50) * 1000,
+        "p95_ms": _pct(lat, 0.95) * 1000,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="멀티 워커 읽기 확장성 부하 테스트")
+    p.add_argument("--db", required=True, help="seed.py로 만든 DB")
+    p.add_argument("--workers", default="1,2,4", help="측정할 워커 수 목록")
+    p.add_argument("--path", default="/api/report/latest", help="읽기 부하 대상 경로")
+    p.add_argument("--clients", type=int, default=max(2, (os.cpu_count() or 2)), help="클라이언트 프로세스 수")
+    p.add_argument("--threads", type=int, default=8, help="클라이언트 프로세스당 동시 연결 수")
+    p.add_argument("--duration", type=float, default=10.0)
+    p.add_argument("--write-ratio", type=float, default=0.0, help="POST /api/todos 비율")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--json", action="store_true", help="결과를 JSON으로 출력")
+    args = p.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    tokens = [r[0] for r in conn.execute("SELECT token FROM tokens ORDER BY RANDOM() LIMIT 500")]
+    conn.close()
+    if not tokens:
+        print("[loadtest] DB에 토큰이 없습니다. seed.py로 먼저 데이터를 만드세요.")
+        return 1
+
+    results = []
+    for n in [int(x) for x in args.workers.split(",")]:
+        res = run(args, n, tokens)
+        results.append(res)
+        if not args.json:
+            base = results[0]["read_rps"]
+            speedup = res["read_rps"] / base if base else 0.0
+            print(
+                f"workers={n:<3} read={res['read_rps']:>9.1f} req/s  write={res['write_rps']:>7.1f} req/s  "
+                f"p50={res['p50_ms']:>6.1f}ms p95={res['p95_ms']:>6.1f}ms  speedup={speedup:>4.2f}x "
+                f"(ideal {n / results[0]['workers']:.1f}x)  errors={res['errors']} locked={res['locked']}"
+            )
+    if args.json:
+        print(json.dumps(results, indent=2))
+    if os.cpu_count() and max(r["workers"] for r in results) > os.cpu_count():
+        print(f"[loadtest] note: only {os.cpu_count()} CPU(s) available; scaling flattens past that.")
+    return 1 if any(r["locked"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,478 @@
+"""Local mirrors of public-data-portal datasets.
+
+The NFA fitness dataset is pulled page by page (bounded parallelism) into
+nfa_baseline_rows, indexed on (age_band, gender, metric), and served from there
+by /api/nfa-baseline and _nfa_reference.
+
+The recovery-course catalog is mirrored the same way into recovery_course_catalog
+with an FTS5 index over title/category/location/note and a (lat, lng) index for
+radius prefiltering, serving /api/recovery-courses. Until the first sync (or without
+COURSES_API_URL) the endpoint searches SAMPLE_COURSES instead, loaded into an
+in-memory copy of the same tables so filters, ranking and distances behave the same.
+
+Usage (from backend/):
+    python mirror.py nfa            # delta refresh
+    python mirror.py courses --full # full resync (drops rows that vanished upstream)
+"""
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple
+import argparse
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from urllib.parse import quote_plus
+
+MIRROR_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mirror_sync_state (
+    name TEXT PRIMARY KEY,
+    total_count INTEGER NOT NULL DEFAULT 0,
+    pages INTEGER NOT NULL DEFAULT 0,
+    last_sync_at TEXT,
+    last_full_sync_at TEXT,
+    last_error TEXT
+);
+CREATE TABLE IF NOT EXISTS nfa_baseline_rows (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_key TEXT UNIQUE NOT NULL,
+    age_band TEXT NOT NULL,
+    gender TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    baseline_score INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    raw_json TEXT NOT NULL,
+    synced_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_nfa_baseline_lookup ON nfa_baseline_rows(age_band, gender, metric);
+CREATE TABLE IF NOT EXISTS recovery_course_catalog (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_key TEXT UNIQUE NOT NULL,
+    title TEXT NOT NULL,
+    category TEXT NOT NULL,
+    location TEXT,
+    note TEXT,
+    lat REAL,
+    lng REAL,
+    raw_json TEXT NOT NULL,
+    synced_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_course_catalog_geo ON recovery_course_catalog(lat, lng);
+CREATE INDEX IF NOT EXISTS idx_course_catalog_category ON recovery_course_catalog(category);
+"""
+
+# external-content FTS5: 본문은 catalog 테이블에만 두고 트리거로 색인을 맞춘다
+COURSE_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS recovery_course_fts USING fts5(
+    title, category, location, note,
+    content='recovery_course_catalog', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS recovery_course_ai AFTER INSERT ON recovery_course_catalog BEGIN
+    INSERT INTO recovery_course_fts(rowid, title, category, location, note) VALUES (new.id, new.title, new.category, new.location, new.note);
+END;
+CREATE TRIGGER IF NOT EXISTS recovery_course_ad AFTER DELETE ON recovery_course_catalog BEGIN
+    INSERT INTO recovery_course_fts(recovery_course_fts, rowid, title, category, location, note) VALUES ('delete', old.id, old.title, old.category, old.location, old.note);
+END;
+CREATE TRIGGER IF NOT EXISTS recovery_course_au AFTER UPDATE OF title, category, location, note ON recovery_course_catalog BEGIN
+    INSERT INTO recovery_course_fts(recovery_course_fts, rowid, title, category, location, note) VALUES ('delete', old.id, old.title, old.category, old.location, old.note);
+    INSERT INTO recovery_course_fts(rowid, title, category, location, note) VALUES (new.id, new.title, new.category, new.location, new.note);
+END;
+"""
+
+Fetch = Callable[[str, dict, dict], Optional[Any]]
+WriteDB = Callable[[], ContextManager[sqlite3.Connection]]
+
+
+def extract_items(data: Any) -> List[dict]:
+    # 공공데이터 포털 응답 형태: response.body.items.item / body.items.item / 리스트
+    items: Any = None
+    if isinstance(data, dict) and "response" in data:
+        items = data.get("response", {}).get("body", {}).get("items", {}).get("item", [])
+    elif isinstance(data, dict) and "body" in data:
+        items = data.get("body", {}).get("items", {}).get("item", [])
+    elif isinstance(data, list):
+        items = data
+    if isinstance(items, dict):
+        items = [items]
+    return [it for it in items or [] if isinstance(it, dict)]
+
+
+def extract_total_count(data: Any) -> Optional[int]:
+    body = None
+    if isinstance(data, dict) and "response" in data:
+        body = data.get("response", {}).get("body", {})
+    elif isinstance(data, dict) and "body" in data:
+        body = data.get("body", {})
+    try:
+        return int(body.get("totalCount")) if body else None
+    except (TypeError, ValueError):
+        return None
+
+
+def fetch_page(fetch: Fetch, url: str, key: str, page: int, rows: int) -> Optional[Any]:
+    """One page with the same fallbacks the live proxy used (raw key, encoded key, inline query)."""
+    params = {"serviceKey": key, "pageNo": page, "numOfRows": rows, "resultType": "json"}
+    data = fetch(url, params, {})
+    if data is None:
+        data = fetch(url, {**params, "serviceKey": quote_plus(key)}, {})
+    if data is None:
+        data = fetch(f"{url}?serviceKey={key}&pageNo={page}&numOfRows={rows}&resultType=json", {}, {})
+    return data
+
+
+def _num(v, default: int = 0) -> int:
+    try:
+        return int(float(v))
+    except Exception:
+        return default
+
+
+def nfa_row(it: dict) -> Tuple[str, str, str, int, str]:
+    return (
+        str(it.get("age_class") or it.get("age_degree") or it.get("age") or ""),
+        str(it.get("test_sex") or it.get("sex") or it.get("gender") or ""),
+        str(it.get("item") or "recovery"),
+        _num(it.get("score") or it.get("item_f003") or it.get("item_f002") or it.get("item_f001") or 60, default=60),
+        str(it.get("cert_gbn") or it.get("source") or "NFA"),
+    )
+
+
+def _item_key(it: dict) -> str:
+    return hashlib.sha1(json.dumps(it, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _store_nfa_items(conn: sqlite3.Connection, items: List[dict], synced_at: str) -> int:
+    rows = []
+    for it in items:
+        age_band, gender, metric, score, source = nfa_row(it)
+        rows.append((_item_key(it), age_band, gender, metric, score, source, json.dumps(it, ensure_ascii=False), synced_at))
+    conn.executemany(
+        """
+        INSERT INTO nfa_baseline_rows (item_key, age_band, gender, metric, baseline_score, source, raw_json, synced_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(item_key) DO UPDATE SET
+            baseline_score = excluded.baseline_score, source = excluded.source, synced_at = excluded.synced_at
+        """,
+        rows,
+    )
+    return len(rows)
+
+
+def course_row(it: dict) -> Tuple[str, str, str, Optional[str], Optional[float], Optional[float]]:
+    title = it.get("course_nm") or it.get("item_nm") or "강좌"
+    category = it.get("item_nm") or it.get("item_cd") or ""
+    location = it.get("lectr_nm") or it.get("course_seta_desc_cn") or ""
+    note_parts = [it.get("lectr_weekday_val") or "", it.get("start_tm") or "", it.get("course_seta_desc_cn") or ""]
+    note = " ".join([p for p in note_parts if p]).strip() or None
+    lat_val = it.get("faci_lat") or it.get("lat")
+    lng_val = it.get("faci_lot") or it.get("lng") or it.get("faci_lon")
+    try:
+        lat = float(lat_val) if lat_val not in (None, "") else None
+        lng = float(lng_val) if lng_val not in (None, "") else None
+    except Exception:
+        lat = lng = None
+    return title, category, location, note, lat, lng
+
+
+def _store_course_items(conn: sqlite3.Connection, items: List[dict], synced_at: str) -> int:
+    rows = []
+    for it in items:
+        rows.append((_item_key(it), *course_row(it), json.dumps(it, ensure_ascii=False), synced_at))
+    conn.executemany(
+        """
+        INSERT INTO recovery_course_catalog (item_key, title, category, location, note, lat, lng, raw_json, synced_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(item_key) DO UPDATE SET synced_at = excluded.synced_at
+        """,
+        rows,
+    )
+    return len(rows)
+
+
+# 첫 동기화 전 /api/recovery-courses가 보여 주는 예시 강좌 (업스트림 항목 형식)
+SAMPLE_COURSES: List[dict] = [
+    {"course_nm": "요가 · 스포츠강좌이용권 적용", "item_nm": "요가", "lectr_nm": "시청 주민센터", "lectr_weekday_val": "저녁반", "faci_lat": 37.5, "faci_lot": 127.0},
+    {"course_nm": "재활 필라테스", "item_nm": "필라테스", "lectr_nm": "스포츠 복지관", "lectr_weekday_val": "대기중", "faci_lat": 37.51, "faci_lot": 127.01},
+]
+
+_sample_lock = threading.Lock()
+_sample_conn: Optional[sqlite3.Connection] = None
+
+
+def search_sample_courses(
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+    radius_km: Optional[float] = None,
+    limit: int = 20,
+) -> List[dict]:
+    """search_courses over SAMPLE_COURSES, for when the catalog has not been synced yet."""
+    global _sample_conn
+    with _sample_lock:
+        if _sample_conn is None:
+            conn = sqlite3.connect(":memory:", check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.executescript(MIRROR_SCHEMA)
+            try:
+                conn.executescript(COURSE_FTS_SCHEMA)
+            except sqlite3.OperationalError:
+                pass  # FTS5 없는 빌드: search_courses가 LIKE로 대체
+            _store_course_items(conn, SAMPLE_COURSES, datetime.utcnow().isoformat())
+            conn.commit()
+            _sample_conn = conn
+        return search_courses(_sample_conn, q, category, lat, lng, radius_km, limit)
+
+
+DATASETS: Dict[str, Tuple[str, Callable[[sqlite3.Connection, List[dict], str], int]]] = {
+    "nfa": ("nfa_baseline_rows", _store_nfa_items),
+    "courses": ("recovery_course_catalog", _store_course_items),
+}
+
+
+def sync_dataset(
+    name: str,
+    fetch: Fetch,
+    write_db: WriteDB,
+    read_db: Callable[[], sqlite3.Connection],
+    upstream: Tuple[str, str],
+    full: Optional[bool] = None,
+    rows_per_page: int = 500,
+    max_workers: int = 4,
+    full_every_days: int = 7,
+) -> Dict[str, Any]:
+    """Pulls a paged upstream dataset into its mirror table.
+
+    Delta mode refetches from the last known page onward (the datasets are append-only
+    in practice); full mode refetches everything and removes rows no longer upstream.
+    Full mode is chosen automatically on first sync and every full_every_days.
+    """
+    table, store = DATASETS[name]
+    url, key = upstream
+    started = datetime.utcnow().isoformat()
+    conn = read_db()
+    try:
+        state = conn.execute("SELECT * FROM mirror_sync_state WHERE name = ?", (name,)).fetchone()
+    finally:
+        conn.close()
+    if full is None:
+        full = (
+            not state
+            or not state["last_full_sync_at"]
+            or datetime.fromisoformat(state["last_full_sync_at"]) < datetime.utcnow() - timedelta(days=full_every_days)
+        )
+
+    first = fetch_page(fetch, url, key, 1, rows_per_page)
+    if first is None:
+        with write_db() as w:
+            w.execute(
+                "INSERT INTO mirror_sync_state (name, last_error) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET last_error = excluded.last_error",
+                (name, f"{started} page 1 fetch failed"),
+            )
+        return {"ok": False, "full": full, "pages": 0, "rows": 0}
+    total = extract_total_count(first)
+    pages = max(1, math.ceil(total / rows_per_page)) if total else 1
+    start_page = 1 if full or not state else max(1, state["pages"])
+    if not full and state and total == state["total_count"]:
+        # 변경 없음: 첫 페이지만 확인하고 종료
+        start_page = pages + 1
+
+    stored = 0
+    failed: List[int] = []
+    with write_db() as w:
+        stored += store(w, extract_items(first), started)
+    todo = [p for p in range(max(2, start_page), pages + 1)]
+    if todo:
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            futs = {ex.submit(fetch_page, fetch, url, key, p, rows_per_page): p for p in todo}
+            for fut in as_completed(futs):
+                data = fut.result()
+                if data is None:
+                    failed.append(futs[fut])
+                    continue
+                with write_db() as w:
+                    stored += store(w, extract_items(data), started)
+
+    with write_db() as w:
+        if full and not failed:
+            w.execute(f"DELETE FROM {table} WHERE synced_at < ?", (started,))
+        w.execute(
+            """
+            INSERT INTO mirror_sync_state (name, total_count, pages, last_sync_at, last_full_sync_at, last_error)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                total_count = excluded.total_count,
+                pages = excluded.pages,
+                last_sync_at = excluded.last_sync_at,
+                last_full_sync_at = COALESCE(excluded.last_full_sync_at, mirror_sync_state.last_full_sync_at),
+                last_error = excluded.last_error
+            """,
+            (
+                name,
+                total or stored,
+                pages,
+                started,
+                started if full and not failed else None,
+                f"pages failed: {sorted(failed)}" if failed else None,
+            ),
+        )
+    return {"ok": not failed, "full": full, "pages": pages, "fetched_pages": 1 + len(todo) - len(failed), "rows": stored, "failed_pages": sorted(failed)}
+
+
+def _nfa_where(age: Optional[int], gender: Optional[str], metric: Optional[str]) -> Tuple[str, list]:
+    clauses = []
+    params: list = []
+    if age is not None:
+        clauses.append("age_band = ?")
+        params.append(str(age))
+    if gender:
+        clauses.append("gender = ?")
+        params.append(gender)
+    if metric:
+        clauses.append("metric = ?")
+        params.append(metric)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def query_nfa(conn: sqlite3.Connection, age: Optional[int], gender: Optional[str], metric: Optional[str], page: int, rows: int) -> List[sqlite3.Row]:
+    where, params = _nfa_where(age, gender, metric)
+    return conn.execute(
+        f"SELECT age_band, gender, metric, baseline_score, source, raw_json FROM nfa_baseline_rows{where} ORDER BY id LIMIT ? OFFSET ?",
+        (*params, rows, max(0, page - 1) * rows),
+    ).fetchall()
+
+
+def nfa_reference(conn: sqlite3.Connection, age: Optional[int], gender: Optional[str], metric: Optional[str]) -> Optional[Tuple[int, str]]:
+    where, params = _nfa_where(age, gender, metric)
+    row = conn.execute(
+        f"SELECT baseline_score, source FROM nfa_baseline_rows{where} ORDER BY id LIMIT 1",
+        params,
+    ).fetchone()
+    if not row:
+        return None
+    return (row["baseline_score"] or 60), row["source"]
+
+
+def _fts_query(q: str) -> Optional[str]:
+    # 사용자 입력을 FTS5 문법으로 해석하지 않도록 토큰마다 따옴표로 감싸고 접두 검색
+    tokens = re.findall(r"\w+", q)
+    return " ".join(f'"{t}"*' for t in tokens) if tokens else None
+
+
+def _has_fts(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'recovery_course_fts'").fetchone() is not None
+
+
+def search_courses(
+    conn: sqlite3.Connection,
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+    radius_km: Optional[float] = None,
+    limit: int = 20,
+) -> List[dict]:
+    """Ranked catalog search: text relevance (bm25) first, then distance when lat/lng are given.
+
+    With radius_km, candidates come from the (lat, lng) bounding box and are read until
+    `limit` of them fall inside the circle, so ranking never pushes in-radius rows out.
+    """
+    select = "SELECT c.id, c.title, c.category, c.location, c.note, c.lat, c.lng"
+    frm = " FROM recovery_course_catalog c"
+    where: List[str] = []
+    params: list = []
+    order = "c.id"
+    order_params: list = []
+    match = _fts_query(q) if q else None
+    if match and _has_fts(conn):
+        select += ", bm25(recovery_course_fts, 10.0, 5.0, 3.0, 1.0) AS rank"
+        frm = " FROM recovery_course_fts JOIN recovery_course_catalog c ON c.id = recovery_course_fts.rowid"
+        where.append("recovery_course_fts MATCH ?")
+        params.append(match)
+        order = "rank"
+    elif match:
+        # FTS5가 없는 SQLite 빌드: LIKE로 대체
+        for t in re.findall(r"\w+", q or ""):
+            where.append("(c.title LIKE ? OR c.category LIKE ? OR c.location LIKE ? OR c.note LIKE ?)")
+            params.extend([f"%{t}%"] * 4)
+    if category:
+        where.append("c.category = ?")
+        params.append(category)
+    geo = lat is not None and lng is not None
+    if geo and radius_km:
+        # 위경도 박스로 먼저 좁히고 (idx_course_catalog_geo), 정확한 거리는 아래에서 계산
+        dlat = radius_km / 111.32
+        dlng = radius_km / (111.32 * max(0.01, math.cos(math.radians(lat))))
+        where.append("c.lat BETWEEN ? AND ? AND c.lng BETWEEN ? AND ?")
+        params.extend([lat - dlat, lat + dlat, lng - dlng, lng + dlng])
+    if geo:
+        # 평면 근사 거리 제곱으로 정렬 (좌표 없는 강좌는 뒤로); 검색어가 있으면 관련도 다음 순서
+        distance = "c.lat IS NULL, (c.lat - ?) * (c.lat - ?) + (c.lng - ?) * (c.lng - ?) * ?"
+        order = distance if order == "c.id" else f"{order}, {distance}"
+        kx = math.cos(math.radians(lat))
+        order_params = [lat, lat, lng, lng, kx * kx]
+    sql = select + frm + (" WHERE " + " AND ".join(where) if where else "") + f" ORDER BY {order}"
+    params.extend(order_params)
+    if not (geo and radius_km):
+        sql += " LIMIT ?"
+        params.append(limit)
+    # 반경 검색은 LIMIT 없이 박스 안 후보를 차례로 읽다가 원 안의 결과가 limit개 모이면 멈춘다
+
+    out: List[dict] = []
+    for r in conn.execute(sql, params):
+        distance = None
+        if geo and r["lat"] is not None and r["lng"] is not None:
+            distance = round(haversine_km(lat, lng, r["lat"], r["lng"]), 2)
+            if radius_km and distance > radius_km:
+                continue
+        out.append({
+            "title": r["title"],
+            "category": r["category"],
+            "location": r["location"],
+            "eligible": True,
+            "note": r["note"],
+            "url": None,
+            "lat": r["lat"],
+            "lng": r["lng"],
+            "distance_km": distance,
+        })
+        if len(out) >= limit:
+            break
+    return out
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+    return 6371 * 2 * math.asin(math.sqrt(a))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="공공데이터 로컬 미러 동기화")
+    p.add_argument("dataset", choices=sorted(DATASETS))
+    p.add_argument("--full", action="store_true", help="전체 재동기화")
+    p.add_argument("--rows", type=int, default=500, help="페이지당 행 수")
+    p.add_argument("--workers", type=int, default=4, help="동시 페이지 요청 수")
+    args = p.parse_args(argv)
+
+    import app
+
+    env_name = args.dataset.upper()
+    upstream = app._upstream(env_name)
+    if not upstream:
+        print(f"[mirror] {env_name}_API_URL / {env_name}_API_KEY가 설정되지 않았습니다.")
+        return 1
+    t0 = time.perf_counter()
+    res = sync_dataset(args.dataset, app._fetch_upstream, app._write_db, app._get_db, upstream, full=True if args.full else None, rows_per_page=args.rows, max_workers=args.workers)
+    print(f"[mirror] {args.dataset} {res} ({time.perf_counter() - t0:.1f}s)")
+    return 0 if res["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""Population fatigue-score percentiles.
+
+Fatigue scores are integers in [0, 100], so each sketch is an exact 101-bin count
+histogram: merging two sketches is element-wise addition, and a percentile rank is
+an O(1) lookup in the cumulative counts.
+
+A batch job scans user_predictions (and, on --rebuild, the retention archive) in
+id-range chunks on a process pool, buckets scores by (cohort, day) into
+fatigue_sketches, then merges the most recent window into one CDF per cohort in
+fatigue_percentiles. Runs are incremental past a watermark on user_predictions.id.
+
+Usage (from backend/):
+    python percentiles.py               # incremental
+    python percentiles.py --rebuild     # recompute from all stored predictions
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+import argparse
+import json
+import multiprocessing
+import sqlite3
+import sys
+import os
+import threading
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta
+
+import retention
+
+BINS = 101
+ALL = "all"
+MIN_SAMPLES = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fatigue_sketches (
+    cohort TEXT NOT NULL,
+    day TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    counts BLOB NOT NULL,
+    PRIMARY KEY (cohort, day)
+);
+CREATE TABLE IF NOT EXISTS fatigue_percentiles (
+    cohort TEXT PRIMARY KEY,
+    window_start TEXT NOT NULL,
+    window_end TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    median INTEGER NOT NULL,
+    cumulative BLOB NOT NULL,
+    built_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fatigue_sketch_state (
+    name TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL
+);
+"""
+
+Sketches = Dict[Tuple[str, str], array]
+
+
+def cohort_of(payload: dict) -> str:
+    # 사용자 인구통계가 없으므로 만성 부하(최근 28일 누적 부하) 구간으로 코호트를 나눈다
+    load = float(payload.get("last28_load") or 0)
+    if load < 500:
+        return "low_load"
+    if load < 2000:
+        return "mid_load"
+    return "high_load"
+
+
+def _empty() -> array:
+    return array("Q", bytes(8 * BINS))
+
+
+def merge_into(dst: Sketches, src: Sketches):
+    for k, counts in src.items():
+        cur = dst.get(k)
+        if cur is None:
+            dst[k] = array("Q", counts)
+        else:
+            for i in range(BINS):
+                cur[i] += counts[i]
+
+
+def _add(sketches: Sketches, payload_json: str, result_json: str, created_at: str):
+    result = json.loads(result_json)
+    if "fatigue_score" not in result:
+        return  # roi_report 행
+    score = max(0, min(100, int(result["fatigue_score"])))
+    cohort = cohort_of(json.loads(payload_json))
+    day = created_at[:10]
+    for c in (cohort, ALL):
+        counts = sketches.get((c, day))
+        if counts is None:
+            counts = sketches[(c, day)] = _empty()
+        counts[score] += 1
+
+
+def _scan_chunk(args: Tuple[str, str, int, int]) -> Dict[Tuple[str, str], bytes]:
+    db_path, source, lo, hi = args
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    sketches: Sketches = {}
+    try:
+        if source == "hot":
+            rows = conn.execute(
+                "SELECT payload_json, result_json, created_at FROM user_predictions WHERE id > ? AND id <= ?",
+                (lo, hi),
+            )
+            for payload_json, result_json, created_at in rows:
+                _add(sketches, payload_json, result_json, created_at)
+        else:
+            for (blob,) in conn.execute("SELECT blob FROM user_prediction_archive WHERE rowid > ? AND rowid <= ?", (lo, hi)):
+                for _id, created_at, payload_json, result_json in retention._unpack(blob):
+                    _add(sketches, payload_json, result_json, created_at)
+    finally:
+        conn.close()
+    # 프로세스 경계를 넘길 때는 bytes로
+    return {k: v.tobytes() for k, v in sketches.items()}
+
+
+def _chunks(lo: int, hi: int, size: int) -> Iterable[Tuple[int, int]]:
+    while lo < hi:
+        yield lo, min(hi, lo + size)
+        lo += size
+
+
+def build(
+    conn: sqlite3.Connection,
+    db_path: str,
+    write_lock=None,
+    workers: int = 2,
+    chunk_rows: int = 50_000,
+    rebuild: bool = False,
+    window_days: int = 90,
+) -> Dict[str, int]:
+    state = conn.execute("SELECT last_id FROM fatigue_sketch_state WHERE name = 'predictions'").fetchone()
+    last_id = 0 if rebuild or not state else state["last_id"]
+    max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM user_predictions").fetchone()[0]
+    tasks = [(db_path, "hot", lo, hi) for lo, hi in _chunks(last_id, max_id, chunk_rows)]
+    if rebuild:
+        max_archive = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM user_prediction_archive").fetchone()[0]
+        tasks += [(db_path, "archive", lo, hi) for lo, hi in _chunks(0, max_archive, max(1, chunk_rows // 200))]
+
+    merged: Sketches = {}
+    if len(tasks) > 1 and workers > 1:
+        # 서버 스레드에서 호출돼도 안전하도록 fork 대신 spawn
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as ex:
+            for part in ex.map(_scan_chunk, tasks):
+                merge_into(merged, {k: array("Q", v) for k, v in part.items()})
+    else:
+        for t in tasks:
+            merge_into(merged, {k: array("Q", v) for k, v in _scan_chunk(t).items()})
+
+    with (write_lock() if write_lock else nullcontext()), conn:
+        if rebuild:
+            conn.execute("DELETE FROM fatigue_sketches")
+        for (cohort, day), counts in merged.items():
+            row = conn.execute("SELECT counts FROM fatigue_sketches WHERE cohort = ? AND day = ?", (cohort, day)).fetchone()
+            if row:
+                prev = array("Q")
+                prev.frombytes(row["counts"])
+                for i in range(BINS):
+                    counts[i] += prev[i]
+            conn.execute(
+                "INSERT OR REPLACE INTO fatigue_sketches (cohort, day, total, counts) VALUES (?, ?, ?, ?)",
+                (cohort, day, sum(counts), counts.tobytes()),
+            )
+        conn.execute(
+            "INSERT OR REPLACE INTO fatigue_sketch_state (name, last_id) VALUES ('predictions', ?)",
+            (max_id,),
+        )
+        cohorts = _rollup(conn, window_days)
+    return {"chunks": len(tasks), "rows_from_id": last_id, "rows_to_id": max_id, "sketches": len(merged), "cohorts": cohorts}
+
+
+def _rollup(conn: sqlite3.Connection, window_days: int) -> int:
+    """Merges the newest window_days of day sketches into one cumulative table per cohort."""
+    newest = conn.execute("SELECT MAX(day) FROM fatigue_sketches").fetchone()[0]
+    if not newest:
+        return 0
+    start = (date.fromisoformat(newest) - timedelta(days=window_days - 1)).isoformat()
+    merged: Sketches = {}
+    for r in conn.execute("SELECT cohort, counts FROM fatigue_sketches WHERE day >= ?", (start,)):
+        counts = array("Q")
+        counts.frombytes(r["counts"])
+        merge_into(merged, {(r["cohort"], start): counts})
+    now = datetime.utcnow().isoformat()
+    conn.execute("DELETE FROM fatigue_percentiles")
+    for (cohort, _), counts in merged.items():
+        total = sum(counts)
+        cumulative = array("Q", bytes(8 * (BINS + 1)))
+        for i in range(BINS):
+            cumulative[i + 1] = cumulative[i] + counts[i]
+        median = next(i for i in range(BINS) if cumulative[i + 1] * 2 >= total)
+        conn.execute(
+            "INSERT INTO fatigue_percentiles (cohort, window_start, window_end, total, median, cumulative, built_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (cohort, start, newest, total, median, cumulative.tobytes(), now),
+        )
+    return len(merged)
+
+
+class PercentileIndex:
+    """In-process copy of fatigue_percentiles; percentile_rank is O(1) per call."""
+
+    def __init__(self, connect, refresh_sec: float = 60.0):
+        self._connect = connect
+        self._refresh_sec = refresh_sec
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._tables: Dict[str, Tuple[int, int, array]] = {}
+
+    def _maybe_reload(self):
+        if time.monotonic() - self._loaded_at < self._refresh_sec:
+            return
+        with self._lock:
+            if time.monotonic() - self._loaded_at < self._refresh_sec:
+                return
+            tables: Dict[str, Tuple[int, int, array]] = {}
+            conn = self._connect()
+            try:
+                for r in conn.execute("SELECT cohort, total, median, cumulative FROM fatigue_percentiles"):
+                    cumulative = array("Q")
+                    cumulative.frombytes(r["cumulative"])
+                    tables[r["cohort"]] = (r["total"], r["median"], cumulative)
+            except sqlite3.OperationalError:
+                pass
+            finally:
+                conn.close()
+            self._tables = tables
+            self._loaded_at = time.monotonic()
+
+    def rank(self, score: int, cohort: str = ALL) -> Optional[Tuple[float, int, int]]:
+        """(percentile rank 0-100, cohort median, sample size), or None below MIN_SAMPLES."""
+        self._maybe_reload()
+        table = self._tables.get(cohort)
+        if not table or table[0] < MIN_SAMPLES:
+            table = self._tables.get(ALL)
+        if not table or table[0] < MIN_SAMPLES:
+            return None
+        total, median, cumulative = table
+        s = max(0, min(100, int(score)))
+        # mid-rank: 아래 점수 전부 + 같은 점수의 절반
+        below = cumulative[s]
+        same = cumulative[s + 1] - below
+        return round((below + same / 2) * 100.0 / total, 1), median, total
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="피로도 점수 모집단 분포(퍼센타일) 배치 계산")
+    p.add_argument("--rebuild", action="store_true", help="아카이브 포함 전체 재계산")
+    p.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    p.add_argument("--chunk-rows", type=int, default=50_000)
+    p.add_argument("--window-days", type=int, default=90)
+    args = p.parse_args(argv)
+
+    import app
+
+    conn = app._get_db()
+    try:
+        t0 = time.perf_counter()
+        res = build(conn, str(app.DB_PATH), app._write_lock, args.workers, args.chunk_rows, args.rebuild, args.window_days)
+        print(f"[percentiles] {res} ({time.perf_counter() - t0:.1f}s)")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+"""Replays captured traffic (HYUGA_CAPTURE, see traffic.py) against an in-process app.
+
+`run` copies a snapshot database, maps each captured user pseudonym onto an existing
+user of the snapshot (with a freshly issued token), then drives the app's ASGI
+callable directly, preserving the captured inter-arrival gaps divided by --speed
+(0 = back to back, bounded by --concurrency). Upstream APIs are disabled unless
+--online is given, so runs are comparable. It prints and optionally saves latency
+percentiles per route.
+
+`compare` diffs two saved runs and exits 1 when any route's p50 or p95 regressed by
+more than --threshold.
+
+Usage (from backend/):
+    HYUGA_CAPTURE=/tmp/traffic.jsonl python app.py          # capture
+    python replay.py run --log /tmp/traffic.jsonl --db hyuga.db --speed 10 --out base.json
+    python replay.py run --log /tmp/traffic.jsonl --db hyuga.db --speed 10 --out new.json
+    python replay.py compare base.json new.json --threshold 0.15
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import re
+import secrets
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlencode
+
+REPLAY_PASSWORD = "replay-pw-1234"
+_STR_PLACEHOLDER = re.compile(r"^<str:(\d+)>$")
+
+
+def load_log(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records.sort(key=lambda r: r["t"])
+    return records
+
+
+class _Session:
+    """Replay state for one captured user pseudonym."""
+
+    def __init__(self, user_id: int, email: str, token: str, todo_ids: List[int]):
+        self.user_id = user_id
+        self.email = email
+        self.token = token
+        self.todo_ids = todo_ids
+
+
+def _materialize(value: Any, session: Optional[_Session], key: Optional[str] = None) -> Any:
+    if isinstance(value, dict):
+        return {k: _materialize(v, session, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_materialize(v, session, key) for v in value]
+    if value == "<email>":
+        if key == "email" and session is None:
+            return f"replay-{secrets.token_hex(6)}@replay.example.com"
+        return session.email if session else "replay@replay.example.com"
+    if value == "<password>":
+        return REPLAY_PASSWORD
+    if value == "<token>":
+        return session.token if session else ""
+    if isinstance(value, str):
+        m = _STR_PLACEHOLDER.match(value)
+        if m:
+            return "x" * max(1, int(m.group(1)))
+    return value
+
+
+async def call_asgi(app, method: str, path: str, query: str = "", headers: Optional[Dict[str, str]] = None, body: bytes = b"") -> Tuple[int, bytes]:
+    """Minimal in-process ASGI client (no sockets)."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in (headers or {}).items()],
+        "client": ("127.0.0.1", 0),
+        "server": ("replay", 80),
+    }
+    sent = False
+    status_code = 0
+    chunks: List[bytes] = []
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.Event().wait()  # 연결은 끊기지 않는다
+
+    async def send(msg):
+        nonlocal status_code
+        if msg["type"] == "http.response.start":
+            status_code = msg["status"]
+        elif msg["type"] == "http.response.body":
+            chunks.append(msg.get("body", b""))
+
+    await app(scope, receive, send)
+    return status_code, b"".join(chunks)
+
+
+def _prepare_db(snapshot: str, workdir: str) -> Path:
+    target = Path(workdir) / "replay.db"
+    src = sqlite3.connect(f"file:{snapshot}?mode=ro", uri=True)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)  # WAL에 남은 변경까지 일관된 사본
+    finally:
+        src.close()
+        dst.close()
+    return target
+
+
+def _sessions(app, pseudonyms: List[str]) -> Dict[str, _Session]:
+    """Maps pseudonyms onto snapshot users (oldest first), creating users if there are too few."""
+    out: Dict[str, _Session] = {}
+    pw_hash = app._hash_password(REPLAY_PASSWORD)
+    now = datetime.utcnow().isoformat()
+    with app._write_db() as conn:
+        users = [r["id"] for r in conn.execute("SELECT id FROM users WHERE deleted_at IS NULL ORDER BY id LIMIT ?", (len(pseudonyms),))]
+        while len(users) < len(pseudonyms):
+            cur = conn.execute(
+                "INSERT INTO users (email, password_hash, name, created_at) VALUES (?, ?, ?, ?)",
+                (f"replay-{secrets.token_hex(6)}@replay.example.com", pw_hash, "replay", now),
+            )
+            users.append(cur.lastrowid)
+        for pseudo, uid in zip(pseudonyms, users):
+            # 로그인 재현을 위해 대응된 사용자의 이메일/비밀번호를 재생용 값으로 바꾼다 (복사본 DB)
+            email = f"replay-{uid}@replay.example.com"
+            conn.execute("UPDATE users SET email = ?, password_hash = ? WHERE id = ?", (email, pw_hash, uid))
+            token = app._issue_token(conn, uid)
+            todo_ids = [r["id"] for r in conn.execute("SELECT id FROM user_todos WHERE user_id = ? ORDER BY id", (uid,))]
+            out[pseudo] = _Session(uid, email, token, todo_ids)
+    return out
+
+
+async def _replay(app, records: List[Dict[str, Any]], sessions: Dict[str, _Session], speed: float, concurrency: int):
+    results: List[Tuple[str, int, float]] = []
+    sem = asyncio.Semaphore(concurrency)
+    login_owner: Optional[_Session] = next(iter(sessions.values()), None)
+    deletion_ids: List[str] = []  # 조회는 토큰 없이 id로만 하므로 세션과 무관하게 모은다
+
+    async def one(rec: Dict[str, Any]):
+        session = sessions.get(rec.get("u", ""))
+        path = rec["p"]
+        if "{id}" in path:
+            ids = session.todo_ids if session else []
+            path = path.replace("{id}", str(ids[-1] if ids else 0))
+        if "{key}" in path:
+            path = path.replace("{key}", deletion_ids[-1] if deletion_ids else "missing")
+        headers = {"content-type": "application/json"}
+        if session:
+            headers["authorization"] = f"Bearer {session.token}"
+        query = urlencode(_materialize(rec["q"], session)) if rec.get("q") else ""
+        body = b""
+        if "b" in rec:
+            if rec["p"] == "/api/auth/login":
+                body_obj = _materialize(rec["b"], login_owner)
+            else:
+                body_obj = _materialize(rec["b"], session)
+            body = json.dumps(body_obj, ensure_ascii=False).encode("utf-8")
+        elif "bl" in rec:
+            body = b"x" * rec["bl"]
+
+        async with sem:
+            t0 = time.perf_counter()
+            status_code, resp = await call_asgi(app, rec["m"], path, query, headers, body)
+            elapsed = (time.perf_counter() - t0) * 1000
+        results.append((f"{rec['m']} {rec['p']}", status_code, elapsed))
+        # 이후 요청의 {id}/{key}가 재생 중 만들어진 자원을 가리키도록 갱신
+        if session and 200 <= status_code < 300:
+            if rec["m"] == "POST" and rec["p"] == "/api/todos":
+                session.todo_ids.append(json.loads(resp)["id"])
+            elif rec["m"] == "DELETE" and rec["p"] == "/api/todos/{id}" and session.todo_ids:
+                session.todo_ids.pop()
+            elif rec["m"] == "DELETE" and rec["p"] == "/api/auth/me":
+                deletion_ids.append(json.loads(resp)["deletion_id"])
+
+    start = time.perf_counter()
+    t_first = records[0]["t"]
+    tasks = []
+    for rec in records:
+        if speed > 0:
+            delay = (rec["t"] - t_first) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(one(rec)))
+    await asyncio.gather(*tasks)
+    return results, time.perf_counter() - start
+
+
+def summarize(results: List[Tuple[str, int, float]], wall_sec: float) -> Dict[str, Any]:
+    by_route: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Counter] = defaultdict(Counter)
+    for route, status_code, ms in results:
+        by_route[route].append(ms)
+        statuses[route][str(status_code)] += 1
+    routes = {}
+    for route, lat in sorted(by_route.items()):
+        lat.sort()
+        q = statistics.quantiles(lat, n=100, method="inclusive") if len(lat) > 1 else [lat[0]] * 99
+        routes[route] = {
+            "count": len(lat),
+            "p50": round(q[49], 2),
+            "p95": round(q[94], 2),
+            "p99": round(q[98], 2),
+            "max": round(lat[-1], 2),
+            "status": dict(statuses[route]),
+        }
+    return {"requests": len(results), "wall_sec": round(wall_sec, 2), "routes": routes}
+
+
+def _print_summary(summary: Dict[str, Any]):
+    print(f"[replay] {summary['requests']:,} requests in {summary['wall_sec']:.1f}s")
+    print(f"  {'route':<36} {'count':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  status")
+    for route, r in summary["routes"].items():
+        print(f"  {route:<36} {r['count']:>7,} {r['p50']:>8.1f} {r['p95']:>8.1f} {r['p99']:>8.1f} {r['max']:>8.1f}  {r['status']}")
+
+
+def cmd_run(args) -> int:
+    records = load_log(args.log)
+    if args.limit:
+        records = records[: args.limit]
+    if not records:
+        print("[replay] empty log")
+        return 1
+    workdir = tempfile.mkdtemp(prefix="hyuga-replay-")
+    db_path = _prepare_db(args.db, workdir)
+    # app은 import 시점에 DB 경로/환경을 읽으므로 그 전에 설정
+    os.environ["HYUGA_DB_PATH"] = str(db_path)
+    os.environ["HYUGA_CACHE"] = "0"
+    os.environ.pop("HYUGA_CAPTURE", None)
+    if not args.online:
+        for kind in ("NFA", "SPOT", "COURSES"):
+            os.environ[f"{kind}_API_URL"] = ""
+    sys.path.insert(0, str(Path(__file__).parent))
+    import app
+
+    app._ensure_db()
+    pseudonyms = sorted({r["u"] for r in records if r.get("u")})
+    sessions = _sessions(app, pseudonyms)
+    print(f"[replay] {len(records):,} requests, {len(sessions):,} users, speed {'max' if args.speed <= 0 else f'{args.speed:g}x'} on {db_path}")
+    results, wall = asyncio.run(_replay(app.app, records, sessions, args.speed, args.concurrency))
+    summary = summarize(results, wall)
+    summary.update(log=args.log, db=args.db, speed=args.speed)
+    _print_summary(summary)
+    if args.out:
+        Path(args.out).write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+def cmd_compare(args) -> int:
+    base = json.loads(Path(args.base).read_text(encoding="utf-8"))
+    new = json.loads(Path(args.new).read_text(encoding="utf-8"))
+    regressions = 0
+    print(f"  {'route':<36} {'p50 base':>9} {'new':>8} {'Δ':>7} {'p95 base':>9} {'new':>8} {'Δ':>7}")
+    for route in sorted(set(base["routes"]) | set(new["routes"])):
+        b, n = base["routes"].get(route), new["routes"].get(route)
+        if not b or not n:
+            print(f"  {route:<36} {'only in ' + ('new' if n else 'base'):>20}")
+            continue
+        flags = []
+        cells = []
+        for q in ("p50", "p95"):
+            delta = (n[q] - b[q]) / b[q] if b[q] else 0.0
+            # 아주 작은 절대값 차이와 표본이 적은 경로는 잡음으로 본다
+            if delta > args.threshold and n[q] - b[q] > args.min_ms and min(b["count"], n["count"]) >= args.min_count:
+                flags.append(q)
+            cells.append(f"{b[q]:>9.1f} {n[q]:>8.1f} {delta:>+7.0%}")
+        regressions += bool(flags)
+        print(f"  {route:<36} {' '.join(cells)}{'  REGRESSION ' + ','.join(flags) if flags else ''}")
+    print(f"[replay] {regressions} route(s) regressed by more than {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="캡처한 트래픽 재생 및 비교")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="스냅샷 DB 사본에 대해 재생")
+    r.add_argument("--log", required=True, help="HYUGA_CAPTURE로 기록한 파일")
+    r.add_argument("--db", required=True, help="스냅샷 DB (읽기 전용으로 복사해서 사용)")
+    r.add_argument("--speed", type=float, default=1.0, help="재생 배속 (0 = 간격 무시)")
+    r.add_argument("--concurrency", type=int, default=64)
+    r.add_argument("--limit", type=int, default=0)
+    r.add_argument("--online", action="store_true", help="업스트림 공공데이터 API 호출 허용")
+    r.add_argument("--out", help="결과 JSON 저장 경로")
+    c = sub.add_parser("compare", help="두 재생 결과 비교")
+    c.add_argument("base")
+    c.add_argument("new")
+    c.add_argument("--threshold", type=float, default=0.10, help="회귀로 볼 증가율")
+    c.add_argument("--min-ms", type=float, default=1.0, help="이보다 작은 절대 증가는 무시")
+    c.add_argument("--min-count", type=int, default=20, help="양쪽 요청 수가 이보다 적은 경로는 판정하지 않음")
+    args = p.parse_args(argv)
+    return cmd_run(args) if args.cmd == "run" else cmd_compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
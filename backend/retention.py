@@ -0,0 +1,217 @@
+"""Retention for user_predictions: moves old rows into compressed per-user monthly archives.
+
+Usage (from backend/):
+    python retention.py --days 180 --batch 1000
+    python retention.py --days 180 --max-batches 20   # bounded run, e.g. from cron
+
+Archived rows stay readable through read_history() (/api/report/history).
+"""
+from typing import Callable, ContextManager, Dict, List, Optional, Tuple
+import argparse
+import json
+import sqlite3
+import sys
+import time
+import zlib
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_prediction_archive (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    month TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    raw_bytes INTEGER NOT NULL,
+    min_created_at TEXT NOT NULL,
+    max_created_at TEXT NOT NULL,
+    blob BLOB NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (user_id, month)
+);
+"""
+
+
+def _pack(rows: List[list]) -> bytes:
+    return zlib.compress(json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 9)
+
+
+def _unpack(blob: bytes) -> List[list]:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def _db_bytes(conn: sqlite3.Connection) -> Tuple[int, int]:
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return pages * page_size, free * page_size
+
+
+def archive_batch(conn: sqlite3.Connection, cutoff: str, batch_size: int) -> Dict[str, int]:
+    """Archives up to batch_size rows older than cutoff in a single transaction."""
+    rows = conn.execute(
+        """
+        SELECT id, user_id, payload_json, result_json, created_at FROM user_predictions
+        WHERE created_at < ?
+        ORDER BY id ASC
+        LIMIT ?
+        """,
+        (cutoff, batch_size),
+    ).fetchall()
+    if not rows:
+        return {"rows": 0, "raw_bytes": 0, "blob_bytes": 0}
+
+    groups: Dict[Tuple[int, str], List[list]] = {}
+    raw_bytes = 0
+    for r in rows:
+        created_at = r["created_at"]
+        groups.setdefault((r["user_id"], created_at[:7]), []).append([r["id"], created_at, r["payload_json"], r["result_json"]])
+        raw_bytes += len(r["payload_json"]) + len(r["result_json"]) + len(created_at)
+
+    blob_delta = 0
+    now = datetime.utcnow().isoformat()
+    with conn:
+        for (user_id, month), items in groups.items():
+            group_raw = sum(len(it[1]) + len(it[2]) + len(it[3]) for it in items)
+            existing = conn.execute(
+                "SELECT row_count, raw_bytes, blob FROM user_prediction_archive WHERE user_id = ? AND month = ?",
+                (user_id, month),
+            ).fetchone()
+            prev_blob = 0
+            if existing:
+                prev_blob = len(existing["blob"])
+                group_raw += existing["raw_bytes"]
+                items = _unpack(existing["blob"]) + items
+            items.sort(key=lambda it: (it[1], it[0]))
+            blob = _pack(items)
+            blob_delta += len(blob) - prev_blob
+            conn.execute(
+                """
+                INSERT INTO user_prediction_archive (user_id, month, row_count, raw_bytes, min_created_at, max_created_at, blob, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(user_id, month) DO UPDATE SET
+                    row_count = excluded.row_count,
+                    raw_bytes = excluded.raw_bytes,
+                    min_created_at = excluded.min_created_at,
+                    max_created_at = excluded.max_created_at,
+                    blob = excluded.blob,
+                    updated_at = excluded.updated_at
+                """,
+                (user_id, month, len(items), group_raw, items[0][1], items[-1][1], blob, now),
+            )
+        conn.executemany("DELETE FROM user_predictions WHERE id = ?", [(r["id"],) for r in rows])
+    return {"rows": len(rows), "raw_bytes": raw_bytes, "blob_bytes": blob_delta}
+
+
+def run_retention(
+    conn: sqlite3.Connection,
+    horizon_days: int,
+    batch_size: int = 1000,
+    max_batches: Optional[int] = None,
+    pause_sec: float = 0.0,
+    write_lock: Optional[Callable[[], ContextManager]] = None,
+) -> Dict[str, int]:
+    """Runs archive_batch until nothing is older than the horizon or max_batches is hit.
+
+    write_lock (app._write_lock) is held per batch so API writers interleave between batches.
+    """
+    cutoff = (datetime.utcnow() - timedelta(days=horizon_days)).isoformat()
+    size_before, free_before = _db_bytes(conn)
+    totals = {"batches": 0, "rows": 0, "raw_bytes": 0, "blob_bytes": 0}
+    while max_batches is None or totals["batches"] < max_batches:
+        with write_lock() if write_lock else nullcontext():
+            res = archive_batch(conn, cutoff, batch_size)
+        if not res["rows"]:
+            break
+        totals["batches"] += 1
+        for k in ("rows", "raw_bytes", "blob_bytes"):
+            totals[k] += res[k]
+        if pause_sec:
+            # 다른 writer가 락을 잡을 수 있도록 배치 사이에 양보
+            time.sleep(pause_sec)
+    # auto_vacuum=INCREMENTAL인 DB는 여기서 빈 페이지를 파일에서 돌려준다
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        conn.execute("PRAGMA incremental_vacuum")
+    size_after, free_after = _db_bytes(conn)
+    totals["reclaimed_bytes"] = totals["raw_bytes"] - totals["blob_bytes"]
+    totals["file_bytes_before"] = size_before
+    totals["file_bytes_after"] = size_after
+    totals["free_bytes_after"] = free_after
+    totals["free_bytes_before"] = free_before
+    return totals
+
+
+def read_history(conn: sqlite3.Connection, user_id: int, before: Optional[str] = None, limit: int = 50, before_id: Optional[int] = None) -> List[dict]:
+    """Newest-first prediction history across the hot table and the archive.
+
+    Pages are keyed by (created_at, id): pass the last row's created_at and id as
+    before/before_id so rows sharing a timestamp are neither skipped nor repeated.
+    Without before_id, only rows strictly older than `before` are returned.
+    """
+    # id는 1부터 시작하므로 before_id가 없으면 -1로 두어 같은 시각의 행을 모두 제외한다
+    key = (before or "9999", before_id if before_id is not None else -1)
+    hot = conn.execute(
+        """
+        SELECT id, payload_json, result_json, created_at FROM user_predictions
+        WHERE user_id = ? AND (created_at, id) < (?, ?)
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+        """,
+        (user_id, *key, limit),
+    ).fetchall()
+    out = [
+        {"id": r["id"], "created_at": r["created_at"], "payload": json.loads(r["payload_json"]), "result": json.loads(r["result_json"]), "archived": False}
+        for r in hot
+    ]
+    if len(out) < limit:
+        cur = conn.execute(
+            """
+            SELECT blob FROM user_prediction_archive
+            WHERE user_id = ? AND min_created_at <= ?
+            ORDER BY month DESC
+            """,
+            (user_id, key[0]),
+        )
+        archived: List[dict] = []
+        for a in cur:
+            for item_id, created_at, payload_json, result_json in reversed(_unpack(a["blob"])):
+                if (created_at, item_id) < key:
+                    archived.append({"id": item_id, "created_at": created_at, "payload": json.loads(payload_json), "result": json.loads(result_json), "archived": True})
+            if len(archived) >= limit:
+                break
+        out.extend(archived)
+        out.sort(key=lambda x: (x["created_at"], x["id"]), reverse=True)
+    return out[:limit]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="user_predictions 보존 기간 이후 행을 월별 압축 아카이브로 이동")
+    p.add_argument("--days", type=int, default=180, help="이보다 오래된 행을 아카이브")
+    p.add_argument("--batch", type=int, default=1000, help="트랜잭션당 행 수")
+    p.add_argument("--max-batches", type=int, default=None)
+    p.add_argument("--pause", type=float, default=0.05, help="배치 사이 대기(초)")
+    p.add_argument("--vacuum", action="store_true", help="끝난 뒤 auto_vacuum=INCREMENTAL로 전환하고 VACUUM (DB 전체 잠금)")
+    args = p.parse_args(argv)
+
+    import app
+
+    conn = app._get_db()
+    try:
+        t0 = time.perf_counter()
+        res = run_retention(conn, args.days, args.batch, args.max_batches, args.pause, app._write_lock)
+        if args.vacuum:
+            with app._write_lock():
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+            res["file_bytes_after"], res["free_bytes_after"] = _db_bytes(conn)
+        print(
+            f"[retention] archived {res['rows']:,} rows in {res['batches']} batches ({time.perf_counter() - t0:.1f}s); "
+            f"payload {res['raw_bytes']:,}B -> archive +{res['blob_bytes']:,}B, reclaimed {res['reclaimed_bytes']:,}B; "
+            f"file {res['file_bytes_before']:,}B -> {res['file_bytes_after']:,}B (free pages {res['free_bytes_after']:,}B)"
+        )
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""Per-user trend rollups (day/week/month) for /api/report/trends.
+
+predict and roi_report call record() inside their write transaction, so every stored
+prediction updates one row per bucket size: count, sum, min and max of fatigue,
+training load and ROI. A year-long chart is then at most 12/53/366 indexed rows.
+
+Buckets are UTC calendar days, ISO weeks (starting Monday) and months, keyed by the
+bucket's first day (YYYY-MM-DD).
+
+backfill() rebuilds rollups from user_predictions and the retention archive, a
+chunk of users at a time under the writer lock (e.g. after seeding, or when the
+rollup definition changes). migrate() runs it once at startup when the table has
+no rows yet but predictions exist, so an existing database gets its history.
+
+Usage (from backend/):
+    python rollups.py --backfill
+"""
+from typing import Callable, ContextManager, Dict, Iterable, List, Optional, Tuple
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta
+
+import retention
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_trend_rollups (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    bucket TEXT NOT NULL,
+    bucket_start TEXT NOT NULL,
+    predictions INTEGER NOT NULL DEFAULT 0,
+    fatigue_n INTEGER NOT NULL DEFAULT 0,
+    fatigue_sum REAL NOT NULL DEFAULT 0,
+    fatigue_min REAL,
+    fatigue_max REAL,
+    load_n INTEGER NOT NULL DEFAULT 0,
+    load_sum REAL NOT NULL DEFAULT 0,
+    load_min REAL,
+    load_max REAL,
+    roi_n INTEGER NOT NULL DEFAULT 0,
+    roi_sum REAL NOT NULL DEFAULT 0,
+    roi_min REAL,
+    roi_max REAL,
+    PRIMARY KEY (user_id, bucket, bucket_start)
+);
+"""
+
+BUCKETS = ("day", "week", "month")
+METRICS = ("fatigue", "load", "roi")
+
+# (fatigue, load, roi); 값이 없으면 None
+Values = Tuple[Optional[float], Optional[float], Optional[float]]
+
+_UPSERT = """
+INSERT INTO user_trend_rollups (
+    user_id, bucket, bucket_start, predictions,
+    fatigue_n, fatigue_sum, fatigue_min, fatigue_max,
+    load_n, load_sum, load_min, load_max,
+    roi_n, roi_sum, roi_min, roi_max
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(user_id, bucket, bucket_start) DO UPDATE SET
+    predictions = predictions + excluded.predictions,
+""" + ",\n".join(
+    f"""    {m}_n = {m}_n + excluded.{m}_n,
+    {m}_sum = {m}_sum + excluded.{m}_sum,
+    {m}_min = MIN(COALESCE({m}_min, excluded.{m}_min), COALESCE(excluded.{m}_min, {m}_min)),
+    {m}_max = MAX(COALESCE({m}_max, excluded.{m}_max), COALESCE(excluded.{m}_max, {m}_max))"""
+    for m in METRICS
+)
+
+
+def bucket_start(bucket: str, d: date) -> str:
+    if bucket == "week":
+        d = d - timedelta(days=d.weekday())
+    elif bucket == "month":
+        d = d.replace(day=1)
+    return d.isoformat()
+
+
+class _Agg:
+    __slots__ = ("predictions", "stats")
+
+    def __init__(self):
+        self.predictions = 0
+        # metric -> [n, sum, min, max]
+        self.stats: List[list] = [[0, 0.0, None, None] for _ in METRICS]
+
+    def add(self, values: Values):
+        self.predictions += 1
+        for s, v in zip(self.stats, values):
+            if v is None:
+                continue
+            s[0] += 1
+            s[1] += v
+            s[2] = v if s[2] is None else min(s[2], v)
+            s[3] = v if s[3] is None else max(s[3], v)
+
+    def row(self, user_id: int, bucket: str, start: str) -> tuple:
+        return (user_id, bucket, start, self.predictions, *[x for s in self.stats for x in s])
+
+
+def record(conn: sqlite3.Connection, user_id: int, created_at: str, values: Values):
+    """Adds one prediction to the user's day/week/month rows; call inside the write transaction."""
+    agg = _Agg()
+    agg.add(values)
+    d = datetime.fromisoformat(created_at).date()
+    conn.executemany(_UPSERT, [agg.row(user_id, b, bucket_start(b, d)) for b in BUCKETS])
+
+
+def query(conn: sqlite3.Connection, user_id: int, bucket: str, start: str, end: str) -> List[dict]:
+    """Rollup rows whose bucket starts within [bucket_start(start), end], oldest first."""
+    rows = conn.execute(
+        """
+        SELECT * FROM user_trend_rollups
+        WHERE user_id = ? AND bucket = ? AND bucket_start >= ? AND bucket_start <= ?
+        ORDER BY bucket_start ASC
+        """,
+        (user_id, bucket, bucket_start(bucket, date.fromisoformat(start)), end),
+    ).fetchall()
+    out = []
+    for r in rows:
+        item = {"bucket_start": r["bucket_start"], "predictions": r["predictions"]}
+        for m in METRICS:
+            n = r[f"{m}_n"]
+            item[m] = {
+                "n": n,
+                "sum": round(r[f"{m}_sum"], 1),
+                "avg": round(r[f"{m}_sum"] / n, 1) if n else None,
+                "min": r[f"{m}_min"],
+                "max": r[f"{m}_max"],
+            }
+        out.append(item)
+    return out
+
+
+def _user_rows(conn: sqlite3.Connection, user_id: int) -> Iterable[Tuple[str, str, str]]:
+    for r in conn.execute("SELECT payload_json, result_json, created_at FROM user_predictions WHERE user_id = ?", (user_id,)):
+        yield r["payload_json"], r["result_json"], r["created_at"]
+    for a in conn.execute("SELECT blob FROM user_prediction_archive WHERE user_id = ?", (user_id,)):
+        for _id, created_at, payload_json, result_json in retention._unpack(a["blob"]):
+            yield payload_json, result_json, created_at
+
+
+def migrate(conn: sqlite3.Connection, values_fn: Callable[[dict, dict], Values]) -> Optional[Dict[str, int]]:
+    """Creates the table and backfills it from stored predictions if it is still empty."""
+    conn.executescript(SCHEMA)
+    if conn.execute("SELECT 1 FROM user_trend_rollups LIMIT 1").fetchone():
+        return None
+    if not (
+        conn.execute("SELECT 1 FROM user_predictions LIMIT 1").fetchone()
+        or conn.execute("SELECT 1 FROM user_prediction_archive LIMIT 1").fetchone()
+    ):
+        return None
+    return backfill(conn, values_fn)
+
+
+def backfill(
+    conn: sqlite3.Connection,
+    values_fn: Callable[[dict, dict], Values],
+    write_lock: Optional[Callable[[], ContextManager]] = None,
+    user_from: int = 0,
+    user_to: Optional[int] = None,
+    chunk_users: int = 200,
+) -> Dict[str, int]:
+    """Recomputes rollups for users in [user_from, user_to] from stored predictions."""
+    if user_to is None:
+        user_to = conn.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()[0]
+    totals = {"users": 0, "predictions": 0, "rows": 0}
+    for lo in range(user_from, user_to + 1, chunk_users):
+        hi = min(user_to, lo + chunk_users - 1)
+        # 읽기와 교체를 같은 락 안에서 해야 그 사이 predict가 쓴 증분이 사라지지 않는다
+        with (write_lock() if write_lock else nullcontext()), conn:
+            aggs: Dict[Tuple[int, str, str], _Agg] = {}
+            users = [r[0] for r in conn.execute("SELECT id FROM users WHERE id BETWEEN ? AND ? AND deleted_at IS NULL", (lo, hi))]
+            for uid in users:
+                for payload_json, result_json, created_at in _user_rows(conn, uid):
+                    values = values_fn(json.loads(payload_json), json.loads(result_json))
+                    d = datetime.fromisoformat(created_at).date()
+                    for b in BUCKETS:
+                        key = (uid, b, bucket_start(b, d))
+                        agg = aggs.get(key)
+                        if agg is None:
+                            agg = aggs[key] = _Agg()
+                        agg.add(values)
+                    totals["predictions"] += 1
+            conn.execute("DELETE FROM user_trend_rollups WHERE user_id BETWEEN ? AND ?", (lo, hi))
+            conn.executemany(_UPSERT, [agg.row(*key) for key, agg in aggs.items()])
+        totals["users"] += len(users)
+        totals["rows"] += len(aggs)
+    return totals
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="추세 롤업 테이블 재계산")
+    p.add_argument("--backfill", action="store_true", help="저장된 예측(아카이브 포함)에서 롤업을 다시 만든다")
+    p.add_argument("--chunk-users", type=int, default=200)
+    args = p.parse_args(argv)
+    if not args.backfill:
+        p.print_help()
+        return 0
+
+    import app
+
+    conn = app._get_db()
+    try:
+        t0 = time.perf_counter()
+        res = backfill(conn, app._trend_values, app._write_lock, chunk_users=args.chunk_users)
+        print(f"[rollups] {res} ({time.perf_counter() - t0:.1f}s)")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""Per-user routine ranking precomputed from routine-run history.
+
+A background job scores each catalog routine per user from their runs (count,
+completed duration vs. the routine's length, recency) and their latest
+overtraining_risk, and stores the ordered titles in user_routine_rank. Only users
+with new runs or predictions since the last pass are rescored. /api/routines then
+needs a single primary-key lookup.
+
+Recency is measured from the user's own latest run rather than from "now", so a
+stored ranking stays valid while the user is inactive.
+
+Usage (from backend/):
+    python routine_rank.py            # rescore users with new activity
+    python routine_rank.py --all      # rescore everyone
+"""
+from typing import Callable, ContextManager, Dict, List, Optional, Sequence, Tuple
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_routine_rank (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    ranking TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS routine_rank_state (
+    name TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_user_routine_runs_user_created ON user_routine_runs(user_id, created_at);
+"""
+
+HISTORY_DAYS = 90
+HALF_LIFE_DAYS = 14.0
+# 최근 과훈련 위험도에 따라 유형별로 더해 주는 가산점
+RISK_BOOST: Dict[Optional[str], Dict[str, float]] = {
+    "red": {"nap": 2.0, "breathing": 1.5},
+    "yellow": {"breathing": 1.0, "stretch": 0.5},
+    None: {"stretch": 0.5, "contrast": 0.5, "walk": 0.3},
+}
+
+# (title, minutes, type)
+Catalog = Sequence[Tuple[str, int, str]]
+
+
+def score_runs(catalog: Catalog, runs: List[Tuple[str, int, str]], risk: Optional[str]) -> List[str]:
+    """runs: (title, duration_min, created_at). Returns catalog titles, best first."""
+    minutes = {title: m for title, m, _ in catalog}
+    types = {title: kind for title, _, kind in catalog}
+    scores = {title: 0.0 for title, _, _ in catalog}
+    if runs:
+        newest = datetime.fromisoformat(max(r[2] for r in runs))
+        for title, duration, created_at in runs:
+            if title not in scores:
+                continue
+            age_days = (newest - datetime.fromisoformat(created_at)).total_seconds() / 86400
+            completion = min(1.0, (duration or 0) / minutes[title]) if minutes[title] else 1.0
+            scores[title] += 0.5 ** (age_days / HALF_LIFE_DAYS) * (0.5 + 0.5 * completion)
+    boost = RISK_BOOST.get(risk, {})
+    for title in scores:
+        scores[title] += boost.get(types[title], 0.0)
+    order = {title: i for i, (title, _, _) in enumerate(catalog)}
+    return sorted(scores, key=lambda t: (-scores[t], order[t]))
+
+
+def _latest_risk(conn: sqlite3.Connection, user_id: int) -> Optional[str]:
+    for r in conn.execute(
+        "SELECT result_json FROM user_predictions WHERE user_id = ? ORDER BY created_at DESC LIMIT 10",
+        (user_id,),
+    ):
+        result = json.loads(r["result_json"])
+        if "fatigue_score" in result:
+            return result.get("overtraining_risk")
+    return None
+
+
+def _user_runs(conn: sqlite3.Connection, user_id: int) -> List[Tuple[str, int, str]]:
+    newest = conn.execute("SELECT MAX(created_at) FROM user_routine_runs WHERE user_id = ?", (user_id,)).fetchone()[0]
+    if not newest:
+        return []
+    since = (datetime.fromisoformat(newest) - timedelta(days=HISTORY_DAYS)).isoformat()
+    return [
+        (r["title"], r["duration_min"], r["created_at"])
+        for r in conn.execute(
+            "SELECT title, duration_min, created_at FROM user_routine_runs WHERE user_id = ? AND created_at >= ?",
+            (user_id, since),
+        )
+    ]
+
+
+def refresh(
+    conn: sqlite3.Connection,
+    catalog: Catalog,
+    write_lock: Optional[Callable[[], ContextManager]] = None,
+    all_users: bool = False,
+    batch_size: int = 500,
+) -> Dict[str, int]:
+    state = {r["name"]: r["last_id"] for r in conn.execute("SELECT name, last_id FROM routine_rank_state")}
+    run_from = 0 if all_users else state.get("runs", 0)
+    pred_from = 0 if all_users else state.get("predictions", 0)
+    run_to = conn.execute("SELECT COALESCE(MAX(id), 0) FROM user_routine_runs").fetchone()[0]
+    pred_to = conn.execute("SELECT COALESCE(MAX(id), 0) FROM user_predictions").fetchone()[0]
+    users = [
+        r[0]
+        for r in conn.execute(
+            """
+            SELECT user_id FROM user_routine_runs WHERE id > ? AND id <= ?
+            UNION
+            SELECT user_id FROM user_predictions WHERE id > ? AND id <= ?
+            EXCEPT
+            SELECT id FROM users WHERE deleted_at IS NOT NULL
+            """,
+            (run_from, run_to, pred_from, pred_to),
+        )
+    ]
+
+    updated = 0
+    for i in range(0, len(users), batch_size):
+        # 계산은 락 밖에서, 쓰기만 배치 단위로 짧게
+        now = datetime.utcnow().isoformat()
+        rows = [
+            (json.dumps(score_runs(catalog, _user_runs(conn, uid), _latest_risk(conn, uid)), ensure_ascii=False), now, uid)
+            for uid in users[i : i + batch_size]
+        ]
+        with (write_lock() if write_lock else nullcontext()), conn:
+            conn.executemany(
+                """
+                INSERT INTO user_routine_rank (user_id, ranking, updated_at)
+                SELECT id, ?, ? FROM users WHERE id = ? AND deleted_at IS NULL
+                ON CONFLICT(user_id) DO UPDATE SET ranking = excluded.ranking, updated_at = excluded.updated_at
+                """,
+                rows,
+            )
+        updated += len(rows)
+    with (write_lock() if write_lock else nullcontext()), conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO routine_rank_state (name, last_id) VALUES (?, ?)",
+            [("runs", run_to), ("predictions", pred_to)],
+        )
+    return {"users": updated}
+
+
+def lookup(conn: sqlite3.Connection, user_id: int) -> Optional[List[str]]:
+    row = conn.execute("SELECT ranking FROM user_routine_rank WHERE user_id = ?", (user_id,)).fetchone()
+    return json.loads(row["ranking"]) if row else None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="사용자별 루틴 추천 순위 계산")
+    p.add_argument("--all", action="store_true", help="활동 여부와 관계없이 전체 사용자 재계산")
+    p.add_argument("--batch", type=int, default=500)
+    args = p.parse_args(argv)
+
+    import app
+
+    conn = app._get_db()
+    try:
+        t0 = time.perf_counter()
+        res = refresh(conn, app._routine_catalog(), app._write_lock, args.all, args.batch)
+        print(f"[routine-rank] {res} ({time.perf_counter() - t0:.1f}s)")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
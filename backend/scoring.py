@@ -0,0 +1,494 @@
+"""Scoring engines behind app._fatigue_score / app._roi_for_rest.
+
+An engine scores two heads, both single and batched:
+    fatigue(features)              -> int 0-100   (features: dict from app._score_features)
+    roi((fatigue, minutes, sleep)) -> int 0-50
+The built-in "heuristic" engine wraps the formulas in app.py. Artifact engines load
+a model file (.hym) that is memory-mapped read-only:
+
+    b"HYSM1\\n" | u32 header length | JSON header | pad to 8 | float64 values
+
+The header describes each head: "linear" (intercept + coefficients over named
+features) or "trees" (a small additive tree ensemble; node rows are
+[feature, threshold, left, right, value], feature < 0 marks a leaf). A head the
+artifact does not define falls back to the heuristic. Loading touches every page,
+runs the header's "checks" and a warm-up call before the engine can go live, so a
+broken artifact never replaces the current one.
+
+ModelRegistry keeps the active engine and an optional shadow candidate. Which file is
+active is recorded in <model dir>/registry.json; every worker notices a change
+within SCORING_RELOAD_SEC and swaps by replacing one reference, so in-flight calls
+finish on the engine they started with. Shadow scoring runs on a background thread
+from a bounded queue (dropped when full) and records disagreement with the active
+engine. Per-engine call latency is in stats() (/api/health/scoring).
+
+Usage (from backend/):
+    python scoring.py pack spec.json models/fatigue-v2.hym   # JSON spec -> artifact
+    python scoring.py check models/fatigue-v2.hym            # load, run checks, time it
+    python scoring.py shadow fatigue-v2.hym                  # score in the shadow, compare
+    python scoring.py activate fatigue-v2.hym                # swap (or "heuristic")
+    python scoring.py shadow off
+"""
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import argparse
+import json
+import mmap
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+
+MAGIC = b"HYSM1\n"
+HEURISTIC = "heuristic"
+HEADS = ("fatigue", "roi")
+# 헤드별 출력 범위 (API 계약)
+OUTPUT_RANGE = {"fatigue": (0, 100), "roi": (0, 50)}
+ROI_FEATURES = ("fatigue", "minutes", "sleep_hours")
+
+RoiInput = Tuple[float, float, float]  # (fatigue, minutes, sleep_hours)
+
+
+@dataclass
+class ModelStats:
+    calls: int = 0
+    items: int = 0
+    ms_total: float = 0.0
+    ms_max: float = 0.0
+    recent_ms: deque = field(default_factory=lambda: deque(maxlen=2048))
+
+    def record(self, items: int, ms: float):
+        self.calls += 1
+        self.items += items
+        self.ms_total += ms
+        self.ms_max = max(self.ms_max, ms)
+        self.recent_ms.append(ms)
+
+    def as_dict(self) -> Dict[str, Any]:
+        recent = sorted(self.recent_ms)
+        pct = lambda q: round(recent[min(len(recent) - 1, int(q * len(recent)))], 3) if recent else 0.0
+        return {
+            "calls": self.calls,
+            "items": self.items,
+            "ms_avg": round(self.ms_total / self.calls, 3) if self.calls else 0.0,
+            "ms_p50": pct(0.50),
+            "ms_p95": pct(0.95),
+            "ms_p99": pct(0.99),
+            "ms_max": round(self.ms_max, 3),
+        }
+
+
+class Engine:
+    """Base class: subclasses implement _fatigue_batch/_roi_batch; calls are timed per head."""
+
+    name = "engine"
+    version = ""
+
+    def __init__(self):
+        self.stats = {h: ModelStats() for h in HEADS}
+        self.loaded_at = time.time()
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@{self.version}" if self.version else self.name
+
+    def fatigue_batch(self, items: Sequence[dict]) -> List[int]:
+        t0 = time.perf_counter()
+        out = self._fatigue_batch(items)
+        self.stats["fatigue"].record(len(items), (time.perf_counter() - t0) * 1000)
+        return out
+
+    def roi_batch(self, items: Sequence[RoiInput]) -> List[int]:
+        t0 = time.perf_counter()
+        out = self._roi_batch(items)
+        self.stats["roi"].record(len(items), (time.perf_counter() - t0) * 1000)
+        return out
+
+    def fatigue(self, features: dict) -> int:
+        return self.fatigue_batch([features])[0]
+
+    def roi(self, fatigue: float, minutes: float, sleep_hours: float) -> int:
+        return self.roi_batch([(fatigue, minutes, sleep_hours)])[0]
+
+    def _fatigue_batch(self, items: Sequence[dict]) -> List[int]:
+        raise NotImplementedError
+
+    def _roi_batch(self, items: Sequence[RoiInput]) -> List[int]:
+        raise NotImplementedError
+
+    def describe(self) -> Dict[str, Any]:
+        return {"model": self.key, "loaded_at": self.loaded_at, "latency_ms": {h: s.as_dict() for h, s in self.stats.items()}}
+
+
+class HeuristicEngine(Engine):
+    name = HEURISTIC
+
+    def __init__(self, fatigue_fn: Callable[[dict], int], roi_fn: Callable[[float, float, float], int]):
+        super().__init__()
+        self._fatigue_fn = fatigue_fn
+        self._roi_fn = roi_fn
+
+    def _fatigue_batch(self, items: Sequence[dict]) -> List[int]:
+        return [self._fatigue_fn(f) for f in items]
+
+    def _roi_batch(self, items: Sequence[RoiInput]) -> List[int]:
+        return [self._roi_fn(*x) for x in items]
+
+
+class _Head:
+    """One head of an artifact, evaluated straight from the mapped float64 values."""
+
+    def __init__(self, head: str, spec: dict, values: memoryview):
+        self.head = head
+        self.kind = spec["kind"]
+        self.features = list(spec["features"])
+        self.defaults = [float(spec.get("defaults", {}).get(f, 0.0)) for f in self.features]
+        lo, hi = OUTPUT_RANGE[head]
+        self.lo, self.hi = spec.get("min", lo), spec.get("max", hi)
+        off, n = spec["offset"], spec["length"]
+        if off < 0 or off + n > len(values):
+            raise ValueError(f"{head}: values [{off}, {off + n}) outside the artifact")
+        self.v = values[off : off + n]
+        if self.kind == "linear":
+            if n != len(self.features) + 1:
+                raise ValueError(f"{head}: linear head needs {len(self.features) + 1} values, got {n}")
+        elif self.kind == "trees":
+            self.base = float(spec.get("base", 0.0))
+            self.roots = [int(r) for r in spec["trees"]]
+            # 자식은 부모보다 뒤에 있어야 한다 (전위 순서; 순환이 생기지 않음)
+            nodes = n // 5
+            bad = n % 5 or any(r < 0 or r >= nodes for r in self.roots) or any(
+                self.v[i * 5] >= 0 and not (i < self.v[i * 5 + 2] < nodes and i < self.v[i * 5 + 3] < nodes and self.v[i * 5] < len(self.features))
+                for i in range(nodes)
+            )
+            if bad:
+                raise ValueError(f"{head}: malformed tree nodes")
+        else:
+            raise ValueError(f"{head}: unknown head kind {self.kind!r}")
+
+    def row(self, features: dict) -> List[float]:
+        out = []
+        for name, default in zip(self.features, self.defaults):
+            x = features.get(name)
+            out.append(default if x is None else float(x))
+        return out
+
+    def raw(self, x: List[float]) -> float:
+        v = self.v
+        if self.kind == "linear":
+            y = v[0]
+            for i, xi in enumerate(x, 1):
+                y += v[i] * xi
+            return y
+        y = self.base
+        for root in self.roots:
+            node = root
+            while True:
+                i = node * 5
+                feat = int(v[i])
+                if feat < 0:
+                    y += v[i + 4]
+                    break
+                node = int(v[i + 2]) if x[feat] <= v[i + 1] else int(v[i + 3])
+        return y
+
+    def score(self, features: dict) -> int:
+        return int(max(self.lo, min(self.hi, round(self.raw(self.row(features))))))
+
+
+class ArtifactEngine(Engine):
+    def __init__(self, path: Path, fallback: Engine):
+        super().__init__()
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path.name}: not a scoring artifact")
+        (hlen,) = struct.unpack_from("<I", self._mm, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(self._mm[start : start + hlen])
+        if self.header.get("byteorder", "little") != sys.byteorder:
+            raise ValueError(f"{self.path.name}: byte order {self.header.get('byteorder')} != {sys.byteorder}")
+        data = (start + hlen + 7) // 8 * 8
+        self._values = memoryview(self._mm)[data:].cast("d")
+        self.name = self.header.get("name") or self.path.stem
+        self.version = str(self.header.get("version", ""))
+        self.heads = {h: _Head(h, spec, self._values) for h, spec in self.header.get("heads", {}).items() if h in HEADS}
+        self.fallback = fallback
+        self._warm()
+
+    def _warm(self):
+        # 페이지를 미리 읽어 첫 요청이 페이지 폴트를 맞지 않게 하고, 헤더의 검증 사례를 돌린다
+        step = mmap.PAGESIZE // 8
+        sum(self._values[i] for i in range(0, len(self._values), step))
+        for c in self.header.get("checks", []):
+            head, x, want = c["head"], c["x"], c["y"]
+            got = self._fatigue_batch([x])[0] if head == "fatigue" else self._roi_batch([tuple(x[k] for k in ROI_FEATURES)])[0]
+            if abs(got - want) > c.get("tol", 0):
+                raise ValueError(f"{self.key}: check failed for {head} {x}: got {got}, expected {want}")
+        self._fatigue_batch([{}])
+        self._roi_batch([(50.0, 60.0, 7.0)])
+
+    def _fatigue_batch(self, items: Sequence[dict]) -> List[int]:
+        head = self.heads.get("fatigue")
+        if head is None:
+            return self.fallback._fatigue_batch(items)
+        return [head.score(f) for f in items]
+
+    def _roi_batch(self, items: Sequence[RoiInput]) -> List[int]:
+        head = self.heads.get("roi")
+        if head is None:
+            return self.fallback._roi_batch(items)
+        return [head.score(dict(zip(ROI_FEATURES, x))) for x in items]
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            **super().describe(),
+            "path": str(self.path),
+            "bytes": len(self._mm),
+            "heads": {h: self.heads[h].kind if h in self.heads else "heuristic" for h in HEADS},
+        }
+
+
+@dataclass
+class ShadowStats:
+    compared: int = 0
+    dropped: int = 0
+    errors: int = 0
+    abs_diff_total: float = 0.0
+    abs_diff_max: float = 0.0
+    changed: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "compared": self.compared,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "abs_diff_avg": round(self.abs_diff_total / self.compared, 2) if self.compared else 0.0,
+            "abs_diff_max": self.abs_diff_max,
+            "changed_pct": round(100.0 * self.changed / self.compared, 1) if self.compared else 0.0,
+        }
+
+
+class ModelRegistry:
+    def __init__(self, model_dir: Path, heuristic: Engine, reload_sec: float = 5.0, shadow_queue: int = 1024):
+        self.model_dir = Path(model_dir)
+        self.heuristic = heuristic
+        self.reload_sec = reload_sec
+        self._active: Engine = heuristic
+        self._shadow: Optional[Engine] = None
+        self._shadow_stats: Dict[str, ShadowStats] = {}
+        self._queue: "queue.Queue" = queue.Queue(maxsize=shadow_queue)
+        self._lock = threading.Lock()
+        self._checked = 0.0
+        self._pointer_mtime: Optional[float] = None
+        self.last_error: Optional[str] = None
+        threading.Thread(target=self._shadow_loop, name="hyuga-shadow-scoring", daemon=True).start()
+
+    @property
+    def pointer_path(self) -> Path:
+        return self.model_dir / "registry.json"
+
+    def _load(self, name: Optional[str]) -> Optional[Engine]:
+        if not name or name == HEURISTIC:
+            return self.heuristic if name else None
+        return ArtifactEngine(self.model_dir / name, self.heuristic)
+
+    def reload(self, force: bool = False):
+        """Re-reads registry.json if it changed; a failed load keeps the current engines."""
+        now = time.monotonic()
+        if not force and now - self._checked < self.reload_sec:
+            return
+        with self._lock:
+            self._checked = now
+            try:
+                mtime = self.pointer_path.stat().st_mtime
+            except FileNotFoundError:
+                mtime = None
+            if mtime == self._pointer_mtime and not force:
+                return
+            self._pointer_mtime = mtime
+            try:
+                pointer = json.loads(self.pointer_path.read_text(encoding="utf-8")) if mtime is not None else {}
+                active = self._load(pointer.get("active") or HEURISTIC)
+                shadow = self._load(pointer.get("shadow"))
+            except (OSError, ValueError, KeyError) as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"[scoring] load failed, keeping {self._active.key}: {self.last_error}")
+                return
+            self.last_error = None
+            # 참조 하나를 바꾸는 것으로 교체: 진행 중인 호출은 시작한 엔진으로 끝난다
+            if active.key != self._active.key:
+                print(f"[scoring] active {self._active.key} -> {active.key}")
+                self._active = active
+            if (shadow.key if shadow else None) != (self._shadow.key if self._shadow else None):
+                print(f"[scoring] shadow -> {shadow.key if shadow else 'off'}")
+                self._shadow = shadow
+                self._shadow_stats = {h: ShadowStats() for h in HEADS} if shadow else {}
+
+    @property
+    def active(self) -> Engine:
+        self.reload()
+        return self._active
+
+    def fatigue_batch(self, items: Sequence[dict]) -> List[int]:
+        out = self.active.fatigue_batch(items)
+        self._submit_shadow("fatigue", items, out)
+        return out
+
+    def roi_batch(self, items: Sequence[RoiInput]) -> List[int]:
+        out = self.active.roi_batch(items)
+        self._submit_shadow("roi", items, out)
+        return out
+
+    def _submit_shadow(self, head: str, items: Sequence, out: List[int]):
+        shadow = self._shadow
+        if shadow is None:
+            return
+        try:
+            self._queue.put_nowait((shadow, head, list(items), out))
+        except queue.Full:
+            stats = self._shadow_stats.get(head)
+            if stats:
+                stats.dropped += 1
+
+    def _shadow_loop(self):
+        while True:
+            shadow, head, items, expected = self._queue.get()
+            stats = self._shadow_stats.get(head)
+            if stats is None or shadow is not self._shadow:
+                continue  # 그 사이 후보가 바뀜
+            try:
+                got = shadow.fatigue_batch(items) if head == "fatigue" else shadow.roi_batch(items)
+            except Exception as e:
+                stats.errors += 1
+                print(f"[scoring] shadow {shadow.key} failed: {e}")
+                continue
+            for a, b in zip(expected, got):
+                d = abs(a - b)
+                stats.compared += 1
+                stats.abs_diff_total += d
+                stats.abs_diff_max = max(stats.abs_diff_max, d)
+                stats.changed += d > 0
+
+    def stats(self) -> Dict[str, Any]:
+        self.reload()
+        shadow = self._shadow
+        return {
+            "active": self._active.describe(),
+            "shadow": {**shadow.describe(), "vs_active": {h: s.as_dict() for h, s in self._shadow_stats.items()}} if shadow else None,
+            "shadow_queue": self._queue.qsize(),
+            "last_error": self.last_error,
+        }
+
+
+def write_pointer(model_dir: Path, **changes: Optional[str]):
+    """Atomically updates registry.json (active / shadow)."""
+    path = Path(model_dir) / "registry.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pointer = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    pointer.update(changes)
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(pointer, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def pack(spec: dict, out: Path) -> Path:
+    """Writes an artifact from a JSON spec ({"name", "version", "heads": {...}, "checks": [...]})."""
+    values: List[float] = []
+    heads = {}
+    for head, h in spec["heads"].items():
+        if head not in HEADS:
+            raise ValueError(f"unknown head {head!r}")
+        entry = {k: v for k, v in h.items() if k not in ("intercept", "coef", "trees")}
+        entry["offset"] = len(values)
+        if h["kind"] == "linear":
+            if len(h["coef"]) != len(h["features"]):
+                raise ValueError(f"{head}: {len(h['features'])} features but {len(h['coef'])} coefficients")
+            values += [float(h.get("intercept", 0.0))] + [float(c) for c in h["coef"]]
+        elif h["kind"] == "trees":
+            # 트리마다 노드 번호를 전체 배열 기준으로 옮긴다
+            roots = []
+            for tree in h["trees"]:
+                base = (len(values) - entry["offset"]) // 5
+                roots.append(base)
+                for feat, thr, left, right, value in tree:
+                    leaf = feat < 0
+                    values += [float(feat), float(thr), float(-1 if leaf else base + left), float(-1 if leaf else base + right), float(value)]
+            entry["trees"] = roots
+        else:
+            raise ValueError(f"{head}: unknown head kind {h['kind']!r}")
+        entry["length"] = len(values) - entry["offset"]
+        heads[head] = entry
+    header = {
+        "format": 1,
+        "name": spec["name"],
+        "version": str(spec["version"]),
+        "byteorder": "little",
+        "heads": heads,
+        "checks": spec.get("checks", []),
+    }
+    hjson = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    start = len(MAGIC) + 4
+    pad = (start + len(hjson) + 7) // 8 * 8 - (start + len(hjson))
+    out = Path(out)
+    tmp = out.with_suffix(out.suffix + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(hjson)) + hjson + b"\0" * pad + struct.pack(f"<{len(values)}d", *values))
+    os.replace(tmp, out)  # 다른 워커가 읽는 중인 파일을 덮어쓰지 않도록 새 파일로 교체
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="점수 모델 관리 (패키징, 검증, 활성화, 섀도)")
+    p.add_argument("--model-dir", default=None, help="기본: HYUGA_MODEL_DIR 또는 backend/models")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("pack", help="JSON 스펙을 모델 파일로")
+    s.add_argument("spec")
+    s.add_argument("out")
+    s = sub.add_parser("check", help="모델 파일을 올려 검증 사례를 돌리고 지연을 잰다")
+    s.add_argument("artifact")
+    s.add_argument("--n", type=int, default=10_000)
+    s = sub.add_parser("activate", help="모델 디렉터리 안의 파일(또는 heuristic)을 활성화")
+    s.add_argument("name")
+    s = sub.add_parser("shadow", help="섀도 후보 지정 (off로 끔)")
+    s.add_argument("name")
+    args = p.parse_args(argv)
+
+    import app
+
+    model_dir = Path(args.model_dir) if args.model_dir else app.MODEL_DIR
+    if args.cmd == "pack":
+        out = pack(json.loads(Path(args.spec).read_text(encoding="utf-8")), Path(args.out))
+        print(f"[scoring] wrote {out} ({out.stat().st_size:,} bytes)")
+    elif args.cmd == "check":
+        t0 = time.perf_counter()
+        eng = ArtifactEngine(Path(args.artifact), app._heuristic_engine)
+        print(f"[scoring] {eng.key} loaded and checked in {(time.perf_counter() - t0) * 1000:.1f}ms: {eng.describe()['heads']}")
+        rows = [app._score_features(app.WorkoutInput(duration_min=30 + i % 90, avg_hr=120 + i % 60, max_hr=190, sleep_hours=5 + i % 4, last7_load=300, last28_load=1600)) for i in range(args.n)]
+        for e in (app._heuristic_engine, eng):
+            t0 = time.perf_counter()
+            e.fatigue_batch(rows)
+            single = time.perf_counter()
+            for r in rows[:1000]:
+                e.fatigue(r)
+            print(f"  {e.key:<24} batch {(single - t0) * 1e6 / len(rows):.2f}us/item  single {(time.perf_counter() - single) * 1e3:.2f}us/call")
+    else:
+        name = None if args.cmd == "shadow" and args.name == "off" else args.name
+        if name and name != HEURISTIC:
+            try:
+                ArtifactEngine(model_dir / name, app._heuristic_engine)  # 워커가 읽기 전에 여기서 먼저 검증
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[scoring] rejected {name}: {e}")
+                return 1
+        write_pointer(model_dir, **{"active" if args.cmd == "activate" else "shadow": name})
+        print(f"[scoring] {args.cmd} = {name or 'off'} (workers pick it up within {app._scoring.reload_sec:g}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
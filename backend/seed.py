@@ -0,0 +1,217 @@
+"""Synthetic data generator for scale-testing hyuga.db.
+
+Usage (from backend/):
+    python seed.py --db /tmp/hyuga-scale.db --users 10000 --days 120 --seed 42
+
+The same seed and options always produce the same rows. Scores in result_json
+come from the API's own scoring functions, so seeded data looks exactly like
+data written by /api/predict and /api/roi-report.
+"""
+from typing import List, Optional
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+
+ROUTINE_TITLES = [
+    ("4-7-8 브리딩", 3),
+    ("하체 스트레칭", 5),
+    ("얼-온 교대", 6),
+    ("파워냅", 10),
+    ("10분 산책", 10),
+]
+TODO_TITLES = ["회복 스트레칭", "폼롤러 10분", "가벼운 조깅", "수면 7시간 확보", "냉온 교대욕", "인터벌 러닝", "하체 근력", "요가 클래스"]
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="hyuga.db 스케일 테스트용 합성 데이터 생성")
+    p.add_argument("--db", required=True, help="대상 SQLite 파일 (체크인된 hyuga.db는 쓰지 않는 것을 권장)")
+    p.add_argument("--users", type=int, default=1000)
+    p.add_argument("--days", type=int, default=90, help="사용자별 기록 기간(일)")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--start", default="2025-01-01", help="기록 시작일 YYYY-MM-DD")
+    p.add_argument("--sessions-per-week", type=float, default=4.0, help="사용자 평균 운동 횟수/주")
+    p.add_argument("--roi-rate", type=float, default=0.5, help="주간 ROI 리포트를 남길 확률")
+    p.add_argument("--runs-per-week", type=float, default=3.0, help="사용자 평균 루틴 실행 횟수/주")
+    p.add_argument("--todos-per-user", type=int, default=40)
+    p.add_argument("--tokens-per-user", type=int, default=2)
+    p.add_argument("--password", default="hyuga-seed-pw", help="모든 합성 사용자의 비밀번호")
+    p.add_argument("--batch", type=int, default=20000, help="트랜잭션당 행 수")
+    return p.parse_args(argv)
+
+
+def _seeded_password_hash(raw: str, seed: int) -> str:
+    # Same format as app._hash_password, but with a seed-derived salt so output is reproducible.
+    salt = hashlib.sha256(f"hyuga-seed:{seed}".encode("utf-8")).hexdigest()[:32]
+    hashed = hashlib.pbkdf2_hmac("sha256", raw.encode("utf-8"), salt.encode("utf-8"), 120_000)
+    return f"{salt}${hashed.hex()}"
+
+
+def _token(rng: random.Random) -> str:
+    return base64.urlsafe_b64encode(rng.getrandbits(256).to_bytes(32, "big")).rstrip(b"=").decode("ascii")
+
+
+class _Writer:
+    """Buffers rows per table and flushes them in batched transactions."""
+
+    SQL = {
+        "users": "INSERT INTO users (id, email, password_hash, name, created_at) VALUES (?, ?, ?, ?, ?)",
+        "tokens": "INSERT INTO tokens (token, user_id, created_at) VALUES (?, ?, ?)",
+        "user_todos": "INSERT INTO user_todos (user_id, title, date, time, is_done, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        "user_routine_runs": "INSERT INTO user_routine_runs (user_id, title, duration_min, note, created_at) VALUES (?, ?, ?, ?, ?)",
+        "user_predictions": "INSERT INTO user_predictions (user_id, payload_json, result_json, created_at) VALUES (?, ?, ?, ?)",
+    }
+
+    def __init__(self, conn: sqlite3.Connection, batch: int):
+        self.conn = conn
+        self.batch = batch
+        self.pending = {k: [] for k in self.SQL}
+        self.pending_rows = 0
+        self.totals = {k: 0 for k in self.SQL}
+
+    def add(self, table: str, row: tuple):
+        self.pending[table].append(row)
+        self.pending_rows += 1
+        if self.pending_rows >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if not self.pending_rows:
+            return
+        with self.conn:
+            # users must land before their children because of the FK constraints
+            for table in self.SQL:
+                rows = self.pending[table]
+                if rows:
+                    self.conn.executemany(self.SQL[table], rows)
+                    self.totals[table] += len(rows)
+                    self.pending[table] = []
+        self.pending_rows = 0
+
+
+def _seed_user(app, w: _Writer, args: argparse.Namespace, user_id: int, idx: int, pw_hash: str, start: datetime):
+    rng = random.Random(f"{args.seed}:{idx}")
+    created = start - timedelta(days=rng.randint(1, 30), seconds=rng.randint(0, 86399))
+    w.add("users", (user_id, f"seed{args.seed}-{idx:07d}@seed.example.com", pw_hash, f"athlete{idx}", created.isoformat()))
+    for _ in range(args.tokens_per_user):
+        w.add("tokens", (_token(rng), user_id, (created + timedelta(days=rng.randint(0, args.days))).isoformat()))
+
+    # Per-user training profile
+    age = rng.randint(18, 60)
+    max_hr = max(150, min(215, 220 - age + rng.randint(-8, 8)))
+    session_p = max(0.05, min(1.0, rng.gauss(args.sessions_per_week, 1.0) / 7.0))
+    run_p = max(0.0, min(1.0, rng.gauss(args.runs_per_week, 1.0) / 7.0))
+    base_minutes = rng.uniform(25, 80)
+    sleep_mean = rng.uniform(5.5, 8.5)
+    uses_hr = rng.random() < 0.7
+
+    daily_loads: List[float] = []
+    week_sessions: list = []
+    streak = 0
+    for day in range(args.days):
+        date = start + timedelta(days=day)
+        if rng.random() < session_p:
+            rpe = round(max(1.0, min(10.0, rng.gauss(6.0, 1.8))), 1)
+            avg_hr = int(max_hr * max(0.5, min(0.95, 0.45 + rpe / 20.0 + rng.gauss(0, 0.04)))) if uses_hr else None
+            streak = streak + 1 if rpe >= 7 else 0
+            inp = app.WorkoutInput(
+                duration_min=round(max(5.0, rng.gauss(base_minutes, 12.0)), 1),
+                avg_hr=avg_hr,
+                max_hr=max_hr if uses_hr else None,
+                rpe=rpe,
+                sleep_hours=round(max(3.0, min(11.0, rng.gauss(sleep_mean, 0.9))), 1),
+                sleep_quality=rng.randint(1, 5),
+                temp_c=round(rng.uniform(-5, 33), 1),
+                humidity=round(rng.uniform(20, 95), 0),
+                last7_load=round(sum(daily_loads[-7:]), 1),
+                last28_load=round(sum(daily_loads[-28:]), 1),
+                hi_streak_days=streak,
+            )
+            load = app._session_trimp(inp)
+            result = app._score_workout(inp)
+            at = date + timedelta(hours=rng.randint(6, 21), minutes=rng.randint(0, 59))
+            w.add("user_predictions", (user_id, json.dumps(inp.model_dump()), json.dumps(result.model_dump()), at.isoformat()))
+            week_sessions.append(inp)
+        else:
+            load = 0.0
+            streak = 0
+        daily_loads.append(load)
+
+        if rng.random() < run_p:
+            title, minutes = ROUTINE_TITLES[rng.randrange(len(ROUTINE_TITLES))]
+            at = date + timedelta(hours=rng.randint(6, 23), minutes=rng.randint(0, 59))
+            w.add("user_routine_runs", (user_id, title, minutes, "", at.isoformat()))
+
+        if day % 7 == 6:
+            if week_sessions and rng.random() < args.roi_rate:
+                roi_inp = app.ROIReportInput(weekly_sessions=week_sessions)
+                result = app._score_roi_report(roi_inp)
+                at = date + timedelta(hours=22)
+                payload = {"weekly_sessions": [s.model_dump() for s in week_sessions]}
+                w.add("user_predictions", (user_id, json.dumps(payload), json.dumps(result.model_dump()), at.isoformat()))
+            week_sessions = []
+
+    for _ in range(args.todos_per_user):
+        day = rng.randint(0, args.days + 14)
+        date = start + timedelta(days=day)
+        created_at = date - timedelta(days=rng.randint(0, 5), minutes=rng.randint(0, 1440))
+        is_done = 1 if day < args.days and rng.random() < 0.7 else 0
+        w.add("user_todos", (user_id, TODO_TITLES[rng.randrange(len(TODO_TITLES))], date.date().isoformat(), f"{rng.randint(5, 22):02d}:{rng.choice(('00', '30'))}", is_done, created_at.isoformat()))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    db_path = Path(args.db).resolve()
+    # app은 import 시점에 DB_PATH를 정하기 때문에 먼저 경로를 지정한다
+    os.environ["HYUGA_DB_PATH"] = str(db_path)
+    sys.path.insert(0, str(Path(__file__).parent))
+    import app
+
+    app._ensure_db()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    # 시드 전용 DB이므로 내구성보다 속도를 택한다
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    start_id = (conn.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()[0] or 0) + 1
+    start = datetime.fromisoformat(args.start)
+    pw_hash = _seeded_password_hash(args.password, args.seed)
+
+    w = _Writer(conn, args.batch)
+    t0 = time.perf_counter()
+    for idx in range(args.users):
+        _seed_user(app, w, args, start_id + idx, idx, pw_hash, start)
+        if (idx + 1) % 1000 == 0:
+            print(f"[seed] users={idx + 1}/{args.users} predictions={w.totals['user_predictions'] + len(w.pending['user_predictions'])} elapsed={time.perf_counter() - t0:.1f}s")
+    w.flush()
+    conn.close()
+
+    # 시드는 예측을 직접 넣으므로 추세 롤업은 한 번에 다시 만든다
+    import rollups
+
+    rconn = app._get_db()
+    try:
+        res = rollups.backfill(rconn, app._trend_values, user_from=start_id, user_to=start_id + args.users - 1)
+    finally:
+        rconn.close()
+    print(f"[seed] rollups {res}")
+
+    elapsed = time.perf_counter() - t0
+    total = sum(w.totals.values())
+    print(f"[seed] done in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s) -> {db_path}")
+    for table, n in w.totals.items():
+        print(f"  {table:<20} {n:>12,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
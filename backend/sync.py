@@ -0,0 +1,200 @@
+"""Delta sync for user_todos and user_routine_runs (GET /api/sync).
+
+Every user has one change counter (user_sync_versions.version). Triggers bump it on
+each insert, update and delete of the user's todos and routine runs:
+  - live rows carry the version of their last change in a sync_version column;
+  - deletes leave a tombstone (entity, entity_id, version) in sync_tombstones.
+Because the triggers live in the database, every writer (API, seed.py, scripts) keeps
+the versions consistent. Rows of accounts being purged get no tombstones.
+
+A client keeps the `version` of its last response and asks for changes since it;
+since=0 returns every live row. compact() drops tombstones older than the TTL and
+records the highest dropped version per user (compacted_through): a client whose
+`since` is older than that may have missed deletes, so it gets a full reset instead.
+
+Usage (from backend/):
+    python sync.py --compact --ttl-days 30
+"""
+from typing import Callable, ContextManager, Dict, List, Optional
+import argparse
+import sqlite3
+import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+SYNC_TABLES = {"todo": "user_todos", "routine_run": "user_routine_runs"}
+
+_TABLES = """
+CREATE TABLE IF NOT EXISTS user_sync_versions (
+    user_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    compacted_through INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    user_id INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    entity TEXT NOT NULL,
+    entity_id INTEGER NOT NULL,
+    deleted_at TEXT NOT NULL,
+    PRIMARY KEY (user_id, version)
+);
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_deleted ON sync_tombstones(deleted_at);
+"""
+
+SCHEMA = _TABLES + "".join(
+    f"""
+CREATE INDEX IF NOT EXISTS idx_{table}_sync ON {table}(user_id, sync_version);
+CREATE TRIGGER IF NOT EXISTS {table}_sync_insert AFTER INSERT ON {table}
+BEGIN
+    INSERT INTO user_sync_versions (user_id, version) VALUES (NEW.user_id, 1)
+        ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+    UPDATE {table} SET sync_version = (SELECT version FROM user_sync_versions WHERE user_id = NEW.user_id) WHERE id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_sync_update AFTER UPDATE OF {columns} ON {table}
+BEGIN
+    INSERT INTO user_sync_versions (user_id, version) VALUES (NEW.user_id, 1)
+        ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+    UPDATE {table} SET sync_version = (SELECT version FROM user_sync_versions WHERE user_id = NEW.user_id) WHERE id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_sync_delete AFTER DELETE ON {table}
+WHEN EXISTS (SELECT 1 FROM users WHERE id = OLD.user_id AND deleted_at IS NULL)
+BEGIN
+    INSERT INTO user_sync_versions (user_id, version) VALUES (OLD.user_id, 1)
+        ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+    INSERT INTO sync_tombstones (user_id, version, entity, entity_id, deleted_at)
+        SELECT OLD.user_id, version, '{entity}', OLD.id, strftime('%Y-%m-%dT%H:%M:%f', 'now')
+        FROM user_sync_versions WHERE user_id = OLD.user_id;
+END;
+"""
+    for entity, table, columns in (
+        ("todo", "user_todos", "title, date, time, is_done"),
+        ("routine_run", "user_routine_runs", "title, duration_min, note"),
+    )
+)
+
+
+def migrate(conn: sqlite3.Connection):
+    """Adds sync_version to existing tables and numbers existing rows per user, then installs SCHEMA."""
+    conn.executescript(_TABLES)
+    for table in SYNC_TABLES.values():
+        if "sync_version" in {r["name"] for r in conn.execute(f"PRAGMA table_info({table})")}:
+            continue
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN sync_version INTEGER NOT NULL DEFAULT 0")
+        # 기존 행은 사용자별로 이어지는 번호를 받는다 (since=0 전체 동기화와 페이지 나누기가 그대로 동작)
+        conn.executescript(
+            f"""
+            UPDATE {table} SET sync_version = n.v FROM (
+                SELECT t.id, COALESCE(s.version, 0) + ROW_NUMBER() OVER (PARTITION BY t.user_id ORDER BY t.id) AS v
+                FROM {table} t LEFT JOIN user_sync_versions s ON s.user_id = t.user_id
+            ) AS n WHERE n.id = {table}.id;
+            INSERT INTO user_sync_versions (user_id, version)
+                SELECT user_id, MAX(sync_version) FROM {table} WHERE true GROUP BY user_id
+                ON CONFLICT(user_id) DO UPDATE SET version = MAX(version, excluded.version);
+            """
+        )
+    conn.executescript(SCHEMA)
+
+
+def changes(conn: sqlite3.Connection, user_id: int, since: int, limit: int) -> dict:
+    """Changes after `since` in version order, at most `limit`; reset=True means drop the local copy."""
+    state = conn.execute("SELECT version, compacted_through FROM user_sync_versions WHERE user_id = ?", (user_id,)).fetchone()
+    current, compacted = (state["version"], state["compacted_through"]) if state else (0, 0)
+    # 압축된 삭제 기록보다 오래됐거나 서버 버전보다 앞선(복원된 DB 등) since는 처음부터 다시 받는다
+    reset = since > current or 0 < since < compacted
+    if reset:
+        since = 0
+
+    live = " UNION ALL ".join(
+        f"SELECT sync_version AS v, '{entity}' AS entity, id, 0 AS deleted FROM {table} WHERE user_id = :uid AND sync_version > :since"
+        for entity, table in SYNC_TABLES.items()
+    )
+    rows = conn.execute(
+        f"""
+        SELECT * FROM (
+            {live}
+            UNION ALL
+            SELECT version, entity, entity_id, 1 FROM sync_tombstones WHERE user_id = :uid AND version > :since AND :since > 0
+        ) WHERE v <= :current ORDER BY v LIMIT :limit
+        """,
+        {"uid": user_id, "since": since, "current": current, "limit": limit + 1},
+    ).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    out: Dict[str, dict] = {entity: {"upserted": [], "deleted": []} for entity in SYNC_TABLES}
+    wanted: Dict[str, List[int]] = {entity: [] for entity in SYNC_TABLES}
+    for r in rows:
+        if r["deleted"]:
+            out[r["entity"]]["deleted"].append(r["id"])
+        else:
+            wanted[r["entity"]].append(r["id"])
+    for entity, ids in wanted.items():
+        for i in range(0, len(ids), 500):
+            part = ids[i : i + 500]
+            out[entity]["upserted"] += conn.execute(
+                f"SELECT * FROM {SYNC_TABLES[entity]} WHERE user_id = ? AND id IN ({','.join('?' * len(part))}) ORDER BY sync_version",
+                (user_id, *part),
+            ).fetchall()
+    return {
+        "version": rows[-1]["v"] if has_more else current,
+        "reset": reset,
+        "has_more": has_more,
+        **out,
+    }
+
+
+def compact(
+    conn: sqlite3.Connection,
+    write_lock: Optional[Callable[[], ContextManager]] = None,
+    ttl_days: float = 30.0,
+    batch_size: int = 1000,
+) -> Dict[str, int]:
+    """Deletes tombstones older than ttl_days in batches, advancing each user's compacted_through."""
+    cutoff = (datetime.utcnow() - timedelta(days=ttl_days)).isoformat()
+    removed = 0
+    while True:
+        with (write_lock() if write_lock else nullcontext()), conn:
+            rows = conn.execute(
+                "SELECT rowid, user_id, version FROM sync_tombstones WHERE deleted_at < ? ORDER BY deleted_at LIMIT ?",
+                (cutoff, batch_size),
+            ).fetchall()
+            if not rows:
+                break
+            upto: Dict[int, int] = {}
+            for r in rows:
+                upto[r["user_id"]] = max(upto.get(r["user_id"], 0), r["version"])
+            conn.executemany(
+                "UPDATE user_sync_versions SET compacted_through = MAX(compacted_through, ?) WHERE user_id = ?",
+                [(v, uid) for uid, v in upto.items()],
+            )
+            conn.executemany("DELETE FROM sync_tombstones WHERE rowid = ?", [(r["rowid"],) for r in rows])
+        removed += len(rows)
+        if len(rows) < batch_size:
+            break
+    return {"removed": removed}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="동기화 삭제 기록(tombstone) 정리")
+    p.add_argument("--compact", action="store_true", help="TTL보다 오래된 삭제 기록을 지운다")
+    p.add_argument("--ttl-days", type=float, default=30.0)
+    args = p.parse_args(argv)
+    if not args.compact:
+        p.print_help()
+        return 0
+
+    import app
+
+    conn = app._get_db()
+    try:
+        t0 = time.perf_counter()
+        res = compact(conn, app._write_lock, args.ttl_days)
+        print(f"[sync] {res} ({time.perf_counter() - t0:.1f}s)")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
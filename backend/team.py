@@ -0,0 +1,183 @@
+"""Coach rosters and the per-athlete activity summary behind /api/team/summary.
+
+An athlete shares their data with a coach (team_members row, created by the athlete
+and removable by either side). A roster page is then one indexed query joining
+team_members with user_activity_summary, a row per user that triggers keep current:
+
+  - insert on user_predictions with a fatigue_score (predict results, not ROI
+    reports): latest fatigue, risk, ROI of the first recovery window, the cohort
+    percentile /api/predict returned, and time;
+  - insert/delete on user_routine_runs: run count and the latest run.
+
+Like the sync triggers, this covers every writer (API, seed.py, scripts). The
+7-day fatigue average and prediction count come from the day rollups
+(rollups.py), so a page costs O(page size) regardless of history length.
+
+migrate() backfills the summary from existing rows once, when the table is created.
+Retention moving old predictions into the archive does not change the summary.
+"""
+from typing import Iterator, List, Optional
+import sqlite3
+from datetime import date, datetime, timedelta
+
+_TABLES = """
+CREATE TABLE IF NOT EXISTS team_members (
+    coach_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    athlete_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (coach_id, athlete_id)
+);
+CREATE INDEX IF NOT EXISTS idx_team_members_athlete ON team_members(athlete_id);
+CREATE TABLE IF NOT EXISTS user_activity_summary (
+    user_id INTEGER PRIMARY KEY,
+    last_prediction_at TEXT,
+    last_fatigue INTEGER,
+    last_risk TEXT,
+    last_roi_pct INTEGER,
+    last_percentile_rank REAL,
+    routine_runs INTEGER NOT NULL DEFAULT 0,
+    last_run_title TEXT,
+    last_run_at TEXT
+);
+"""
+
+# 예측 결과 JSON에서 꺼내는 값 (app.PredictOutput 필드)
+_FATIGUE = "json_extract(NEW.result_json, '$.fatigue_score')"
+_RISK = "json_extract(NEW.result_json, '$.overtraining_risk')"
+_ROI = "json_extract(NEW.result_json, '$.recovery_windows[0].expected_roi_pct')"
+_PERCENTILE = "json_extract(NEW.result_json, '$.percentile_rank')"
+
+SCHEMA = _TABLES + f"""
+CREATE TRIGGER IF NOT EXISTS user_predictions_activity_insert AFTER INSERT ON user_predictions
+WHEN {_FATIGUE} IS NOT NULL
+BEGIN
+    INSERT INTO user_activity_summary (user_id, last_prediction_at, last_fatigue, last_risk, last_roi_pct, last_percentile_rank)
+        VALUES (NEW.user_id, NEW.created_at, {_FATIGUE}, {_RISK}, {_ROI}, {_PERCENTILE})
+        ON CONFLICT(user_id) DO UPDATE SET
+            last_prediction_at = excluded.last_prediction_at,
+            last_fatigue = excluded.last_fatigue,
+            last_risk = excluded.last_risk,
+            last_roi_pct = excluded.last_roi_pct,
+            last_percentile_rank = excluded.last_percentile_rank
+        WHERE last_prediction_at IS NULL OR excluded.last_prediction_at >= last_prediction_at;
+END;
+CREATE TRIGGER IF NOT EXISTS user_routine_runs_activity_insert AFTER INSERT ON user_routine_runs
+BEGIN
+    INSERT INTO user_activity_summary (user_id, routine_runs, last_run_title, last_run_at)
+        VALUES (NEW.user_id, 1, NEW.title, NEW.created_at)
+        ON CONFLICT(user_id) DO UPDATE SET
+            routine_runs = routine_runs + 1,
+            last_run_title = CASE WHEN last_run_at IS NULL OR excluded.last_run_at >= last_run_at THEN excluded.last_run_title ELSE last_run_title END,
+            last_run_at = MAX(COALESCE(last_run_at, ''), excluded.last_run_at);
+END;
+CREATE TRIGGER IF NOT EXISTS user_routine_runs_activity_delete AFTER DELETE ON user_routine_runs
+BEGIN
+    UPDATE user_activity_summary SET routine_runs = MAX(routine_runs - 1, 0) WHERE user_id = OLD.user_id;
+    -- 지운 행이 최신 기록이었으면 다음 최신 기록으로 되돌린다
+    UPDATE user_activity_summary SET (last_run_title, last_run_at) = (
+        SELECT title, created_at FROM user_routine_runs WHERE user_id = OLD.user_id ORDER BY created_at DESC, id DESC LIMIT 1
+    ) WHERE user_id = OLD.user_id AND last_run_at = OLD.created_at;
+END;
+"""
+
+_BACKFILL = """
+INSERT INTO user_activity_summary (user_id, last_prediction_at, last_fatigue, last_risk, last_roi_pct, last_percentile_rank)
+    SELECT user_id, created_at, fatigue, risk, roi, percentile FROM (
+        SELECT user_id, created_at,
+            json_extract(result_json, '$.fatigue_score') AS fatigue,
+            json_extract(result_json, '$.overtraining_risk') AS risk,
+            json_extract(result_json, '$.recovery_windows[0].expected_roi_pct') AS roi,
+            json_extract(result_json, '$.percentile_rank') AS percentile,
+            ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY created_at DESC, id DESC) AS rn
+        FROM user_predictions WHERE json_extract(result_json, '$.fatigue_score') IS NOT NULL
+    ) WHERE rn = 1;
+INSERT INTO user_activity_summary (user_id, routine_runs, last_run_title, last_run_at)
+    SELECT user_id, n, title, created_at FROM (
+        SELECT user_id, title, created_at,
+            COUNT(*) OVER (PARTITION BY user_id) AS n,
+            ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY created_at DESC, id DESC) AS rn
+        FROM user_routine_runs
+    ) WHERE rn = 1
+    ON CONFLICT(user_id) DO UPDATE SET
+        routine_runs = excluded.routine_runs, last_run_title = excluded.last_run_title, last_run_at = excluded.last_run_at;
+"""
+
+_ADD_PERCENTILE = """
+ALTER TABLE user_activity_summary ADD COLUMN last_percentile_rank REAL;
+UPDATE user_activity_summary SET last_percentile_rank = (
+    SELECT json_extract(p.result_json, '$.percentile_rank') FROM user_predictions p
+    WHERE p.user_id = user_activity_summary.user_id AND json_extract(p.result_json, '$.fatigue_score') IS NOT NULL
+    ORDER BY p.created_at DESC, p.id DESC LIMIT 1
+) WHERE last_prediction_at IS NOT NULL;
+DROP TRIGGER IF EXISTS user_predictions_activity_insert;
+"""
+
+_PAGE = """
+SELECT m.athlete_id, u.name, u.email, m.created_at AS joined_at,
+    s.last_prediction_at, s.last_fatigue, s.last_risk, s.last_roi_pct, s.last_percentile_rank,
+    COALESCE(s.routine_runs, 0) AS routine_runs, s.last_run_title, s.last_run_at,
+    (SELECT SUM(predictions) FROM user_trend_rollups
+        WHERE user_id = m.athlete_id AND bucket = 'day' AND bucket_start >= :since) AS predictions_7d,
+    (SELECT SUM(fatigue_sum) / NULLIF(SUM(fatigue_n), 0) FROM user_trend_rollups
+        WHERE user_id = m.athlete_id AND bucket = 'day' AND bucket_start >= :since) AS fatigue_avg_7d
+FROM team_members m
+JOIN users u ON u.id = m.athlete_id AND u.deleted_at IS NULL
+LEFT JOIN user_activity_summary s ON s.user_id = m.athlete_id
+WHERE m.coach_id = :coach AND m.athlete_id > :after
+ORDER BY m.athlete_id
+LIMIT :limit
+"""
+
+
+def migrate(conn: sqlite3.Connection):
+    """Creates the tables and triggers, backfilling the summary the first time."""
+    fresh = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_activity_summary'").fetchone() is None
+    conn.executescript(_TABLES)
+    if fresh:
+        conn.executescript(_BACKFILL)
+    elif "last_percentile_rank" not in {r["name"] for r in conn.execute("PRAGMA table_info(user_activity_summary)")}:
+        # 기존 DB: 백분위 컬럼을 추가하고 최신 예측에서 채운 뒤, 새 컬럼을 쓰는 트리거로 바꾼다
+        conn.executescript(_ADD_PERCENTILE)
+    conn.executescript(SCHEMA)
+
+
+def add_member(conn: sqlite3.Connection, coach_id: int, athlete_id: int) -> str:
+    """Links the athlete to the coach (idempotent); returns the link's created_at. Call inside the write transaction."""
+    conn.execute(
+        "INSERT OR IGNORE INTO team_members (coach_id, athlete_id, created_at) VALUES (?, ?, ?)",
+        (coach_id, athlete_id, datetime.utcnow().isoformat()),
+    )
+    return conn.execute(
+        "SELECT created_at FROM team_members WHERE coach_id = ? AND athlete_id = ?", (coach_id, athlete_id)
+    ).fetchone()["created_at"]
+
+
+def remove_member(conn: sqlite3.Connection, coach_id: int, athlete_id: int) -> bool:
+    return conn.execute("DELETE FROM team_members WHERE coach_id = ? AND athlete_id = ?", (coach_id, athlete_id)).rowcount > 0
+
+
+def unlink_user(conn: sqlite3.Connection, user_id: int):
+    """Drops every roster link of a user on either side (account deletion)."""
+    conn.execute("DELETE FROM team_members WHERE coach_id = ? OR athlete_id = ?", (user_id, user_id))
+
+
+def coaches(conn: sqlite3.Connection, athlete_id: int) -> List[sqlite3.Row]:
+    return conn.execute(
+        """
+        SELECT u.id AS coach_id, u.name, u.email, m.created_at FROM team_members m
+        JOIN users u ON u.id = m.coach_id AND u.deleted_at IS NULL
+        WHERE m.athlete_id = ? ORDER BY m.created_at
+        """,
+        (athlete_id,),
+    ).fetchall()
+
+
+def iter_page(conn: sqlite3.Connection, coach_id: int, after: int, limit: int, today: Optional[date] = None, batch: int = 100) -> Iterator[List[sqlite3.Row]]:
+    """Roster rows with athlete_id > after in id order, at most `limit`, yielded `batch` rows at a time."""
+    since = ((today or datetime.utcnow().date()) - timedelta(days=6)).isoformat()
+    cur = conn.execute(_PAGE, {"coach": coach_id, "after": after, "limit": limit, "since": since})
+    while True:
+        rows = cur.fetchmany(batch)
+        if not rows:
+            return
+        yield rows
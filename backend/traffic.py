@@ -0,0 +1,160 @@
+"""Opt-in traffic capture for replay-based performance testing.
+
+With HYUGA_CAPTURE=<file> the API appends one compact JSON line per /api request:
+
+    {"t": 1718000000.123, "m": "POST", "p": "/api/todos/{id}", "u": "u3f9a...",
+     "q": {...}, "b": {...}, "s": 200, "d": 4.1}
+
+t is the wall-clock arrival time (inter-arrival gaps are derived from it), d is the
+server-side duration in ms and s the status code. Traces are sanitized before they
+are written:
+  - tokens are replaced by a one-way pseudonym (u), so requests can be grouped per
+    user without storing credentials;
+  - numeric and secret-looking path segments become {id} / {key};
+  - bodies and query strings keep their structure, numbers, booleans and date/time
+    strings and enum-like filters (KEEP_KEYS); other strings become "<str:N>", and
+    email/password/token values become "<email>" / "<password>" / "<token>".
+
+HYUGA_CAPTURE_SAMPLE (0-1, default 1) samples requests. Streams (/api/coach/stream)
+and /api/health/* are not captured. replay.py reads these files.
+"""
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import queue
+import random
+import re
+import threading
+import time
+from urllib.parse import parse_qsl
+
+SKIP_PREFIXES = ("/api/coach/stream", "/api/health/")
+SECRET_KEYS = {"email": "<email>", "password": "<password>", "token": "<token>", "servicekey": "<token>"}
+# 값이 정해진 목록 중 하나인 필터(개인정보 아님). 가리면 재생 시 422가 나므로 그대로 둔다
+KEEP_KEYS = {"bucket", "gender", "metric", "category"}
+MAX_BODY = 64 * 1024
+
+_SAFE_STR = re.compile(r"^[0-9:\-T.+Z ]{1,40}$")  # 날짜/시간/숫자 문자열은 그대로 둔다
+_SECRET_SEGMENT = re.compile(r"^[A-Za-z0-9_\-]{16,}$")
+
+
+def template_path(path: str) -> str:
+    parts = []
+    for seg in path.split("/"):
+        if seg.isdigit():
+            seg = "{id}"
+        elif _SECRET_SEGMENT.match(seg) and any(c.isdigit() for c in seg):
+            seg = "{key}"
+        parts.append(seg)
+    return "/".join(parts)
+
+
+def shape(value: Any, key: Optional[str] = None) -> Any:
+    if isinstance(value, dict):
+        return {k: shape(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [shape(v, key) for v in value]
+    if isinstance(value, str):
+        if key and key.lower() in SECRET_KEYS:
+            return SECRET_KEYS[key.lower()]
+        if _SAFE_STR.match(value) or (key in KEEP_KEYS and len(value) <= 40):
+            return value
+        return f"<str:{len(value)}>"
+    return value
+
+
+def pseudonym(token: str) -> str:
+    return "u" + hashlib.sha256(token.encode("utf-8")).hexdigest()[:12]
+
+
+class _TraceWriter:
+    """Batches trace lines on a background thread; each flush is one O_APPEND write."""
+
+    def __init__(self, path: str, flush_sec: float = 1.0):
+        self.path = path
+        self.flush_sec = flush_sec
+        self._q: queue.SimpleQueue = queue.SimpleQueue()
+        threading.Thread(target=self._run, name="hyuga-capture", daemon=True).start()
+
+    def put(self, record: Dict[str, Any]):
+        self._q.put(record)
+
+    def _run(self):
+        while True:
+            batch: List[str] = []
+            deadline = time.monotonic() + self.flush_sec
+            while len(batch) < 500:
+                try:
+                    rec = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                batch.append(json.dumps(rec, ensure_ascii=False, separators=(",", ":")))
+            if batch:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write("\n".join(batch) + "\n")
+                except OSError as e:
+                    print(f"[capture] write failed: {e}")
+
+
+class CaptureMiddleware:
+    def __init__(self, app, path: str, sample: float = 1.0):
+        self.app = app
+        self.sample = sample
+        self.writer = _TraceWriter(path)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if (
+            scope["type"] != "http"
+            or not path.startswith("/api/")
+            or path.startswith(SKIP_PREFIXES)
+            or (self.sample < 1.0 and random.random() >= self.sample)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        arrived = time.time()
+        t0 = time.perf_counter()
+        body = bytearray()
+        status_code = 0
+
+        async def recv():
+            msg = await receive()
+            if msg["type"] == "http.request" and len(body) <= MAX_BODY:
+                body.extend(msg.get("body", b""))
+            return msg
+
+        async def snd(msg):
+            nonlocal status_code
+            if msg["type"] == "http.response.start":
+                status_code = msg["status"]
+            await send(msg)
+
+        try:
+            await self.app(scope, recv, snd)
+        finally:
+            self.writer.put(self._record(scope, arrived, (time.perf_counter() - t0) * 1000, status_code, bytes(body)))
+
+    def _record(self, scope, arrived: float, duration_ms: float, status_code: int, body: bytes) -> Dict[str, Any]:
+        rec: Dict[str, Any] = {"t": round(arrived, 3), "m": scope["method"], "p": template_path(scope["path"])}
+        headers = dict(scope.get("headers") or [])
+        auth = headers.get(b"authorization", b"").decode("latin-1")
+        if auth.lower().startswith("bearer "):
+            rec["u"] = pseudonym(auth[7:])
+        if scope.get("query_string"):
+            query = {k: v for k, v in parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)}
+            if "token" in query:
+                rec.setdefault("u", pseudonym(query["token"]))
+            rec["q"] = shape(query)
+        if body:
+            if len(body) > MAX_BODY:
+                rec["bl"] = len(body)
+            else:
+                try:
+                    rec["b"] = shape(json.loads(body))
+                except ValueError:
+                    rec["bl"] = len(body)
+        rec["s"] = status_code
+        rec["d"] = round(duration_ms, 2)
+        return rec
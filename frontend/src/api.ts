@@ -10,6 +10,8 @@ export type WorkoutInput = {
   last7_load: number
   last28_load: number
   hi_streak_days: number
+  trimp?: number
+  hr_session_id?: string
 }
 
 export async function predict(inp: WorkoutInput, token?: string) {
@@ -61,6 +63,37 @@ export async function coach() {
   return res.json() as Promise<{ alerts: string[] }>
 }
 
+export type CoachAlert = { kind: 'risk_change' | 'sleep_debt' | 'acwr_spike'; level: string; message: string; prediction_id: number; created_at: string }
+
+// EventSource는 Authorization 헤더를 보낼 수 없어, 토큰으로 1회용 스트림 티켓을 받아 쿼리로 전달.
+// 티켓은 한 번만 쓸 수 있으므로 연결이 끊기면 새 티켓으로 다시 연결한다. 반환값을 호출하면 구독 해제
+export function subscribeCoachAlerts(token: string, onAlert: (alert: CoachAlert) => void) {
+  let es: EventSource | null = null
+  let closed = false
+  const connect = async () => {
+    const res = await fetch('/api/coach/stream-ticket', { method: 'POST', headers: { Authorization: `Bearer ${token}` } })
+    if (closed) return
+    if (!res.ok) {
+      setTimeout(connect, 5000)
+      return
+    }
+    const { ticket } = (await res.json()) as { ticket: string; expires_at: string }
+    es = new EventSource(`/api/coach/stream?ticket=${encodeURIComponent(ticket)}`)
+    es.addEventListener('alert', (e) => onAlert(JSON.parse((e as MessageEvent).data) as CoachAlert))
+    es.onerror = () => {
+      es?.close()
+      if (!closed) setTimeout(connect, 5000)
+    }
+  }
+  connect().catch(() => {
+    if (!closed) setTimeout(connect, 5000)
+  })
+  return () => {
+    closed = true
+    es?.close()
+  }
+}
+
 // Routine run + report
 export async function logRoutineRun(body: { title: string; duration_min?: number; note?: string }, token: string) {
   const res = await fetch('/api/routines/run', {
@@ -97,6 +130,116 @@ export async function fetchReportLatest(token: string) {
   return res.json() as Promise<ReportSummary>
 }
 
+export type TrendStat = { n: number; sum: number; avg: number | null; min: number | null; max: number | null }
+export type TrendPoint = { bucket_start: string; predictions: number; fatigue: TrendStat; load: TrendStat; roi: TrendStat }
+
+export async function fetchReportTrends(token: string, params: { bucket?: 'day' | 'week' | 'month'; from?: string; to?: string } = {}) {
+  const qs = new URLSearchParams()
+  if (params.bucket) qs.set('bucket', params.bucket)
+  if (params.from) qs.set('from', params.from)
+  if (params.to) qs.set('to', params.to)
+  const res = await fetch(`/api/report/trends?${qs.toString()}`, {
+    headers: { Authorization: `Bearer ${token}` },
+  })
+  if (!res.ok) throw new Error(await res.text())
+  return res.json() as Promise<TrendPoint[]>
+}
+
+export type HRSessionSummary = {
+  session_id: string
+  max_hr: number
+  rest_hr: number
+  samples: number
+  rejected: number
+  duration_min: number
+  trimp: number
+  avg_hr: number | null
+  peak_hr: number | null
+  zone_min: number[]
+  updated_at: string
+}
+
+export async function createHRSession(token: string, maxHr: number, restHr?: number) {
+  const res = await fetch('/api/hr-sessions', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Authorization: `Bearer ${token}` },
+    body: JSON.stringify({ max_hr: maxHr, rest_hr: restHr }),
+  })
+  if (!res.ok) throw new Error(await res.text())
+  return res.json() as Promise<HRSessionSummary>
+}
+
+// samples: [seconds since session start, bpm]; call repeatedly to append chunks
+export async function uploadHRSamples(token: string, sessionId: string, samples: [number, number][]) {
+  const res = await fetch(`/api/hr-sessions/${encodeURIComponent(sessionId)}/samples`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/x-ndjson', Authorization: `Bearer ${token}` },
+    body: samples.map((s) => JSON.stringify(s)).join('\n'),
+  })
+  if (!res.ok) throw new Error(await res.text())
+  return res.json() as Promise<HRSessionSummary>
+}
+
+export type SyncTodo = { id: number; title: string; date: string; time: string; is_done: boolean; created_at: string }
+export type SyncRoutineRun = { id: number; title: string; duration_min: number; note: string; created_at: string }
+export type SyncResponse = {
+  version: number
+  reset: boolean
+  has_more: boolean
+  todos: { upserted: SyncTodo[]; deleted: number[] }
+  routine_runs: { upserted: SyncRoutineRun[]; deleted: number[] }
+}
+
+// Pass the previous response's version as `since` (0 = everything). If `reset` is true, drop the local copy first.
+export async function syncChanges(token: string, since = 0, limit?: number) {
+  const qs = new URLSearchParams({ since: String(since) })
+  if (limit != null) qs.set('limit', String(limit))
+  const res = await fetch(`/api/sync?${qs.toString()}`, {
+    headers: { Authorization: `Bearer ${token}` },
+  })
+  if (!res.ok) throw new Error(await res.text())
+  return res.json() as Promise<SyncResponse>
+}
+
+export type TeamAthleteSummary = {
+  athlete_id: number
+  name: string
+  email: string
+  joined_at: string
+  last_prediction_at: string | null
+  last_fatigue: number | null
+  last_overtraining_risk: string | null
+  last_roi_pct: number | null
+  percentile_rank: number | null
+  fatigue_avg_7d: number | null
+  predictions_7d: number
+  routine_runs: number
+  last_run_title: string | null
+  last_run_at: string | null
+}
+
+// Athlete side: share your records with a coach (by the coach's account email).
+export async function addCoach(token: string, coachEmail: string) {
+  const res = await fetch('/api/team/coaches', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Authorization: `Bearer ${token}` },
+    body: JSON.stringify({ coach_email: coachEmail }),
+  })
+  if (!res.ok) throw new Error(await res.text())
+  return res.json() as Promise<{ coach_id: number; name: string; email: string; created_at: string }>
+}
+
+// Coach side: one page of the roster. Pass the previous page's next_cursor until it is null.
+export async function fetchTeamSummary(token: string, cursor = 0, limit?: number) {
+  const qs = new URLSearchParams({ cursor: String(cursor) })
+  if (limit != null) qs.set('limit', String(limit))
+  const res = await fetch(`/api/team/summary?${qs.toString()}`, {
+    headers: { Authorization: `Bearer ${token}` },
+  })
+  if (!res.ok) throw new Error(await res.text())
+  return res.json() as Promise<{ athletes: TeamAthleteSummary[]; next_cursor: number | null }>
+}
+
 export async function fetchNFABaseline(params: { age?: number; gender?: string; metric?: string; page?: number; rows?: number; raw?: boolean }) {
   const qs = new URLSearchParams()
   if (params.age != null) qs.set('age', String(params.age))
@@ -184,4 +327,5 @@ export async function deleteMe(token: string) {
     headers: { Authorization: `Bearer ${token}` },
   })
   if (!res.ok) throw new Error(await res.text())
+  return res.json() as Promise<{ deletion_id: string; status: string }>
 }